@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+同步性能基准测试
+启动本地的源仓库和目标仓库（进程内模拟仓库或 registry:2 容器），写入合成镜像，
+端到端计时 unified_sync 的完整同步，报告吞吐量、单镜像耗时分位数和请求数
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional
+
+from registry_client import RegistryClient, MEDIA_TYPE_MANIFEST_V2, request_counts
+from fake_registry import FakeRegistry
+from image_copier import CopyResult
+from sync_scheduler import SyncScheduler
+from unified_sync import UnifiedImageSync
+
+BACKENDS = ('fake', 'registry2')
+MEDIA_TYPE_LAYER = 'application/vnd.docker.image.rootfs.diff.tar.gzip'
+MEDIA_TYPE_CONFIG = 'application/vnd.docker.container.image.v1+json'
+BENCH_NAMESPACE = 'bench'
+
+
+@dataclass
+class BenchmarkConfig:
+    """基准测试参数"""
+    images: int = 20
+    layers: int = 5
+    layer_size_kb: int = 512
+    shared_ratio: float = 0.6
+    jobs: int = 4
+    plan: bool = True
+    runs: int = 3
+    backend: str = 'fake'
+    seed: int = 1
+
+
+@dataclass
+class RunMetrics:
+    """单次同步的测量结果"""
+    phase: str
+    seconds: float
+    images: int
+    succeeded: int
+    bytes_uploaded: int
+    images_per_second: float
+    mb_per_second: float
+    latency_p50: float
+    latency_p95: float
+    requests: Dict[str, int] = field(default_factory=dict)
+
+
+class FakeBackend:
+    """进程内模拟仓库"""
+
+    def __init__(self):
+        self.registry = FakeRegistry()
+
+    def start(self) -> str:
+        self.registry.start()
+        return self.registry.address
+
+    def stop(self) -> None:
+        self.registry.stop()
+
+
+class DockerRegistryBackend:
+    """本地 registry:2 容器（需要 Docker 和本地已有的 registry:2 镜像）"""
+
+    def __init__(self, image: str = 'registry:2'):
+        self.image = image
+        self.container: Optional[str] = None
+
+    def start(self) -> str:
+        self.container = subprocess.run(
+            ['docker', 'run', '-d', '--rm', '-p', '127.0.0.1::5000', self.image],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        port = subprocess.run(
+            ['docker', 'port', self.container, '5000/tcp'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[0].rsplit(':', 1)[1]
+        address = f"127.0.0.1:{port}"
+        client = RegistryClient(address)
+        for _ in range(50):
+            try:
+                client.request('GET', '/v2/').read()
+                return address
+            except Exception:
+                time.sleep(0.2)
+        raise RuntimeError(f"registry:2 未能启动: {address}")
+
+    def stop(self) -> None:
+        if self.container:
+            subprocess.run(['docker', 'rm', '-f', self.container], capture_output=True, check=False)
+
+
+def create_backend(name: str):
+    return DockerRegistryBackend() if name == 'registry2' else FakeBackend()
+
+
+def _push_blob(client: RegistryClient, repository: str, data: bytes) -> Dict[str, Any]:
+    digest = 'sha256:' + hashlib.sha256(data).hexdigest()
+    client.upload_blob(repository, digest, data, len(data))
+    return {'digest': digest, 'size': len(data)}
+
+
+def seed_images(address: str, config: BenchmarkConfig) -> List[str]:
+    """
+    在源仓库中写入合成镜像
+
+    每个镜像有 config.layers 层，其中 shared_ratio 比例的层为所有镜像共享（模拟公共基础镜像）
+
+    Returns:
+        源镜像引用列表
+    """
+    rng = random.Random(config.seed)
+    size = config.layer_size_kb * 1024
+    shared_count = min(config.layers, round(config.layers * config.shared_ratio))
+    shared = [rng.randbytes(size) for _ in range(shared_count)]
+
+    client = RegistryClient(address)
+    references = []
+    for index in range(config.images):
+        repository = f"{BENCH_NAMESPACE}/img{index:03d}"
+        layers = shared + [rng.randbytes(size) for _ in range(config.layers - shared_count)]
+        image_config = json.dumps({'architecture': 'amd64', 'os': 'linux', 'id': index}).encode()
+        manifest = {
+            'schemaVersion': 2,
+            'mediaType': MEDIA_TYPE_MANIFEST_V2,
+            'config': dict(mediaType=MEDIA_TYPE_CONFIG, **_push_blob(client, repository, image_config)),
+            'layers': [dict(mediaType=MEDIA_TYPE_LAYER, **_push_blob(client, repository, layer)) for layer in layers],
+        }
+        client.put_manifest(repository, 'v1', json.dumps(manifest).encode(), MEDIA_TYPE_MANIFEST_V2)
+        references.append(f"{address}/{repository}:v1")
+    return references
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    """最近秩法求分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(ratio * len(ordered) + 0.5)) - 1))]
+
+
+class TimedSync(UnifiedImageSync):
+    """记录每个镜像从开始检查到推送完成的耗时"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.started: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.bytes_uploaded = 0
+        self._timing_lock = threading.Lock()
+
+    def _check_image(self, index, total, image, smart_sync, force_sync):
+        with self._timing_lock:
+            self.started[self._build_image_spec(image)] = time.perf_counter()
+        return super()._check_image(index, total, image, smart_sync, force_sync)
+
+    def _finish_copy(self, image_spec: str, copied: CopyResult) -> None:
+        super()._finish_copy(image_spec, copied)
+        with self._timing_lock:
+            self.latencies.append(time.perf_counter() - self.started.get(image_spec, time.perf_counter()))
+            self.bytes_uploaded += copied.bytes_uploaded
+
+
+def run_sync(config_file: str, config: BenchmarkConfig, phase: str, verbose: bool) -> RunMetrics:
+    """执行一次完整同步并测量"""
+    sync = TimedSync(config_file)
+    scheduler = SyncScheduler(jobs=config.jobs)
+    request_counts(reset=True)
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with output:
+        result = sync.sync_images(smart_sync=True, scheduler=scheduler, plan_blobs=config.plan)
+    seconds = time.perf_counter() - start
+
+    requests: Dict[str, int] = {}
+    for (_, method), count in request_counts().items():
+        requests[method] = requests.get(method, 0) + count
+    return RunMetrics(
+        phase=phase,
+        seconds=round(seconds, 4),
+        images=result.total_count,
+        succeeded=result.success_count,
+        bytes_uploaded=sync.bytes_uploaded,
+        images_per_second=round(result.total_count / seconds, 2) if seconds else 0.0,
+        mb_per_second=round(sync.bytes_uploaded / 1024 / 1024 / seconds, 2) if seconds else 0.0,
+        latency_p50=round(percentile(sync.latencies, 0.5), 4),
+        latency_p95=round(percentile(sync.latencies, 0.95), 4),
+        requests=dict(sorted(requests.items()))
+    )
+
+
+def run_benchmark(config: BenchmarkConfig, verbose: bool = False) -> List[RunMetrics]:
+    """
+    执行基准测试
+
+    每轮使用新的目标仓库：先做一次冷同步（全部复制），再做一次热同步（全部已是最新）
+    """
+    source = create_backend(config.backend)
+    source_address = source.start()
+    metrics: List[RunMetrics] = []
+    try:
+        print(f"🌱 写入 {config.images} 个合成镜像（{config.layers} 层 x {config.layer_size_kb} KB，"
+              f"共享比例 {config.shared_ratio}）...")
+        references = seed_images(source_address, config)
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            config_file = os.path.join(work_dir, 'images.json')
+            with open(config_file, 'w', encoding='utf-8') as f:
+                json.dump({'images': [{'source': {'repository': ref.rsplit(':', 1)[0], 'tag': 'v1'}}
+                                      for ref in references]}, f)
+
+            for run in range(1, config.runs + 1):
+                target = create_backend(config.backend)
+                os.environ['ALIYUN_REGISTRY'] = target.start()
+                os.environ['ALIYUN_NAME_SPACE'] = BENCH_NAMESPACE
+                try:
+                    for phase in ('cold', 'warm'):
+                        metrics.append(run_sync(config_file, config, phase, verbose))
+                        m = metrics[-1]
+                        print(f"⏱️ 第 {run} 轮 {phase}: {m.seconds:.2f}s, {m.images_per_second} 镜像/s, "
+                              f"{m.mb_per_second} MB/s, p50 {m.latency_p50:.3f}s, p95 {m.latency_p95:.3f}s, "
+                              f"成功 {m.succeeded}/{m.images}, 请求 {sum(m.requests.values())}")
+                finally:
+                    target.stop()
+    finally:
+        source.stop()
+    return metrics
+
+
+def summarize(metrics: List[RunMetrics]) -> Dict[str, Any]:
+    """按冷/热同步汇总各轮的中位数"""
+    summary: Dict[str, Any] = {}
+    for phase in ('cold', 'warm'):
+        runs = [m for m in metrics if m.phase == phase]
+        if not runs:
+            continue
+        summary[phase] = {
+            key: percentile([getattr(m, key) for m in runs], 0.5)
+            for key in ('seconds', 'images_per_second', 'mb_per_second', 'latency_p50', 'latency_p95')
+        }
+        summary[phase]['requests'] = runs[-1].requests
+        summary[phase]['bytes_uploaded'] = runs[-1].bytes_uploaded
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='镜像同步基准测试（离线，本地仓库）')
+    parser.add_argument('--images', type=int, default=20, help='镜像数量')
+    parser.add_argument('--layers', type=int, default=5, help='每个镜像的层数')
+    parser.add_argument('--layer-size', type=int, default=512, help='每层大小（KB）')
+    parser.add_argument('--shared-ratio', type=float, default=0.6, help='所有镜像共享的层所占比例（0-1）')
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='并发同步的镜像数')
+    parser.add_argument('--no-plan', action='store_true', help='不做整批数据块去重规划')
+    parser.add_argument('--runs', type=int, default=3, help='测量轮数')
+    parser.add_argument('--backend', choices=BACKENDS, default='fake',
+                        help='fake 使用进程内模拟仓库，registry2 使用本地 registry:2 容器')
+    parser.add_argument('--seed', type=int, default=1, help='随机数种子')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    parser.add_argument('-v', '--verbose', action='store_true', help='显示同步过程输出')
+
+    args = parser.parse_args()
+    if not 0 <= args.shared_ratio <= 1:
+        print("❌ 错误：--shared-ratio 必须在 0 到 1 之间")
+        sys.exit(1)
+
+    config = BenchmarkConfig(
+        images=args.images, layers=args.layers, layer_size_kb=args.layer_size,
+        shared_ratio=args.shared_ratio, jobs=args.jobs, plan=not args.no_plan,
+        runs=args.runs, backend=args.backend, seed=args.seed
+    )
+    # 基准测试不读写同步状态，且需要 HTTP 访问本地仓库
+    os.environ.pop('ALIYUN_REGISTRY_USER', None)
+    os.environ.pop('ALIYUN_REGISTRY_PASSWORD', None)
+
+    metrics = run_benchmark(config, verbose=args.verbose)
+    summary = summarize(metrics)
+
+    print("\n📊 基准测试结果（各轮中位数）:")
+    for phase, values in summary.items():
+        print(f"  {phase}: {values['seconds']:.2f}s, {values['images_per_second']} 镜像/s, "
+              f"{values['mb_per_second']} MB/s, p50 {values['latency_p50']:.3f}s, p95 {values['latency_p95']:.3f}s")
+        print(f"        请求数: {values['requests']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': asdict(config), 'summary': summary,
+                       'runs': [asdict(m) for m in metrics]}, f, indent=2, ensure_ascii=False)
+        print(f"💾 结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+本地数据块缓存
+按摘要保存从源仓库下载的数据块，之后的运行直接从磁盘读取，不再向源仓库请求；
+按总大小做 LRU 淘汰（以文件修改时间为最近使用时间），使用前校验摘要。
+缓存目录可以通过 Actions 缓存在运行之间保留
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Tuple, Optional, Set, BinaryIO
+
+from registry_client import CHUNK_SIZE
+
+DEFAULT_BLOB_CACHE_DIR = '.blob-cache'
+DEFAULT_BLOB_CACHE_GB = 2.0
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(data)
+    return f"sha256:{digest.hexdigest()}"
+
+
+class BlobCache:
+    """
+    本地数据块缓存
+
+    文件保存在 <root>/sha256/<前两位>/<摘要>，写入时先写临时文件，校验摘要后再替换，
+    中途中断不会留下不完整的缓存；每个数据块在一次运行中首次使用前校验一次
+    """
+
+    def __init__(self, root: str = DEFAULT_BLOB_CACHE_DIR, max_bytes: int = int(DEFAULT_BLOB_CACHE_GB * 1024 ** 3)):
+        self.root = root
+        self.max_bytes = max_bytes
+        # 摘要 -> (大小, 最近使用时间)
+        self._entries: Dict[str, Tuple[int, float]] = {}
+        self._verified: Set[str] = set()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.bytes_stored = 0
+        self.evicted = 0
+
+    def _path(self, digest: str) -> str:
+        algorithm, _, hex_digest = digest.partition(':')
+        return os.path.join(self.root, algorithm, hex_digest[:2], hex_digest)
+
+    def load(self) -> None:
+        """扫描缓存目录，清理上次中断留下的临时文件，超出上限时淘汰"""
+        for directory, _, files in os.walk(self.root):
+            parts = os.path.relpath(directory, self.root).split(os.sep)
+            if len(parts) != 2:
+                continue
+            for name in files:
+                path = os.path.join(directory, name)
+                if '.tmp' in name:
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                self._entries[f"{parts[0]}:{name}"] = (stat.st_size, stat.st_mtime)
+                self._total += stat.st_size
+        with self._lock:
+            self._evict()
+        if self._entries:
+            print(f"🗄️ 本地数据块缓存: {len(self._entries)} 个, {self._total / 1024 ** 2:.1f} MB "
+                  f"(上限 {self.max_bytes / 1024 ** 3:.1f} GB, {self.root})")
+
+    def open(self, digest: str, size: int, offset: int = 0) -> Optional[BinaryIO]:
+        """
+        打开缓存的数据块
+
+        Returns:
+            定位到 offset 的文件对象；未缓存、大小不符或校验失败时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(digest)
+            verified = digest in self._verified
+        path = self._path(digest)
+        if not entry or entry[0] != size:
+            with self._lock:
+                self.misses += 1
+            return None
+        if not verified:
+            if _file_digest(path) != digest:
+                print(f"⚠️ 缓存的数据块校验失败，已删除: {digest[:19]}")
+                self.discard(digest)
+                with self._lock:
+                    self.misses += 1
+                return None
+            with self._lock:
+                self._verified.add(digest)
+        try:
+            stream = open(path, 'rb')
+        except OSError:
+            # 已被其他线程淘汰
+            self.discard(digest)
+            return None
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        stream.seek(offset)
+        with self._lock:
+            self.hits += 1
+            self.bytes_served += size - offset
+            if digest in self._entries:
+                self._entries[digest] = (size, now)
+        return stream
+
+    def put(self, digest: str, data: bytes) -> None:
+        """保存已校验摘要的数据块（小数据块下载后整体写入）"""
+        if len(data) > self.max_bytes or digest in self._entries:
+            return
+        path = self._path(digest)
+        temp_path = f"{path}.tmp.{uuid.uuid4().hex}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"⚠️ 写入数据块缓存失败: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._register(digest, len(data), path)
+
+    def writer(self, digest: str, size: int) -> Optional['BlobCacheWriter']:
+        """大数据块边传输边写入缓存；已缓存或超过上限时返回None"""
+        if size > self.max_bytes or digest in self._entries:
+            return None
+        try:
+            return BlobCacheWriter(self, digest, size)
+        except OSError as e:
+            print(f"⚠️ 创建数据块缓存失败: {e}")
+            return None
+
+    def discard(self, digest: str) -> None:
+        """删除缓存的数据块（例如目标仓库报告摘要不匹配）"""
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            self._verified.discard(digest)
+            if entry:
+                self._total -= entry[0]
+        if entry and os.path.exists(self._path(digest)):
+            os.remove(self._path(digest))
+
+    def _register(self, digest: str, size: int, path: str) -> None:
+        with self._lock:
+            if digest not in self._entries:
+                self._total += size
+                self.bytes_stored += size
+            self._entries[digest] = (size, os.path.getmtime(path))
+            self._verified.add(digest)
+            self._evict()
+
+    def _evict(self) -> None:
+        """按最近使用时间淘汰，直到总大小不超过上限（调用方持有锁）"""
+        if self._total <= self.max_bytes:
+            return
+        for digest, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            del self._entries[digest]
+            self._verified.discard(digest)
+            self._total -= size
+            self.evicted += 1
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def summary(self) -> str:
+        return (f"命中 {self.hits} 次（{self.bytes_served / 1024 ** 2:.1f} MB 未从源仓库下载）, "
+                f"新增 {self.bytes_stored / 1024 ** 2:.1f} MB, 淘汰 {self.evicted} 个")
+
+
+class BlobCacheWriter:
+    """
+    分块写入缓存
+
+    续传时从确认的偏移量重新写入，提交时校验完整文件的摘要
+    """
+
+    def __init__(self, cache: BlobCache, digest: str, size: int):
+        self.cache = cache
+        self.digest = digest
+        self.size = size
+        self.path = cache._path(digest)
+        self.temp_path = f"{self.path}.tmp.{uuid.uuid4().hex}"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.temp_path, 'wb')
+
+    def write_at(self, offset: int, data: bytes) -> None:
+        self._file.seek(offset)
+        self._file.truncate(offset)
+        self._file.write(data)
+
+    def commit(self) -> None:
+        """传输完成后校验并放入缓存，校验失败时丢弃"""
+        self._file.close()
+        if os.path.getsize(self.temp_path) == self.size and _file_digest(self.temp_path) == self.digest:
+            os.replace(self.temp_path, self.path)
+            self.cache._register(self.digest, self.size, self.path)
+        else:
+            os.remove(self.temp_path)
+
+    def abort(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+批量数据块去重规划
+同步前解析整批镜像的清单，统计每个数据块被哪些镜像引用，
+每个数据块只传输一次，其他镜像通过跨仓库挂载复用
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
+
+from registry_client import RegistryError
+from retry_policy import classify
+from image_copier import ImageCopier, ImagePlan, CopyResult
+from sync_scheduler import SyncScheduler
+
+
+@dataclass
+class PlannedImage:
+    """批量中的单个镜像：复制计划和目标位置"""
+    plan: ImagePlan
+    repository: str
+    tag: str
+    # 数值越小越优先，与配置中的 priority 一致
+    priority: int = 1
+
+
+@dataclass
+class BlobTask:
+    """单个数据块的传输任务"""
+    descriptor: Dict[str, Any]
+    # 引用该数据块的镜像序号，第一个镜像的目标仓库负责接收数据块
+    consumers: List[int]
+
+    @property
+    def home(self) -> int:
+        return self.consumers[0]
+
+
+class BlobPlanner:
+    """
+    批量数据块去重规划器
+
+    优先级高的镜像的数据块先传输，同一优先级中被引用次数多的数据块（通常是公共基础镜像层）优先，
+    镜像清单在其全部数据块传输完成后才推送
+    """
+
+    def __init__(self, copier: ImageCopier, scheduler: SyncScheduler):
+        self.copier = copier
+        self.scheduler = scheduler
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def plan(images: List[PlannedImage]) -> List[BlobTask]:
+        """
+        建立 数据块摘要 -> 引用镜像 的映射
+
+        重新压缩的镜像层与原样复制的同一层推送到目标仓库的是不同的数据块，分开规划
+
+        Returns:
+            按引用镜像的最高优先级、引用次数、大小排列的数据块任务
+        """
+        tasks: Dict[Tuple[str, Optional[str]], BlobTask] = {}
+        for index, image in enumerate(images):
+            for descriptor in image.plan.blobs:
+                key = ImageCopier.blob_key(image.plan, descriptor)
+                task = tasks.get(key)
+                if task is None:
+                    tasks[key] = BlobTask(descriptor, [index])
+                elif task.consumers[-1] != index:
+                    task.consumers.append(index)
+        return sorted(tasks.values(), key=lambda task: (min(images[index].priority for index in task.consumers),
+                                                        -len(task.consumers), -task.descriptor.get('size', 0)))
+
+    def execute(self, images: List[PlannedImage],
+                on_pushed: Optional[Callable[[int, CopyResult], None]] = None,
+                should_stop: Optional[Callable[[], bool]] = None,
+                on_deferred: Optional[Callable[[int], None]] = None) -> List[Optional[CopyResult]]:
+        """
+        执行整批复制
+
+        数据块传输统计计入负责接收的镜像
+
+        Args:
+            on_pushed: 每个镜像推送完成后立即调用，参数为镜像序号和复制结果
+            should_stop: 返回True后不再开始新的数据块和镜像（例如时间预算用完）
+            on_deferred: 因 should_stop 未推送的镜像，参数为镜像序号
+
+        Returns:
+            与 images 顺序一致的复制结果，失败的镜像为 None
+        """
+        blob_tasks = self.plan(images)
+        total = sum(image.plan.size for image in images)
+        unique = sum(task.descriptor.get('size', 0) for task in blob_tasks)
+        shared = sum(1 for task in blob_tasks if len(task.consumers) > 1)
+        print(f"🧮 批量规划: {len(images)} 个镜像, {len(blob_tasks)} 个唯一数据块（{shared} 个被多个镜像共享）, "
+              f"{total} bytes -> {unique} bytes")
+
+        results = [CopyResult(source_digest=image.plan.tag_digest) for image in images]
+        # 每个镜像的目标仓库中已就绪（或已尝试）的数据块，按去重键区分同一源层的不同压缩格式
+        finished: List[Set[Tuple[str, Optional[str]]]] = [set() for _ in images]
+        # 已传输成功、可直接跳过的数据块: (目标仓库, 去重键)
+        present: Set[Tuple[str, Tuple[str, Optional[str]]]] = set()
+        waiting = [{ImageCopier.blob_key(image.plan, blob) for blob in image.plan.blobs} for image in images]
+
+        def registry_of(task: Tuple[str, Any]) -> str:
+            kind, value = task
+            index = value.home if kind == 'blob' else value
+            return images[index].plan.source_ref.registry
+
+        def ready(task: Tuple[str, Any]) -> bool:
+            kind, value = task
+            return kind == 'blob' or waiting[value] <= finished[value]
+
+        def copy_blob(task: BlobTask) -> None:
+            image = images[task.home]
+            digest = task.descriptor['digest']
+            key = ImageCopier.blob_key(image.plan, task.descriptor)
+            copied = CopyResult()
+            if should_stop and should_stop():
+                with self._lock:
+                    for index in task.consumers:
+                        finished[index].add(key)
+                return
+            try:
+                print(f"  📤 {digest[:19]} ({task.descriptor.get('size', 0)} bytes, "
+                      f"{len(task.consumers)} 个镜像引用) -> {image.repository}")
+                self.copier.copy_plan_blob(image.plan, image.repository, task.descriptor, copied)
+                ok = True
+            except RegistryError as e:
+                # 失败的数据块由各镜像推送时重新尝试
+                print(f"⚠️ 数据块传输失败（{classify(e)}）: {digest[:19]} ({e})")
+                ok = False
+            with self._lock:
+                results[task.home].merge(copied)
+                if ok:
+                    present.add((image.repository, key))
+                for index in task.consumers:
+                    finished[index].add(key)
+
+        def push_image(index: int) -> Optional[CopyResult]:
+            image = images[index]
+            if should_stop and should_stop():
+                if on_deferred:
+                    on_deferred(index)
+                return None
+            keys = {ImageCopier.blob_key(image.plan, descriptor) for descriptor in image.plan.blobs}
+            with self._lock:
+                done = {key[0] for repository, key in present if repository == image.repository and key in keys}
+            try:
+                pushed = self.copier.push_plan(image.plan, image.repository, image.tag, present=done)
+            except RegistryError as e:
+                print(f"❌ 同步错误（{classify(e)}）: {image.plan.source_ref} ({e})")
+                return None
+            with self._lock:
+                result = results[index]
+                result.digest = pushed.digest
+                result.merge(pushed)
+            if on_pushed:
+                on_pushed(index, result)
+            return result
+
+        def worker(task: Tuple[str, Any]) -> Optional[CopyResult]:
+            kind, value = task
+            if kind == 'blob':
+                copy_blob(value)
+                return None
+            return push_image(value)
+
+        # 按规划顺序领取数据块，镜像任务紧跟在其最后一个数据块之后：
+        # 镜像的数据块就绪后先推送清单，再继续传输后面的数据块，时间预算用完时已完成的镜像尽量多
+        last_blob = [-1] * len(images)
+        for position, task in enumerate(blob_tasks):
+            for index in task.consumers:
+                last_blob[index] = position
+        after: Dict[int, List[int]] = {}
+        for index, position in enumerate(last_blob):
+            after.setdefault(position, []).append(index)
+        tasks: List[Tuple[str, Any]] = [('image', index) for index in after.get(-1, [])]
+        for position, task in enumerate(blob_tasks):
+            tasks.append(('blob', task))
+            tasks.extend(('image', index) for index in after.get(position, []))
+        outcomes = self.scheduler.run(tasks, registry_of=registry_of, worker=worker, ready=ready)
+        pushed: List[Optional[CopyResult]] = [None] * len(images)
+        for (kind, value), outcome in zip(tasks, outcomes):
+            if kind == 'image':
+                pushed[value] = outcome
+        return pushed
@@ -7,11 +7,32 @@ Dockerfile自动构建处理器
 import os
 import sys
 import argparse
+import shutil
 import subprocess
-from typing import List, Dict, Any, Optional
+import tempfile
+import threading
+import time
+from typing import List, Dict, Any, Optional, Set, Tuple
 from dataclasses import dataclass
 import json
 
+from registry_client import RegistryClient, RegistryError
+from process_runner import run_streaming, print_tail
+from build_graph import discover_dockerfiles, build_dependencies, expand_dependents, topological_order
+from sync_scheduler import SyncScheduler
+from sync_metrics import ImageMetrics, MetricsRegistry, write_reports
+
+# 构建缓存模式：registry 缓存推送到命名空间下的缓存仓库，local 保存在本地目录，none 不使用缓存
+CACHE_MODES = ('registry', 'local', 'none')
+DEFAULT_CACHE_MODE = 'registry'
+DEFAULT_CACHE_DIR = '.buildx-cache'
+# registry 模式下缓存所在的仓库名，标签为 镜像名-标签
+CACHE_REPOSITORY = 'build-cache'
+
+# 构建产物输出方式：push 由 BuildKit 直接推送到仓库，load 加载到本地后 docker push
+OUTPUT_MODES = ('push', 'load')
+DEFAULT_OUTPUT_MODE = 'push'
+
 @dataclass
 class BuildResult:
     """构建结果"""
@@ -20,25 +41,58 @@ class BuildResult:
     failed_count: int = 0
     success_images: List[str] = None
     failed_images: List[str] = None
+    # 完整镜像名 -> 推送后的清单摘要
+    image_digests: Dict[str, str] = None
+    # 每个Dockerfile的阶段耗时
+    image_metrics: List[ImageMetrics] = None
+    duration_seconds: float = 0.0
 
     def __post_init__(self):
         if self.success_images is None:
             self.success_images = []
         if self.failed_images is None:
             self.failed_images = []
+        if self.image_digests is None:
+            self.image_digests = {}
+        if self.image_metrics is None:
+            self.image_metrics = []
 
 class DockerfileBuilder:
     """Dockerfile构建处理器"""
 
-    def __init__(self, namespace: str = None):
+    def __init__(self, namespace: str = None, cache_mode: str = DEFAULT_CACHE_MODE,
+                 cache_dir: str = DEFAULT_CACHE_DIR, no_cache: bool = False,
+                 output_mode: str = DEFAULT_OUTPUT_MODE):
         self.namespace = namespace or os.getenv('ALIYUN_NAME_SPACE')
         self.registry = os.getenv('ALIYUN_REGISTRY')
+        self.cache_mode = cache_mode
+        self.cache_dir = cache_dir
+        # 强制冷构建：不读取缓存，但仍导出新缓存供后续构建使用
+        self.no_cache = no_cache
+        self.output_mode = output_mode
+        self._buildx_available: Optional[bool] = None
+        # 完整镜像名 -> 推送后的清单摘要
+        self.pushed_digests: Dict[str, str] = {}
+        # Dockerfile路径 -> 阶段耗时
+        self.metrics = MetricsRegistry()
+
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"无效的缓存模式: {cache_mode}（可选: {', '.join(CACHE_MODES)}）")
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"无效的输出方式: {output_mode}（可选: {', '.join(OUTPUT_MODES)}）")
 
         if not self.namespace:
             raise ValueError("命名空间未设置，请设置ALIYUN_NAME_SPACE环境变量或使用--namespace参数")
         if not self.registry:
             raise ValueError("阿里云仓库地址未设置，请设置ALIYUN_REGISTRY环境变量")
 
+        # 与同步脚本共用的仓库客户端（连接池和令牌缓存）
+        self.registry_client = RegistryClient(
+            self.registry,
+            os.getenv('ALIYUN_REGISTRY_USER'),
+            os.getenv('ALIYUN_REGISTRY_PASSWORD')
+        )
+
     def get_image_name_from_path(self, dockerfile_path: str) -> tuple[str, str]:
         """
         从Dockerfile路径生成镜像名称和标签
@@ -69,6 +123,113 @@ class DockerfileBuilder:
 
         return image_name, tag
 
+    def get_pushed_digest(self, image_name: str, tag: str) -> Optional[str]:
+        """查询已推送镜像在仓库中的摘要"""
+        try:
+            head = self.registry_client.head_manifest(f"{self.namespace}/{image_name}", tag)
+            return head[0] if head else None
+        except RegistryError as e:
+            print(f"⚠️ 查询镜像摘要失败: {e}")
+            return None
+
+    def buildx_available(self) -> bool:
+        """检查 docker buildx 是否可用"""
+        if self._buildx_available is None:
+            try:
+                result = subprocess.run(['docker', 'buildx', 'version'], capture_output=True, timeout=30, check=False)
+                self._buildx_available = result.returncode == 0
+            except (subprocess.SubprocessError, OSError):
+                self._buildx_available = False
+            if not self._buildx_available:
+                print("⚠️ docker buildx 不可用，回退到 docker build")
+        return self._buildx_available
+
+    def get_cache_options(self, image_name: str, tag: str) -> List[str]:
+        """
+        生成 BuildKit 缓存导入导出参数
+
+        Returns:
+            --cache-from / --cache-to 参数列表
+        """
+        if self.cache_mode == 'registry':
+            cache_ref = f"{self.registry}/{self.namespace}/{CACHE_REPOSITORY}:{image_name}-{tag}"
+            options = [] if self.no_cache else ['--cache-from', f"type=registry,ref={cache_ref}"]
+            return options + [
+                '--cache-to', f"type=registry,ref={cache_ref},mode=max,image-manifest=true,oci-mediatypes=true"
+            ]
+
+        cache_path = os.path.join(self.cache_dir, f"{image_name}-{tag}")
+        options = []
+        if not self.no_cache and os.path.isdir(cache_path):
+            options += ['--cache-from', f"type=local,src={cache_path}"]
+        # 导出到新目录，构建成功后替换旧缓存，避免缓存目录无限增长
+        return options + ['--cache-to', f"type=local,dest={cache_path}-new,mode=max"]
+
+    def rotate_local_cache(self, image_name: str, tag: str) -> None:
+        """用本次构建导出的缓存替换旧缓存"""
+        cache_path = os.path.join(self.cache_dir, f"{image_name}-{tag}")
+        if os.path.isdir(f"{cache_path}-new"):
+            shutil.rmtree(cache_path, ignore_errors=True)
+            os.replace(f"{cache_path}-new", cache_path)
+
+    def pushes_directly(self) -> bool:
+        """构建时是否由 BuildKit 直接推送，不经过本地镜像存储"""
+        return self.output_mode == 'push' and self.buildx_available()
+
+    def get_build_command(self, dockerfile_path: str, full_image_name: str, image_name: str,
+                          tag: str, metadata_file: Optional[str] = None) -> List[str]:
+        """
+        生成构建命令
+
+        Args:
+            metadata_file: 直接推送时 BuildKit 写入构建元数据（包含镜像摘要）的文件
+        """
+        # 使用Dockerfile所在目录作为构建上下文
+        dockerfile_dir = os.path.dirname(os.path.abspath(dockerfile_path))
+
+        if not self.buildx_available() or (self.cache_mode == 'none' and self.output_mode == 'load'):
+            return [
+                'docker', 'build',
+                '-f', dockerfile_path,  # 指定Dockerfile路径
+                '-t', full_image_name,  # 指定镜像标签
+                '--no-cache',  # 不使用缓存，确保最新
+                dockerfile_dir
+            ]
+
+        build_cmd = [
+            'docker', 'buildx', 'build',
+            '-f', dockerfile_path,
+            '-t', full_image_name,
+            '--progress', 'plain',
+        ]
+        if self.output_mode == 'push':
+            # 直接推送到仓库，省去加载到本地、docker push 再删除的过程
+            build_cmd.append('--push')
+            if metadata_file:
+                build_cmd += ['--metadata-file', metadata_file]
+        else:
+            build_cmd.append('--load')  # 加载到本地，之后按原流程推送
+        if self.no_cache or self.cache_mode == 'none':
+            build_cmd.append('--no-cache')
+        if self.cache_mode != 'none':
+            build_cmd += self.get_cache_options(image_name, tag)
+        return build_cmd + [dockerfile_dir]
+
+    @staticmethod
+    def read_metadata_digest(metadata_file: str) -> Optional[str]:
+        """从 BuildKit 元数据文件读取推送的镜像摘要"""
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('containerimage.digest')
+        except (OSError, ValueError):
+            return None
+
+    def record_digest(self, full_image_name: str, digest: Optional[str]) -> None:
+        """记录推送后的镜像摘要"""
+        if digest:
+            print(f"📌 镜像摘要: {digest}")
+            self.pushed_digests[full_image_name] = digest
+
     def validate_dockerfile(self, dockerfile_path: str) -> bool:
         """验证Dockerfile是否有效"""
         try:
@@ -110,61 +271,64 @@ class DockerfileBuilder:
 
             print(f"🐳 构建镜像: {dockerfile_path} -> {full_image_name}")
 
-            # 获取Dockerfile所在目录作为构建上下文
-            dockerfile_dir = os.path.dirname(os.path.abspath(dockerfile_path))
-            dockerfile_name = os.path.basename(dockerfile_path)
-
             # 构建命令
-            build_cmd = [
-                'docker', 'build',
-                '-f', dockerfile_path,  # 指定Dockerfile路径
-                '-t', full_image_name,  # 指定镜像标签
-                '--no-cache',  # 不使用缓存，确保最新
-                dockerfile_dir  # 使用Dockerfile所在目录作为构建上下文
-            ]
+            metadata_file = None
+            if self.pushes_directly():
+                fd, metadata_file = tempfile.mkstemp(prefix='build-metadata-', suffix='.json')
+                os.close(fd)
+            build_cmd = self.get_build_command(dockerfile_path, full_image_name, image_name, tag, metadata_file)
 
             print(f"🔧 构建命令: {' '.join(build_cmd)}")
 
-            # 执行构建
-            result = subprocess.run(
-                build_cmd,
-                capture_output=True,
-                text=True,
-                timeout=1800,  # 30分钟超时
-                check=False
-            )
+            # 执行构建，输出实时转发，只保留最后若干行用于失败报告
+            prefix = f"[{image_name}:{tag}] "
+            metrics = self.metrics.get(dockerfile_path)
+            try:
+                # 直接推送模式下 build 阶段包含推送
+                with metrics.phase('build'):
+                    result = run_streaming(build_cmd, prefix=prefix, timeout=1800)  # 30分钟超时
+                digest = self.read_metadata_digest(metadata_file) if metadata_file else None
+            finally:
+                if metadata_file:
+                    os.unlink(metadata_file)
 
             if result.returncode != 0:
                 print(f"❌ 构建失败: {dockerfile_path}")
-                print(f"错误输出: {result.stderr}")
+                print_tail(result, "错误输出")
                 return False
 
             print(f"✅ 构建成功: {full_image_name}")
+            if self.cache_mode == 'local':
+                self.rotate_local_cache(image_name, tag)
+
+            if metadata_file:
+                print(f"✅ 推送成功: {full_image_name}")
+                self.record_digest(full_image_name, digest or self.get_pushed_digest(image_name, tag))
+                return True
 
             # 推送镜像
             print(f"📤 推送镜像: {full_image_name}")
-            push_result = subprocess.run(
-                ['docker', 'push', full_image_name],
-                capture_output=True,
-                text=True,
-                timeout=600,  # 10分钟超时
-                check=False
-            )
+            with metrics.phase('push'):
+                push_result = run_streaming(['docker', 'push', full_image_name], prefix=prefix,
+                                            timeout=600)  # 10分钟超时
 
             if push_result.returncode != 0:
                 print(f"❌ 推送失败: {full_image_name}")
-                print(f"错误输出: {push_result.stderr}")
+                print_tail(push_result, "错误输出")
                 return False
 
             print(f"✅ 推送成功: {full_image_name}")
 
+            self.record_digest(full_image_name, self.get_pushed_digest(image_name, tag))
+
             # 清理本地镜像以节省空间
             try:
-                subprocess.run(
-                    ['docker', 'rmi', full_image_name],
-                    capture_output=True,
-                    check=False
-                )
+                with metrics.phase('cleanup'):
+                    subprocess.run(
+                        ['docker', 'rmi', full_image_name],
+                        capture_output=True,
+                        check=False
+                    )
                 print(f"🧹 清理本地镜像: {full_image_name}")
             except:
                 pass  # 清理失败不影响构建结果
@@ -198,45 +362,131 @@ class DockerfileBuilder:
             print(f"❌ 读取文件列表失败: {e}")
             return []
 
-    def build_all_dockerfiles(self, files_list: List[str]) -> BuildResult:
-        """构建所有Dockerfile"""
-        result = BuildResult(total_count=len(files_list))
+    def _build_one(self, index: int, total: int, dockerfile_path: str) -> Tuple[bool, str]:
+        """
+        验证并构建单个Dockerfile
 
-        if not files_list:
-            print("ℹ️ 没有找到需要构建的Dockerfile")
-            return result
+        Returns:
+            (是否成功, 结果描述)
+        """
+        print(f"\n📦 [{index}/{total}] 处理: {dockerfile_path}")
 
-        print(f"🚀 开始构建 {result.total_count} 个Docker镜像...")
-        print("=" * 70)
+        # 验证Dockerfile
+        with self.metrics.get(dockerfile_path).phase('validate'):
+            valid = self.validate_dockerfile(dockerfile_path)
+        if not valid:
+            return False, f"❌ {dockerfile_path} (无效的Dockerfile)"
 
-        for i, dockerfile_path in enumerate(files_list, 1):
-            print(f"\n📦 [{i}/{result.total_count}] 处理: {dockerfile_path}")
+        # 获取镜像名和标签
+        try:
+            image_name, tag = self.get_image_name_from_path(dockerfile_path)
+            print(f"🏷️  镜像信息: {image_name}:{tag}")
+        except Exception as e:
+            print(f"❌ 解析镜像名失败: {e}")
+            return False, f"❌ {dockerfile_path} (解析镜像名失败)"
 
-            # 验证Dockerfile
-            if not self.validate_dockerfile(dockerfile_path):
-                result.failed_count += 1
-                result.failed_images.append(f"❌ {dockerfile_path} (无效的Dockerfile)")
-                continue
+        # 构建镜像
+        if self.build_image(dockerfile_path, image_name, tag):
+            full_image_name = f"{self.registry}/{self.namespace}/{image_name}:{tag}"
+            return True, f"✅ {dockerfile_path} -> {full_image_name}"
+        return False, f"❌ {dockerfile_path} (构建失败)"
 
-            # 获取镜像名和标签
-            try:
-                image_name, tag = self.get_image_name_from_path(dockerfile_path)
-                print(f"🏷️  镜像信息: {image_name}:{tag}")
-            except Exception as e:
-                print(f"❌ 解析镜像名失败: {e}")
-                result.failed_count += 1
-                result.failed_images.append(f"❌ {dockerfile_path} (解析镜像名失败)")
-                continue
+    def plan_builds(self, files_list: List[str], root: str = 'dockerfiles') -> Tuple[List[str], Dict[str, Set[str]], List[str]]:
+        """
+        根据 FROM 依赖关系规划构建
 
-            # 构建镜像
-            if self.build_image(dockerfile_path, image_name, tag):
+        基于本命名空间镜像的Dockerfile在其基础镜像变化时一并重新构建
+
+        Returns:
+            (按依赖顺序排列的Dockerfile, 依赖关系, 存在循环依赖的Dockerfile)
+        """
+        candidates = list(dict.fromkeys(files_list + (discover_dockerfiles(root) if os.path.isdir(root) else [])))
+        images = {}
+        for path in candidates:
+            image_name, tag = self.get_image_name_from_path(path)
+            images[path] = f"{self.registry}/{self.namespace}/{image_name}:{tag}"
+        dependencies = build_dependencies(images)
+
+        selected = expand_dependents(files_list, dependencies)
+        for path in selected[len(files_list):]:
+            print(f"➕ 基础镜像有变化，连带构建: {path}")
+
+        order, cyclic = topological_order(selected, dependencies)
+        for path in order:
+            bases = dependencies[path] & set(selected)
+            if bases:
+                print(f"🔗 {path} 依赖: {', '.join(sorted(bases))}")
+        return order, dependencies, cyclic
+
+    def build_all_dockerfiles(self, files_list: List[str], jobs: int = 1) -> BuildResult:
+        """
+        构建所有Dockerfile
+
+        Args:
+            files_list: 变化的Dockerfile
+            jobs: 并行构建数，互不依赖的镜像同时构建，依赖其他镜像的在基础镜像推送后构建
+        """
+        if not files_list:
+            print("ℹ️ 没有找到需要构建的Dockerfile")
+            return BuildResult()
+
+        started = time.perf_counter()
+        order, dependencies, cyclic = self.plan_builds(files_list)
+        result = BuildResult(total_count=len(order) + len(cyclic))
+
+        print(f"🚀 开始构建 {result.total_count} 个Docker镜像（并行数: {jobs}）...")
+        print("=" * 70)
+
+        for path in cyclic:
+            print(f"❌ 存在循环依赖，跳过: {path}")
+            result.failed_count += 1
+            result.failed_images.append(f"❌ {path} (循环依赖)")
+            self.metrics.get(path).status = 'failed'
+            result.image_metrics.append(self.metrics.get(path))
+
+        # 已结束的Dockerfile -> 是否成功
+        finished: Dict[str, bool] = {}
+        lock = threading.Lock()
+
+        def ready(entry: Tuple[int, str]) -> bool:
+            with lock:
+                return all(base in finished for base in dependencies[entry[1]] if base in order)
+
+        def worker(entry: Tuple[int, str]) -> Tuple[bool, str]:
+            index, path = entry
+            with lock:
+                failed = sorted(base for base in dependencies[path] if finished.get(base) is False)
+            if failed:
+                print(f"\n❌ [{index}/{len(order)}] 基础镜像构建失败，跳过: {path} ({', '.join(failed)})")
+                outcome = (False, f"❌ {path} (基础镜像构建失败)")
+            else:
+                outcome = self._build_one(index, len(order), path)
+            with lock:
+                finished[path] = outcome[0]
+            return outcome
+
+        # 构建共用一个并发名额池，调度器只按 ready 判断依赖
+        scheduler = SyncScheduler(jobs=jobs, registry_limits={'build': jobs}, target_limit=jobs)
+        outcomes = scheduler.run(list(enumerate(order, 1)), registry_of=lambda entry: 'build',
+                                 worker=worker, ready=ready)
+
+        for path, outcome in zip(order, outcomes):
+            success, description = outcome or (False, f"❌ {path} (构建失败)")
+            metrics = self.metrics.get(path)
+            metrics.status = 'success' if success else 'failed'
+            result.image_metrics.append(metrics)
+            if success:
                 result.success_count += 1
+                result.success_images.append(description)
+                image_name, tag = self.get_image_name_from_path(path)
                 full_image_name = f"{self.registry}/{self.namespace}/{image_name}:{tag}"
-                result.success_images.append(f"✅ {dockerfile_path} -> {full_image_name}")
+                if full_image_name in self.pushed_digests:
+                    result.image_digests[full_image_name] = self.pushed_digests[full_image_name]
             else:
                 result.failed_count += 1
-                result.failed_images.append(f"❌ {dockerfile_path} (构建失败)")
+                result.failed_images.append(description)
 
+        result.duration_seconds = round(time.perf_counter() - started, 3)
         return result
 
     def save_results(self, result: BuildResult, output_file: str = "build-result.env"):
@@ -261,21 +511,41 @@ class DockerfileBuilder:
                 else:
                     f.write('FAILED_IMAGES=""\n')
 
+                # 推送后的镜像摘要，格式为 镜像名@摘要
+                digest_list = "\\n".join(f"{image}@{digest}" for image, digest in result.image_digests.items())
+                f.write(f"IMAGE_DIGESTS=\"{digest_list}\"\n")
+
         except Exception as e:
             print(f"❌ 保存结果失败: {e}")
 
+        # 同名的 .json 报告和 .prom 指标文件
+        write_reports(output_file, 'build', result.image_metrics, {
+            'total': result.total_count,
+            'success': result.success_count,
+            'failed': result.failed_count,
+            'duration_seconds': result.duration_seconds,
+        })
+
 def main():
     parser = argparse.ArgumentParser(description='Dockerfile自动构建处理器')
     parser.add_argument('--files', help='包含Dockerfile路径列表的文件')
     parser.add_argument('--namespace', help='阿里云命名空间')
     parser.add_argument('--output', default='build-result.env', help='输出结果文件')
     parser.add_argument('--validate-only', action='store_true', help='仅验证Dockerfile，不构建')
+    parser.add_argument('--cache', choices=CACHE_MODES, default=DEFAULT_CACHE_MODE,
+                        help='BuildKit 构建缓存：registry 使用仓库缓存，local 使用本地目录，none 不使用缓存')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='local 模式下的缓存目录')
+    parser.add_argument('--no-cache', action='store_true', help='强制冷构建，不读取已有缓存（仍会导出新缓存）')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='并行构建数（互不依赖的镜像同时构建）')
+    parser.add_argument('--output-mode', choices=OUTPUT_MODES, default=DEFAULT_OUTPUT_MODE,
+                        help='push 由 BuildKit 直接推送到仓库，load 加载到本地后再 docker push')
 
     args = parser.parse_args()
 
     try:
         # 初始化构建器
-        builder = DockerfileBuilder(args.namespace)
+        builder = DockerfileBuilder(args.namespace, cache_mode=args.cache, cache_dir=args.cache_dir,
+                                    no_cache=args.no_cache, output_mode=args.output_mode)
 
         # 加载文件列表
         if not args.files:
@@ -291,7 +561,7 @@ def main():
             return
 
         # 执行构建
-        result = builder.build_all_dockerfiles(dockerfiles)
+        result = builder.build_all_dockerfiles(dockerfiles, jobs=max(1, args.jobs))
         builder.save_results(result, args.output)
 
         print("\n" + "=" * 70)
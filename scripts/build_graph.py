@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Dockerfile依赖图
+解析 FROM 指令，找出基于本命名空间其他镜像构建的Dockerfile，
+基础镜像变化时连带重新构建依赖它的镜像，并按依赖顺序排列
+"""
+
+import os
+import re
+from typing import List, Dict, Set, Tuple
+
+_FROM_PATTERN = re.compile(r'^FROM\s+(?:--\S+\s+)*(\S+)(?:\s+AS\s+(\S+))?', re.IGNORECASE)
+
+
+def normalize_image(image: str) -> str:
+    """补全默认标签，便于比较镜像引用"""
+    if '@' in image:
+        return image
+    if ':' not in image.split('/')[-1]:
+        return f"{image}:latest"
+    return image
+
+
+def parse_base_images(dockerfile_path: str) -> List[str]:
+    """
+    读取Dockerfile引用的外部基础镜像
+
+    多阶段构建中引用前面阶段的 FROM、scratch 以及包含变量的引用会被忽略
+    """
+    bases: List[str] = []
+    stages: Set[str] = set()
+    try:
+        with open(dockerfile_path, 'r', encoding='utf-8') as f:
+            lines = f.read().replace('\\\n', ' ').splitlines()
+    except OSError:
+        return bases
+
+    for line in lines:
+        match = _FROM_PATTERN.match(line.strip())
+        if not match:
+            continue
+        image, alias = match.group(1), match.group(2)
+        if alias:
+            stages.add(alias.lower())
+        if image.lower() in stages or image == 'scratch' or '$' in image:
+            continue
+        bases.append(normalize_image(image))
+    return bases
+
+
+def discover_dockerfiles(root: str = 'dockerfiles') -> List[str]:
+    """列出目录下的所有Dockerfile（与工作流中 find 的规则一致，忽略隐藏文件）"""
+    found = []
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        found.extend(os.path.join(directory, name) for name in files if not name.startswith('.'))
+    return sorted(found)
+
+
+def build_dependencies(images: Dict[str, str]) -> Dict[str, Set[str]]:
+    """
+    建立Dockerfile之间的依赖关系
+
+    Args:
+        images: Dockerfile路径 -> 构建出的完整镜像名
+
+    Returns:
+        Dockerfile路径 -> 其基础镜像对应的Dockerfile路径集合
+    """
+    producers = {normalize_image(image): path for path, image in images.items()}
+    dependencies: Dict[str, Set[str]] = {}
+    for path in images:
+        dependencies[path] = {producers[base] for base in parse_base_images(path)
+                              if base in producers and producers[base] != path}
+    return dependencies
+
+
+def expand_dependents(changed: List[str], dependencies: Dict[str, Set[str]]) -> List[str]:
+    """
+    加入依赖已变化镜像的所有Dockerfile（递归）
+
+    Returns:
+        需要构建的Dockerfile，变化的文件在前，连带构建的按路径排序
+    """
+    selected = list(dict.fromkeys(changed))
+    known = set(selected)
+    grown = True
+    while grown:
+        grown = False
+        for path in sorted(dependencies):
+            if path not in known and dependencies[path] & known:
+                selected.append(path)
+                known.add(path)
+                grown = True
+    return selected
+
+
+def topological_order(paths: List[str], dependencies: Dict[str, Set[str]]) -> Tuple[List[str], List[str]]:
+    """
+    按依赖顺序排列，同一层级保持原有顺序
+
+    Returns:
+        (排序后的路径, 存在循环依赖而无法排序的路径)
+    """
+    selected = set(paths)
+    remaining = {path: dependencies.get(path, set()) & selected for path in paths}
+    order: List[str] = []
+    while True:
+        ready = [path for path in paths if path in remaining and not remaining[path]]
+        if not ready:
+            break
+        for path in ready:
+            del remaining[path]
+            order.append(path)
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order, [path for path in paths if path in remaining]
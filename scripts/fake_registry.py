@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+进程内的模拟镜像仓库
+实现 Distribution API 的常用端点（令牌认证、清单、数据块、分块上传、跨仓库挂载、标签分页），
+用于离线基准测试，不需要Docker
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import urlparse, parse_qs, urlencode
+
+
+class FakeRegistry:
+    """
+    模拟镜像仓库
+
+    数据全部保存在内存中；request_counts 按 "端点_方法" 统计请求数，
+    faults 可注入故障（例如 {'blob_GET': 1} 让下一次数据块下载中途断开，
+    'blob_corrupt' 返回内容损坏的数据块，'manifest_GET' 返回 503）；
+    设置 pull_limit 时像 Docker Hub 一样按清单 GET 计数，返回 RateLimit 头，
+    每 pull_window 秒内超出配额的请求返回 429
+    """
+
+    def __init__(self, require_auth: bool = False, host: str = '127.0.0.1', port: int = 0,
+                 pull_limit: Optional[int] = None, pull_window: int = 21600):
+        self.require_auth = require_auth
+        self.pull_limit = pull_limit
+        self.pull_window = pull_window
+        self.pulls = 0
+        self.window_start = time.monotonic()
+        self.tokens: Dict[str, Dict[str, Set[str]]] = {}
+        self.connections = 0
+        self.blobs: Dict[str, bytes] = {}
+        self.repo_blobs: Dict[str, Set[str]] = {}
+        self.manifests: Dict[str, Dict[str, Tuple[bytes, str]]] = {}
+        self.tags: Dict[str, Dict[str, str]] = {}
+        self.uploads: Dict[str, bytearray] = {}
+        self.request_counts: Dict[str, int] = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.faults: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> 'FakeRegistry':
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_blob(self, repository: str, data: bytes) -> str:
+        """直接写入数据块，返回摘要"""
+        digest = 'sha256:' + hashlib.sha256(data).hexdigest()
+        with self.lock:
+            self.blobs[digest] = data
+            self.repo_blobs.setdefault(repository, set()).add(digest)
+        return digest
+
+    def add_manifest(self, repository: str, tag: Optional[str], data: bytes, media_type: str) -> str:
+        """直接写入清单，返回摘要"""
+        digest = 'sha256:' + hashlib.sha256(data).hexdigest()
+        with self.lock:
+            self.manifests.setdefault(repository, {})[digest] = (data, media_type)
+            if tag:
+                self.tags.setdefault(repository, {})[tag] = digest
+        return digest
+
+    def _take_fault(self, kind: str) -> bool:
+        with self.lock:
+            if self.faults.get(kind, 0) > 0:
+                self.faults[kind] -= 1
+                return True
+        return False
+
+    def _take_pull(self, count: bool) -> Tuple[int, float]:
+        """
+        按配额计数一次清单请求
+
+        Returns:
+            (剩余配额, 距窗口重置的秒数)；剩余配额为 -1 表示已超出
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.pull_window:
+                self.window_start, self.pulls = now, 0
+            reset = self.pull_window - (now - self.window_start)
+            if count:
+                if self.pulls >= self.pull_limit:
+                    return -1, reset
+                self.pulls += 1
+            return self.pull_limit - self.pulls, reset
+
+    def _handler(self):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with registry.lock:
+                    registry.connections += 1
+
+            def _count(self, kind: str) -> None:
+                with registry.lock:
+                    registry.request_counts[kind] = registry.request_counts.get(kind, 0) + 1
+
+            def _reply(self, status: int, body: bytes = b'', headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                if 'Content-Length' not in (headers or {}):
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD' and body:
+                    self.wfile.write(body)
+                    with registry.lock:
+                        registry.bytes_sent += len(body)
+
+            def _read_body(self) -> bytes:
+                length = int(self.headers.get('Content-Length') or 0)
+                data = self.rfile.read(length) if length else b''
+                with registry.lock:
+                    registry.bytes_received += len(data)
+                return data
+
+            def _authorized(self, repository: str, action: str,
+                            extra: Optional[Tuple[str, str]] = None) -> bool:
+                if not registry.require_auth:
+                    return True
+                auth = self.headers.get('Authorization', '')
+                granted = registry.tokens.get(auth[len('Bearer '):]) if auth.startswith('Bearer ') else None
+                needed = [(repository, action)] + ([extra] if extra else [])
+                if granted is not None and all(a in granted.get(f'repository:{r}', set()) for r, a in needed):
+                    return True
+                scope = ' '.join(f'repository:{r}:{"pull,push" if a == "push" else a}' for r, a in needed)
+                # 读完请求体，连接才能继续用于下一个请求
+                self._read_body()
+                self._reply(401, b'{"errors":[{"code":"UNAUTHORIZED"}]}', {
+                    'WWW-Authenticate': f'Bearer realm="http://{registry.address}/token",service="fake",scope="{scope}"'
+                })
+                return False
+
+            def _route(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                path = url.path
+                if path == '/token':
+                    return self.token(query)
+                if path in ('/v2', '/v2/'):
+                    return self._reply(200, b'{}')
+                match = re.match(r'^/v2/(.+)/tags/list$', path)
+                if match:
+                    return self.tags_list(match.group(1), query)
+                match = re.match(r'^/v2/(.+)/manifests/([^/]+)$', path)
+                if match:
+                    return self.manifest(match.group(1), match.group(2))
+                match = re.match(r'^/v2/(.+)/blobs/uploads/([^/]*)$', path)
+                if match:
+                    return self.upload(match.group(1), match.group(2), query)
+                match = re.match(r'^/v2/(.+)/blobs/(sha256:[0-9a-f]+)$', path)
+                if match:
+                    return self.blob(match.group(1), match.group(2))
+                self._reply(404)
+
+            do_GET = do_HEAD = do_PUT = do_POST = do_PATCH = do_DELETE = _route
+
+            def token(self, query):
+                self._count('token')
+                scopes: Dict[str, Set[str]] = {}
+                for item in query.get('scope', []):
+                    resource, _, actions = item.rpartition(':')
+                    scopes.setdefault(resource, set()).update(actions.split(','))
+                token = uuid.uuid4().hex
+                with registry.lock:
+                    registry.tokens[token] = scopes
+                self._reply(200, json.dumps({'token': token, 'expires_in': 300}).encode(),
+                            {'Content-Type': 'application/json'})
+
+            def tags_list(self, repository, query):
+                if not self._authorized(repository, 'pull'):
+                    return
+                self._count('tags_list')
+                tags = sorted(registry.tags.get(repository, {}))
+                if not tags and repository not in registry.manifests:
+                    return self._reply(404, b'{"errors":[{"code":"NAME_UNKNOWN"}]}')
+                last = query.get('last', [''])[0]
+                limit = int(query.get('n', ['100'])[0])
+                if last:
+                    tags = [tag for tag in tags if tag > last]
+                page, rest = tags[:limit], tags[limit:]
+                body = json.dumps({'name': repository, 'tags': page}).encode()
+                headers = {'Content-Type': 'application/json', 'ETag': f'"{hashlib.sha256(body).hexdigest()[:16]}"'}
+                if rest:
+                    headers['Link'] = f'</v2/{repository}/tags/list?{urlencode({"n": limit, "last": page[-1]})}>; rel="next"'
+                if self.headers.get('If-None-Match') == headers['ETag']:
+                    self._count('tags_list_not_modified')
+                    return self._reply(304, b'', headers)
+                self._reply(200, body, headers)
+
+            def manifest(self, repository, reference):
+                if not self._authorized(repository, 'pull' if self.command in ('GET', 'HEAD') else 'push'):
+                    return
+                self._count(f'manifest_{self.command}')
+                quota_headers: Dict[str, str] = {}
+                if self.command in ('GET', 'HEAD') and registry.pull_limit is not None:
+                    remaining, reset = registry._take_pull(self.command == 'GET')
+                    window = f';w={registry.pull_window}'
+                    if remaining < 0:
+                        return self._reply(429, b'{"errors":[{"code":"TOOMANYREQUESTS"}]}', {
+                            'Retry-After': str(max(1, int(reset + 0.999))),
+                            'RateLimit-Limit': f'{registry.pull_limit}{window}',
+                            'RateLimit-Remaining': f'0{window}',
+                        })
+                    quota_headers = {'RateLimit-Limit': f'{registry.pull_limit}{window}',
+                                     'RateLimit-Remaining': f'{remaining}{window}'}
+                if self.command == 'GET' and registry._take_fault('manifest_GET'):
+                    return self._reply(503, b'{"errors":[{"code":"UNAVAILABLE"}]}')
+                if self.command in ('GET', 'HEAD'):
+                    if reference.startswith('sha256:'):
+                        digest = reference
+                    else:
+                        digest = registry.tags.get(repository, {}).get(reference)
+                    entry = registry.manifests.get(repository, {}).get(digest) if digest else None
+                    if not entry:
+                        return self._reply(404, b'{"errors":[{"code":"MANIFEST_UNKNOWN"}]}')
+                    data, media_type = entry
+                    return self._reply(200, data, {'Content-Type': media_type, 'Docker-Content-Digest': digest,
+                                                   'Content-Length': str(len(data)), **quota_headers})
+                if self.command == 'PUT':
+                    data = self._read_body()
+                    manifest = json.loads(data)
+                    known_blobs = registry.repo_blobs.get(repository, set())
+                    for descriptor in [manifest.get('config')] + manifest.get('layers', []):
+                        if descriptor and descriptor['digest'] not in known_blobs:
+                            return self._reply(400, b'{"errors":[{"code":"BLOB_UNKNOWN"}]}')
+                    for descriptor in manifest.get('manifests', []):
+                        if descriptor['digest'] not in registry.manifests.get(repository, {}):
+                            return self._reply(400, b'{"errors":[{"code":"MANIFEST_UNKNOWN"}]}')
+                    tag = None if reference.startswith('sha256:') else reference
+                    digest = registry.add_manifest(repository, tag, data, self.headers.get('Content-Type'))
+                    return self._reply(201, b'', {'Docker-Content-Digest': digest,
+                                                   'Location': f'/v2/{repository}/manifests/{digest}'})
+                self._reply(405)
+
+            def blob(self, repository, digest):
+                if not self._authorized(repository, 'pull'):
+                    return
+                self._count(f'blob_{self.command}')
+                if digest not in registry.repo_blobs.get(repository, set()):
+                    return self._reply(404, b'{"errors":[{"code":"BLOB_UNKNOWN"}]}')
+                data = registry.blobs[digest]
+                if self.command == 'GET' and registry._take_fault('blob_corrupt'):
+                    data = bytes([data[0] ^ 0xff]) + data[1:]
+                if self.command == 'GET' and registry._take_fault('blob_GET'):
+                    # 模拟下载中途断开
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data[:len(data) // 2])
+                    self.close_connection = True
+                    return
+                range_header = self.headers.get('Range')
+                if range_header and self.command == 'GET':
+                    start, _, end = range_header.replace('bytes=', '').partition('-')
+                    start = int(start)
+                    end = int(end) if end else len(data) - 1
+                    part = data[start:end + 1]
+                    return self._reply(206, part, {'Content-Range': f'bytes {start}-{end}/{len(data)}',
+                                                   'Content-Length': str(len(part)),
+                                                   'Docker-Content-Digest': digest})
+                self._reply(200, data, {'Content-Length': str(len(data)), 'Docker-Content-Digest': digest,
+                                        'Content-Type': 'application/octet-stream'})
+
+            def upload(self, repository, upload_id, query):
+                source = query.get('from', [None])[0]
+                if not self._authorized(repository, 'push', (source, 'pull') if source else None):
+                    return
+                self._count(f'upload_{self.command}')
+                if self.command == 'POST':
+                    mount = query.get('mount', [None])[0]
+                    if mount and source and mount in registry.repo_blobs.get(source, set()):
+                        with registry.lock:
+                            registry.repo_blobs.setdefault(repository, set()).add(mount)
+                        return self._reply(201, b'', {'Location': f'/v2/{repository}/blobs/{mount}',
+                                                       'Docker-Content-Digest': mount})
+                    session = uuid.uuid4().hex
+                    registry.uploads[session] = bytearray()
+                    digest = query.get('digest', [None])[0]
+                    body = self._read_body()
+                    if digest:
+                        registry.uploads[session] += body
+                        return self._finish(repository, session, digest)
+                    return self._reply(202, b'', {'Location': f'/v2/{repository}/blobs/uploads/{session}',
+                                                   'Docker-Upload-UUID': session})
+
+                if upload_id not in registry.uploads:
+                    return self._reply(404, b'{"errors":[{"code":"BLOB_UPLOAD_UNKNOWN"}]}')
+                buffer = registry.uploads[upload_id]
+                location = f'/v2/{repository}/blobs/uploads/{upload_id}'
+                # Range 为最后一个已接收字节的位置，空会话不返回
+                committed = {'Range': f'0-{len(buffer) - 1}'} if buffer else {}
+                if self.command == 'GET':
+                    return self._reply(204, b'', dict(committed, Location=location))
+                if self.command == 'PATCH':
+                    if registry._take_fault('upload_PATCH'):
+                        self._read_body()
+                        return self._reply(500, b'{"errors":[{"code":"UNKNOWN"}]}')
+                    content_range = self.headers.get('Content-Range')
+                    if content_range and int(content_range.split('-')[0]) != len(buffer):
+                        self._read_body()
+                        return self._reply(416, b'', committed)
+                    buffer += self._read_body()
+                    return self._reply(202, b'', {'Location': location, 'Range': f'0-{len(buffer) - 1}'})
+                if self.command == 'PUT':
+                    buffer += self._read_body()
+                    return self._finish(repository, upload_id, query.get('digest', [''])[0])
+                self._reply(405)
+
+            def _finish(self, repository, upload_id, digest):
+                data = bytes(registry.uploads.pop(upload_id))
+                if 'sha256:' + hashlib.sha256(data).hexdigest() != digest:
+                    return self._reply(400, b'{"errors":[{"code":"DIGEST_INVALID"}]}')
+                registry.add_blob(repository, data)
+                self._reply(201, b'', {'Location': f'/v2/{repository}/blobs/{digest}',
+                                       'Docker-Content-Digest': digest})
+
+        return Handler
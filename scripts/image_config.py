@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+镜像配置加载
+unified_sync 和 json_image_processor 共用的配置解析：支持 images.json、
+images.jsonl（JSON Lines，逐行流式读取，适合上千条的镜像列表）和 images.txt，
+一遍完成解析、校验、引用规范化和去重；标签可以是选择器（见 tag_selector），同步时展开
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Union
+
+from tag_selector import TagSelector, is_glob, parse_selector
+from layer_compression import COMPRESSIONS
+from image_copier import is_multi_platform
+
+CONFIG_FILES = ('images.json', 'images.jsonl', 'images.txt')
+JSON_LINES_SUFFIXES = ('.jsonl', '.ndjson')
+DEFAULT_REGISTRY = 'docker.io'
+DEFAULT_TAG = 'latest'
+
+# Docker Hub 的几种写法都视为同一个仓库
+_DOCKER_HUB_ALIASES = {'docker.io', 'index.docker.io', 'registry-1.docker.io'}
+_PATH_COMPONENT = re.compile(r'^[a-z0-9]+(?:(?:[._]|__|-+)[a-z0-9]+)*$')
+_REGISTRY_HOST = re.compile(r'^[A-Za-z0-9.-]+(?::[0-9]+)?$')
+_TAG = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.-]{0,127}$')
+_PLATFORM = re.compile(r'^[a-z0-9_]+/[a-z0-9_]+(?:/[a-z0-9_.]+)?$')
+
+
+class ConfigError(ValueError):
+    """配置文件无法读取或格式错误"""
+
+
+@dataclass(slots=True)
+class ImageConfig:
+    """
+    一条镜像配置
+
+    repository / tag 保留配置中的写法，用于显示和拉取；
+    reference 是规范化后的完整引用（补全 docker.io/library/ 和 latest），用于去重。
+    tag_selector 不为空时 tag 是选择器的文本形式，同步前需要展开为具体标签；
+    展开得到的配置 expanded 为 True。compression 为推送时重新压缩 gzip 镜像层的格式
+    """
+    repository: str
+    tag: str = DEFAULT_TAG
+    platform: Optional[str] = None
+    description: str = ''
+    id: str = ''
+    priority: int = 1
+    private_registry: bool = False
+    custom_name: Optional[str] = None
+    reference: str = ''
+    tag_selector: Optional[TagSelector] = None
+    expanded: bool = False
+    compression: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        """去重键：规范化引用 + 平台"""
+        return self.reference, self.platform or ''
+
+    @property
+    def target(self) -> Tuple[str, str]:
+        """目标仓库中的 (镜像名, 标签)，两条配置的目标相同时后推送的会覆盖先推送的"""
+        return target_name(self.repository, self.tag, self.platform)
+
+
+@dataclass
+class LoadedConfig:
+    """加载结果"""
+    images: List[ImageConfig] = field(default_factory=list)
+    # 每条为 (位置, 说明)
+    errors: List[Tuple[str, str]] = field(default_factory=list)
+    duplicates: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def detect_config_file() -> str:
+    """在当前目录查找配置文件"""
+    for name in CONFIG_FILES:
+        if os.path.exists(name):
+            return name
+    raise FileNotFoundError(f"未找到配置文件 ({' 或 '.join(CONFIG_FILES)})")
+
+
+def split_reference(reference: str) -> Tuple[str, str]:
+    """拆分 repo:tag，冒号只在最后一段中才是标签分隔符（registry:5000/nginx 没有标签）"""
+    name = reference.rsplit('/', 1)[-1]
+    if ':' in name:
+        repository, tag = reference.rsplit(':', 1)
+        return repository, tag
+    return reference, DEFAULT_TAG
+
+
+def normalize_reference(repository: str, tag: str = DEFAULT_TAG) -> str:
+    """
+    规范化镜像引用
+
+    nginx -> docker.io/library/nginx:latest，
+    registry-1.docker.io/foo/bar:1 -> docker.io/foo/bar:1
+    """
+    first, _, rest = repository.partition('/')
+    if rest and ('.' in first or ':' in first or first == 'localhost'):
+        registry, path = first.lower(), rest
+    else:
+        registry, path = DEFAULT_REGISTRY, repository
+    if registry in _DOCKER_HUB_ALIASES:
+        registry = DEFAULT_REGISTRY
+        if '/' not in path:
+            path = f"library/{path}"
+    return f"{registry}/{path}:{tag or DEFAULT_TAG}"
+
+
+def target_name(repository: str, tag: str = DEFAULT_TAG, platform: Optional[str] = None) -> Tuple[str, str]:
+    """
+    目标仓库中的镜像名和标签（不含命名空间）
+
+    去掉源仓库地址和命名空间，指定单一平台时添加平台前缀，例如 linux_arm64_nginx；
+    多架构复制保留原名，由清单列表区分平台。未指定平台（默认 linux/amd64）同样保留原名，
+    因此与同一标签的多架构复制、以及不同源仓库中的同名镜像会使用相同的目标
+    """
+    name = repository.rsplit('/', 1)[-1]
+    if platform and not is_multi_platform(platform):
+        name = f"{platform.replace('/', '_')}_{name}"
+    return name, tag or DEFAULT_TAG
+
+
+def normalize_platform(platform: Union[str, List[str], None]) -> Optional[str]:
+    """平台列表统一为逗号分隔的字符串，去掉空白和重复项"""
+    if not platform:
+        return None
+    items = platform if isinstance(platform, list) else str(platform).split(',')
+    items = [str(item).strip().lower() for item in items if str(item).strip()]
+    return ','.join(dict.fromkeys(items)) or None
+
+
+def _validate(image: ImageConfig) -> Optional[str]:
+    """检查引用和平台格式，合法时返回None"""
+    if '@' in image.repository:
+        return f"暂不支持按摘要引用: {image.repository}"
+    first, _, rest = image.repository.partition('/')
+    has_registry = rest and ('.' in first or ':' in first or first == 'localhost')
+    if has_registry and not _REGISTRY_HOST.match(first):
+        return f"仓库地址格式错误: {first}"
+    path = rest if has_registry else image.repository
+    for component in path.split('/'):
+        if not _PATH_COMPONENT.match(component):
+            return f"镜像名格式错误（只能包含小写字母、数字和分隔符）: {image.repository}"
+    if not image.tag_selector and not _TAG.match(image.tag):
+        return f"标签格式错误: {image.tag}"
+    if image.platform:
+        for platform in image.platform.split(','):
+            if platform != 'all' and not _PLATFORM.match(platform):
+                return f"平台格式错误（应为 os/arch[/variant] 或 all）: {platform}"
+        if 'all' in image.platform.split(',') and image.platform != 'all':
+            return f"平台 all 不能与其他平台同时指定: {image.platform}"
+    if not isinstance(image.priority, int) or isinstance(image.priority, bool):
+        return f"priority 必须是整数: {image.priority!r}"
+    if image.compression == 'zstd:chunked':
+        return "暂不支持 zstd:chunked（需要生成按文件分块的目录和 tar-split 元数据），请使用 zstd"
+    if image.compression and image.compression not in COMPRESSIONS:
+        return f"compression 只支持 {', '.join(COMPRESSIONS)}: {image.compression}"
+    return None
+
+
+def parse_text_line(line: str) -> Tuple[str, Optional[str]]:
+    """
+    解析 images.txt 格式的一行
+
+    支持 nginx:1.25、--platform=linux/arm64 nginx 和 --platform linux/arm64 nginx
+
+    Returns:
+        (镜像引用, 平台)
+    """
+    platform = None
+    reference = None
+    parts = line.split()
+    i = 0
+    while i < len(parts):
+        part = parts[i]
+        if part.startswith('--platform='):
+            platform = part.split('=', 1)[1]
+        elif part == '--platform':
+            if i + 1 >= len(parts):
+                raise ConfigError("--platform 缺少参数")
+            platform = parts[i + 1]
+            i += 1
+        elif part.startswith('--'):
+            raise ConfigError(f"不支持的参数: {part}")
+        elif reference is None:
+            reference = part
+        else:
+            raise ConfigError(f"一行只能包含一个镜像: {line}")
+        i += 1
+    if not reference:
+        raise ConfigError("缺少镜像名")
+    return reference, platform
+
+
+def _selector(value: Any) -> Optional[TagSelector]:
+    if value is None:
+        return None
+    try:
+        return parse_selector(value)
+    except ValueError as e:
+        raise ConfigError(f"标签选择器错误: {e}") from e
+
+
+def parse_entry(entry: Union[Dict[str, Any], str], index: int, description: str = '') -> ImageConfig:
+    """
+    解析一条配置
+
+    entry 为字符串时按 images.txt 的一行处理；为对象时支持
+    简单格式 {"name": "nginx", "tag": "latest"} 和
+    增强格式 {"source": {"repository": "...", "tag": "..."}, "options": {...}}，
+    选项可以写在根级别或 options 中
+    """
+    if isinstance(entry, str):
+        reference, platform = parse_text_line(entry)
+        repository, tag = split_reference(reference)
+        selector = _selector(tag if is_glob(tag) else None)
+        return ImageConfig(repository=repository, tag=selector.describe() if selector else tag,
+                           platform=normalize_platform(platform), description=description,
+                           id=f"img-{index:03d}", tag_selector=selector)
+
+    if not isinstance(entry, dict):
+        raise ConfigError(f"配置项必须是对象或字符串，实际为 {type(entry).__name__}")
+
+    if 'source' in entry:
+        source = entry['source'] or {}
+        repository = source.get('repository') or ''
+        tag = source.get('tag') or DEFAULT_TAG
+        tags = source.get('tags')
+    elif 'name' in entry:
+        repository = entry['name'] or ''
+        tag = entry.get('tag') or DEFAULT_TAG
+        tags = entry.get('tags')
+    else:
+        raise ConfigError("缺少 name 或 source 字段")
+
+    # tags 为选择器；tag 中带通配符时按 glob 选择器处理
+    if tags is None and is_glob(str(tag)):
+        tags = str(tag).strip()
+    selector = _selector(tags)
+
+    repository = str(repository).strip()
+    if not repository:
+        raise ConfigError("缺少 repository 字段")
+
+    options = entry.get('options') or {}
+
+    def option(name: str, default: Any = None) -> Any:
+        value = entry.get(name)
+        return value if value is not None else options.get(name, default)
+
+    # platforms 为平台列表或 "all" 时，一次复制多架构清单列表
+    platform = option('platforms') or option('platform')
+    # gzip 即保持源镜像层的格式
+    compression = str(option('compression') or 'gzip').strip().lower()
+    target = entry.get('target') or {}
+    return ImageConfig(
+        repository=repository,
+        tag=selector.describe() if selector else str(tag).strip(),
+        tag_selector=selector,
+        platform=normalize_platform(platform),
+        description=option('description') or description,
+        id=str(entry.get('id') or f"img-{index:03d}"),
+        priority=option('priority', 1),
+        private_registry=bool(option('private_registry', False)),
+        custom_name=option('custom_name') or target.get('custom_name'),
+        compression=None if compression == 'gzip' else compression,
+    )
+
+
+def iter_entries(config_file: str) -> Iterator[Tuple[str, Any, str]]:
+    """
+    逐条读取配置项
+
+    JSON Lines 和文本格式逐行读取，不会一次载入整个文件；
+    单行的 JSON 错误作为该行的配置错误返回，不中断读取
+
+    Yields:
+        (位置说明, 配置项或 ConfigError, 默认描述)
+    """
+    if config_file.endswith('.json'):
+        try:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"JSON解析错误: {e}") from e
+        if not isinstance(data, dict) or not isinstance(data.get('images'), list):
+            raise ConfigError("JSON配置中缺少'images'列表")
+        for index, entry in enumerate(data['images']):
+            yield f"索引 {index}", entry, ''
+        return
+
+    json_lines = config_file.endswith(JSON_LINES_SUFFIXES)
+    with open(config_file, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            location = f"第 {line_num} 行"
+            description = f'从{config_file}第{line_num}行加载'
+            if json_lines and line.startswith(('{', '"')):
+                try:
+                    yield location, json.loads(line), description
+                except json.JSONDecodeError as e:
+                    yield location, ConfigError(f"JSON解析错误: {e}"), description
+            else:
+                yield location, line, description
+
+
+def load_images(config_file: str) -> LoadedConfig:
+    """
+    加载、校验并去重镜像配置
+
+    同一引用和平台重复出现、或推送到同一个目标镜像（见 target_name）时保留第一条；
+    格式错误的条目会被跳过并记录在 errors 中
+
+    Raises:
+        ConfigError: 文件不存在或整体格式错误
+    """
+    if not os.path.exists(config_file):
+        raise ConfigError(f"配置文件不存在: {config_file}")
+
+    loaded = LoadedConfig()
+    seen: Dict[Tuple[str, str], str] = {}
+    targets: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for index, (location, entry, description) in enumerate(iter_entries(config_file)):
+        try:
+            if isinstance(entry, ConfigError):
+                raise entry
+            image = parse_entry(entry, index, description)
+        except ConfigError as e:
+            loaded.errors.append((location, str(e)))
+            continue
+
+        error = _validate(image)
+        if error:
+            loaded.errors.append((location, error))
+            continue
+
+        image.reference = normalize_reference(image.repository, image.tag)
+        if image.key in seen:
+            loaded.duplicates.append((location, f"{image.reference} 与{seen[image.key]}重复"))
+            continue
+        # 选择器的目标标签在展开后才能确定（见 unified_sync.expand_tag_selectors）
+        if not image.tag_selector:
+            if image.target in targets:
+                other_location, other_reference = targets[image.target]
+                loaded.duplicates.append((location, f"{image.reference} 的目标 {':'.join(image.target)} "
+                                                    f"与{other_location}的 {other_reference} 相同"))
+                continue
+            targets[image.target] = (location, image.reference)
+        seen[image.key] = location
+        loaded.images.append(image)
+    return loaded
+
+
+def report(loaded: LoadedConfig, config_file: str) -> None:
+    """打印加载结果、错误和跳过的重复项"""
+    for location, message in loaded.errors:
+        print(f"❌ 配置错误（{location}）: {message}")
+    for location, message in loaded.duplicates:
+        print(f"⏭️ 跳过重复镜像（{location}）: {message}")
+    print(f"✅ 成功加载 {len(loaded.images)} 个镜像配置 ({config_file})"
+          + (f"，跳过 {len(loaded.duplicates)} 个重复项" if loaded.duplicates else '')
+          + (f"，{len(loaded.errors)} 个错误" if loaded.errors else ''))
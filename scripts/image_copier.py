@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+仓库到仓库的镜像复制引擎
+以流的方式在源仓库和目标仓库之间转发清单和数据块，不经过Docker守护进程，也不解压镜像层
+"""
+
+import hashlib
+import http.client
+import json
+import threading
+import time
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterator
+from dataclasses import dataclass, field
+
+from registry_client import (
+    RegistryClient, RegistryError, ImageReference, INDEX_MEDIA_TYPES, CHUNK_SIZE, UPLOAD_CHUNK_SIZE
+)
+from retry_policy import classify, retry_delay, DIGEST_MISMATCH
+from blob_cache import BlobCache
+from layer_compression import LayerMap, recompress, is_compressible, convert_manifest, convert_index
+
+DEFAULT_PLATFORM = 'linux/amd64'
+
+
+def _platform_matches(descriptor: Dict[str, Any], platform: str) -> bool:
+    """判断清单列表中的条目是否匹配指定平台，例如 linux/arm64/v8"""
+    parts = platform.split('/')
+    info = descriptor.get('platform', {})
+    if info.get('os') != parts[0] or info.get('architecture') != (parts[1] if len(parts) > 1 else None):
+        return False
+    if len(parts) > 2:
+        return info.get('variant') == parts[2]
+    return True
+
+
+def is_multi_platform(platform: Optional[str]) -> bool:
+    """平台参数是否表示多架构复制，例如 linux/amd64,linux/arm64 或 all"""
+    return bool(platform) and (platform == 'all' or ',' in platform)
+
+
+@dataclass
+class CopyResult:
+    """单个镜像的复制结果"""
+    digest: str = ''
+    source_digest: str = ''
+    # 源镜像对应平台的清单摘要；重新压缩镜像层后与推送的 digest 不同
+    platform_digest: str = ''
+    blobs_skipped: int = 0
+    blobs_mounted: int = 0
+    blobs_uploaded: int = 0
+    bytes_uploaded: int = 0
+    bytes_downloaded: int = 0
+    # 从本地数据块缓存读取、未向源仓库请求的字节数
+    bytes_from_cache: int = 0
+    retries: int = 0
+    # 数据块复制（边拉边推）和推送清单的耗时
+    transfer_seconds: float = 0.0
+    push_seconds: float = 0.0
+
+    def merge(self, other: 'CopyResult') -> None:
+        """累加另一次复制的数据块统计"""
+        self.blobs_skipped += other.blobs_skipped
+        self.blobs_mounted += other.blobs_mounted
+        self.blobs_uploaded += other.blobs_uploaded
+        self.bytes_uploaded += other.bytes_uploaded
+        self.bytes_downloaded += other.bytes_downloaded
+        self.bytes_from_cache += other.bytes_from_cache
+        self.retries += other.retries
+        self.transfer_seconds += other.transfer_seconds
+        self.push_seconds += other.push_seconds
+
+
+@dataclass
+class ImagePlan:
+    """单个镜像的复制计划"""
+    source_ref: ImageReference
+    tag_digest: str
+    manifest: bytes
+    media_type: str
+    # 多架构复制时各平台的清单: (内容, 媒体类型, 摘要)
+    children: List[Tuple[bytes, str, str]] = field(default_factory=list)
+    # 去重后的数据块描述
+    blobs: List[Dict[str, Any]] = field(default_factory=list)
+    # 重新压缩 gzip 镜像层的格式（见 layer_compression），None 表示原样复制
+    compression: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        """镜像数据块总大小（压缩后）"""
+        return sum(blob.get('size', 0) for blob in self.blobs)
+
+
+def _read_exactly(stream: Any, size: int) -> bytes:
+    """读取指定长度的数据，连接提前结束时抛出异常"""
+    chunks = []
+    remaining = size
+    while remaining:
+        data = stream.read(min(CHUNK_SIZE, remaining))
+        if not data:
+            raise http.client.IncompleteRead(b''.join(chunks), remaining)
+        chunks.append(data)
+        remaining -= len(data)
+    return b''.join(chunks)
+
+
+class ImageCopier:
+    """镜像复制引擎"""
+
+    def __init__(self, target_registry: str, username: Optional[str] = None, password: Optional[str] = None,
+                 blob_cache: Optional[BlobCache] = None, layer_map: Optional[LayerMap] = None):
+        self.target = RegistryClient(target_registry, username, password)
+        self.blob_cache = blob_cache
+        self.layer_map = layer_map or LayerMap(None)
+        # 同一个镜像层同时只压缩一次，其他任务等待后直接使用压缩结果
+        self._compress_locks: Dict[str, threading.Lock] = {}
+        self._compress_locks_lock = threading.Lock()
+        self._source_clients: Dict[str, RegistryClient] = {}
+        # 本次运行中已确认存在于目标仓库的数据块: digest -> 目标仓库名列表，用于跨仓库挂载；
+        # 调度器的多个工作线程同时读写
+        self._known_blobs: Dict[str, List[str]] = {}
+        self._known_blobs_lock = threading.Lock()
+
+    def _source_client(self, registry: str) -> RegistryClient:
+        """获取源仓库客户端（匿名访问）"""
+        if registry not in self._source_clients:
+            self._source_clients[registry] = RegistryClient(registry)
+        return self._source_clients[registry]
+
+    @staticmethod
+    def _select_manifest(repository: str, index: Dict[str, Any], platform: Optional[str]) -> Dict[str, Any]:
+        """从清单列表中选出指定平台的清单描述"""
+        wanted = platform or DEFAULT_PLATFORM
+        for descriptor in index.get('manifests', []):
+            if _platform_matches(descriptor, wanted):
+                return descriptor
+        raise RegistryError(f"源镜像不支持平台 {wanted}: {repository}")
+
+    @staticmethod
+    def _select_manifests(repository: str, index: Dict[str, Any], platform: str) -> List[Dict[str, Any]]:
+        """从清单列表中选出多个平台的清单描述，保持清单列表中的原有顺序"""
+        manifests = index.get('manifests', [])
+        if platform == 'all':
+            return manifests
+
+        selected: List[Dict[str, Any]] = []
+        for wanted in (p.strip() for p in platform.split(',') if p.strip()):
+            matches = [d for d in manifests if _platform_matches(d, wanted)]
+            if not matches:
+                raise RegistryError(f"源镜像不支持平台 {wanted}: {repository}")
+            if matches[0] not in selected:
+                selected.append(matches[0])
+        return [d for d in manifests if d in selected]
+
+    @staticmethod
+    def _build_index(data: bytes, index: Dict[str, Any], descriptors: List[Dict[str, Any]]) -> bytes:
+        """选中全部平台时原样返回清单列表，否则生成只包含选中平台的清单列表"""
+        if len(descriptors) == len(index.get('manifests', [])):
+            return data
+        filtered = dict(index)
+        filtered['manifests'] = descriptors
+        return json.dumps(filtered, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def _manifest_blobs(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """列出单平台清单引用的所有数据块（配置 + 镜像层）"""
+        blobs = [manifest['config']] if manifest.get('config') else []
+        for layer in manifest.get('layers', []):
+            # 不可分发的外部层（如Windows基础层）由客户端从原始地址拉取
+            if 'foreign' in layer.get('mediaType', '') or 'nondistributable' in layer.get('mediaType', ''):
+                continue
+            blobs.append(layer)
+        return blobs
+
+    def _remember_blob(self, digest: str, repository: str) -> None:
+        """记录数据块所在的目标仓库"""
+        with self._known_blobs_lock:
+            repositories = self._known_blobs.setdefault(digest, [])
+            if repository not in repositories:
+                repositories.append(repository)
+
+    def _mount_candidates(self, digest: str) -> List[str]:
+        """已知包含该数据块的目标仓库（副本）"""
+        with self._known_blobs_lock:
+            return list(self._known_blobs.get(digest, []))
+
+    def copy_blob(self, source: RegistryClient, source_repository: str,
+                  target_repository: str, descriptor: Dict[str, Any], result: CopyResult) -> None:
+        """
+        把单个数据块复制到目标仓库
+
+        依次尝试：目标仓库已存在则跳过 -> 从同命名空间的其他仓库挂载 -> 从源仓库流式上传
+        """
+        start = time.perf_counter()
+        try:
+            self._copy_blob(source, source_repository, target_repository, descriptor, result)
+        finally:
+            result.transfer_seconds += time.perf_counter() - start
+
+    def _reuse_blob(self, target_repository: str, digest: str, result: CopyResult) -> Tuple[bool, Optional[str]]:
+        """
+        目标仓库已存在则跳过，否则尝试从同命名空间的其他仓库挂载
+
+        Returns:
+            (是否已就绪, 挂载失败时仓库返回的上传会话地址)
+        """
+        if self.target.blob_exists(target_repository, digest):
+            result.blobs_skipped += 1
+            self._remember_blob(digest, target_repository)
+            return True, None
+
+        location = None
+        for from_repository in self._mount_candidates(digest):
+            if from_repository == target_repository:
+                continue
+            location = self.target.mount_blob(target_repository, digest, from_repository)
+            if location is None:
+                result.blobs_mounted += 1
+                self._remember_blob(digest, target_repository)
+                return True, None
+        return False, location
+
+    def _copy_blob(self, source: RegistryClient, source_repository: str,
+                   target_repository: str, descriptor: Dict[str, Any], result: CopyResult) -> None:
+        digest = descriptor['digest']
+        size = descriptor['size']
+
+        ready, location = self._reuse_blob(target_repository, digest, result)
+        if ready:
+            return
+
+        self._transfer_blob(source, source_repository, target_repository, digest, size, location, result)
+        result.blobs_uploaded += 1
+        result.bytes_uploaded += size
+        self._remember_blob(digest, target_repository)
+
+    def _transfer_blob(self, source: RegistryClient, source_repository: str, target_repository: str,
+                       digest: str, size: int, location: Optional[str], result: CopyResult) -> None:
+        """
+        从源仓库上传数据块
+
+        小数据块读入内存、校验摘要后一次 PUT 上传，中断时整体重试；大数据块按 UPLOAD_CHUNK_SIZE 分块 PATCH，
+        中断后查询目标仓库已确认的字节数，再用 Range 请求从源仓库的同一位置继续。
+        摘要不匹配时从头重新下载；认证失败、数据块不存在等错误不重试（见 retry_policy）。
+        启用本地数据块缓存时优先从缓存读取，从源仓库下载的数据块在摘要校验通过后写入缓存
+        """
+        cache = self.blob_cache
+        writer = None
+        offset = 0
+        attempts = 0
+        try:
+            while True:
+                stream = None
+                try:
+                    stream = cache.open(digest, size, offset) if cache else None
+                    cached = stream is not None
+                    if not cached:
+                        stream = source.open_blob(source_repository, digest, offset)
+                    if size <= UPLOAD_CHUNK_SIZE:
+                        data = _read_exactly(stream, size)
+                        if cached:
+                            result.bytes_from_cache += len(data)
+                        else:
+                            result.bytes_downloaded += len(data)
+                        actual = f"sha256:{hashlib.sha256(data).hexdigest()}"
+                        if digest.startswith('sha256:') and actual != digest:
+                            raise RegistryError(f"数据块摘要不匹配: {digest} != {actual}", code='DIGEST_INVALID')
+                        if cache and not cached:
+                            cache.put(digest, data)
+                        self.target.upload_blob(target_repository, digest, data, size, location)
+                        return
+
+                    if cache and not cached and writer is None:
+                        writer = cache.writer(digest, size)
+                    location = location or self.target.start_upload(target_repository)
+                    while offset < size:
+                        data = _read_exactly(stream, min(UPLOAD_CHUNK_SIZE, size - offset))
+                        if cached:
+                            result.bytes_from_cache += len(data)
+                        else:
+                            result.bytes_downloaded += len(data)
+                            if writer:
+                                writer.write_at(offset, data)
+                        expected = offset + len(data)
+                        location, offset = self.target.upload_chunk(target_repository, location, data, offset)
+                        if offset != expected:
+                            # 目标仓库确认的位置与发送的不一致，从确认的位置重新读取
+                            raise RegistryError(f"上传偏移量不一致: {offset} != {expected}", 416)
+                    self.target.finish_upload(target_repository, location, digest)
+                    if writer:
+                        writer.commit()
+                        writer = None
+                    return
+                except (RegistryError, OSError, http.client.HTTPException) as e:
+                    kind = classify(e)
+                    if kind == DIGEST_MISMATCH and cache:
+                        cache.discard(digest)
+                    delay = retry_delay(kind, attempts)
+                    if delay is None:
+                        if isinstance(e, RegistryError):
+                            raise
+                        raise RegistryError(f"数据块传输失败: {digest} - {e}") from e
+                    attempts += 1
+                    result.retries += 1
+                    if kind == DIGEST_MISMATCH or size <= UPLOAD_CHUNK_SIZE or not location:
+                        location, offset = None, 0
+                    else:
+                        location, offset = self._resume_upload(target_repository, location, offset)
+                    print(f"  ⚠️ 传输失败（{kind}），{delay:.1f}s 后从 {offset}/{size} bytes 继续（第 {attempts} 次）: {e}")
+                    time.sleep(delay)
+                finally:
+                    if stream is not None:
+                        stream.close()
+        finally:
+            if writer:
+                writer.abort()
+
+    def _resume_upload(self, target_repository: str, location: str, confirmed: int) -> Tuple[str, int]:
+        """查询上传会话的进度（confirmed 为中断前已确认的字节数），会话已失效时重新创建"""
+        try:
+            return location, self.target.upload_status(target_repository, location, confirmed)
+        except RegistryError as e:
+            if e.status not in (404, 416):
+                raise
+        return self.target.start_upload(target_repository), 0
+
+    def _copy_recompressed(self, source: RegistryClient, source_repository: str, target_repository: str,
+                           descriptor: Dict[str, Any], compression: str, result: CopyResult) -> None:
+        """
+        重新压缩并上传镜像层
+
+        映射中已有压缩结果时按压缩后的摘要跳过或挂载，否则下载源层、解压后重新压缩并上传
+        """
+        digest = descriptor['digest']
+        with self._compress_locks_lock:
+            lock = self._compress_locks.setdefault(f"{digest}|{compression}", threading.Lock())
+        with lock:
+            location = None
+            compressed = self.layer_map.get(digest, compression)
+            if compressed:
+                ready, location = self._reuse_blob(target_repository, compressed['digest'], result)
+                if ready:
+                    return
+            compressed_digest, size = self._recompress_blob(source, source_repository, target_repository,
+                                                            descriptor, compression, location, result)
+            self.layer_map.put(digest, compression, compressed_digest, size)
+            result.blobs_uploaded += 1
+            result.bytes_uploaded += size
+            self._remember_blob(compressed_digest, target_repository)
+
+    def _recompress_blob(self, source: RegistryClient, source_repository: str, target_repository: str,
+                         descriptor: Dict[str, Any], compression: str, location: Optional[str],
+                         result: CopyResult) -> Tuple[str, int]:
+        """
+        边下载边解压、重新压缩并分块上传
+
+        压缩结果的摘要在上传完成时才知道，中断后无法从中间继续，整个层重新处理；
+        源层的摘要在读取完毕时校验，不匹配时不完成上传
+
+        Returns:
+            (压缩后的摘要, 大小)
+        """
+        digest, size = descriptor['digest'], descriptor['size']
+        cache = self.blob_cache
+        attempts = 0
+        while True:
+            stream = None
+            output = None
+            try:
+                stream = cache.open(digest, size) if cache else None
+                cached = stream is not None
+                if not cached:
+                    stream = source.open_blob(source_repository, digest)
+                output = recompress(self._read_verified(stream, digest, size, cached, result), compression)
+                location = location or self.target.start_upload(target_repository)
+                hasher = hashlib.sha256()
+                buffer = bytearray()
+                offset = 0
+                for data in output:
+                    hasher.update(data)
+                    buffer += data
+                    if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                        location, offset = self._upload_part(target_repository, location, bytes(buffer), offset)
+                        buffer.clear()
+                if buffer:
+                    location, offset = self._upload_part(target_repository, location, bytes(buffer), offset)
+                compressed_digest = f"sha256:{hasher.hexdigest()}"
+                self.target.finish_upload(target_repository, location, compressed_digest)
+                print(f"  🗜️ {digest[:19]} -> {compressed_digest[:19]} ({compression}, {size} -> {offset} bytes)")
+                return compressed_digest, offset
+            except (RegistryError, OSError, http.client.HTTPException) as e:
+                kind = classify(e)
+                if kind == DIGEST_MISMATCH and cache:
+                    cache.discard(digest)
+                delay = retry_delay(kind, attempts)
+                if delay is None:
+                    if isinstance(e, RegistryError):
+                        raise
+                    raise RegistryError(f"镜像层重新压缩失败: {digest} - {e}") from e
+                attempts += 1
+                result.retries += 1
+                location = None
+                print(f"  ⚠️ 重新压缩失败（{kind}），{delay:.1f}s 后重试（第 {attempts} 次）: {e}")
+                time.sleep(delay)
+            finally:
+                if output is not None:
+                    output.close()
+                if stream is not None:
+                    stream.close()
+
+    def _upload_part(self, target_repository: str, location: str, data: bytes, offset: int) -> Tuple[str, int]:
+        """上传一块数据，返回新的会话地址和已确认的字节数"""
+        expected = offset + len(data)
+        location, offset = self.target.upload_chunk(target_repository, location, data, offset)
+        if offset != expected:
+            raise RegistryError(f"上传偏移量不一致: {offset} != {expected}", 416)
+        return location, offset
+
+    @staticmethod
+    def _read_verified(stream: Any, digest: str, size: int, cached: bool, result: CopyResult) -> Iterator[bytes]:
+        """逐块读取数据块，读完时校验摘要"""
+        hasher = hashlib.sha256()
+        remaining = size
+        while remaining:
+            data = stream.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                raise http.client.IncompleteRead(b'', remaining)
+            hasher.update(data)
+            remaining -= len(data)
+            if cached:
+                result.bytes_from_cache += len(data)
+            else:
+                result.bytes_downloaded += len(data)
+            actual = f"sha256:{hasher.hexdigest()}"
+            if not remaining and digest.startswith('sha256:') and actual != digest:
+                raise RegistryError(f"数据块摘要不匹配: {digest} != {actual}", code='DIGEST_INVALID')
+            yield data
+
+    def source_tags(self, source_ref: ImageReference, cache: Any = None) -> Optional[List[str]]:
+        """列出源仓库的所有标签，仓库不存在时返回None"""
+        return self._source_client(source_ref.registry).list_tags(source_ref.repository, cache=cache)
+
+    def resolve_manifest(self, source_ref: ImageReference,
+                         platform: Optional[str] = None) -> Tuple[bytes, str, str, str]:
+        """
+        获取将要推送的单平台清单
+
+        Returns:
+            (清单内容, 媒体类型, 清单摘要, 源标签指向的摘要)
+        """
+        source = self._source_client(source_ref.registry)
+        data, media_type, digest = source.get_manifest(source_ref.repository, source_ref.reference)
+        tag_digest = digest
+
+        if media_type in INDEX_MEDIA_TYPES:
+            descriptor = self._select_manifest(source_ref.repository, json.loads(data), platform)
+            data, media_type, digest = source.get_manifest(source_ref.repository, descriptor['digest'])
+
+        return data, media_type, digest, tag_digest
+
+    def resolve_digest(self, source_ref: ImageReference, platform: Optional[str] = None,
+                       known: Optional[Tuple[str, str]] = None) -> Tuple[str, str]:
+        """
+        解析源镜像在指定平台上的清单摘要，即复制后目标标签应指向的摘要
+
+        单平台镜像只需一次HEAD请求；清单列表需要再读取一次列表内容，
+        除非源标签摘要与 known 中记录的一致，此时直接复用记录的平台摘要
+
+        Args:
+            known: 上次记录的 (源标签摘要, 平台清单摘要)
+
+        Returns:
+            (源标签摘要, 平台清单摘要)
+        """
+        source = self._source_client(source_ref.registry)
+        head = source.head_manifest(source_ref.repository, source_ref.reference)
+        if head is None:
+            raise RegistryError(f"源镜像不存在: {source_ref}", 404)
+
+        tag_digest, media_type = head
+        if known and known[0] == tag_digest and known[1]:
+            return tag_digest, known[1]
+        if media_type and media_type not in INDEX_MEDIA_TYPES:
+            return tag_digest, tag_digest
+        if platform == 'all' and media_type:
+            return tag_digest, tag_digest
+
+        data, media_type, digest = source.get_manifest(source_ref.repository, tag_digest)
+        if media_type not in INDEX_MEDIA_TYPES:
+            return tag_digest, digest
+
+        index = json.loads(data)
+        if is_multi_platform(platform):
+            index_data = self._build_index(data, index, self._select_manifests(source_ref.repository, index, platform))
+            return tag_digest, f"sha256:{hashlib.sha256(index_data).hexdigest()}"
+        return tag_digest, self._select_manifest(source_ref.repository, index, platform)['digest']
+
+    def target_digest(self, target_repository: str, target_tag: str) -> Optional[str]:
+        """查询目标标签当前指向的摘要，不存在时返回None"""
+        head = self.target.head_manifest(target_repository, target_tag)
+        return head[0] if head else None
+
+    def plan_image(self, source_ref: ImageReference, platform: Optional[str] = None,
+                   compression: Optional[str] = None) -> ImagePlan:
+        """
+        解析复制单个镜像所需的全部清单和数据块，不传输任何数据块
+
+        Args:
+            source_ref: 源镜像引用
+            platform: 目标平台，未指定时选择 linux/amd64；
+                      多个平台以逗号分隔（或为 all）时复制多架构清单列表
+            compression: 推送时把 gzip 镜像层重新压缩为该格式（例如 zstd）
+        """
+        source = self._source_client(source_ref.registry)
+
+        if not is_multi_platform(platform):
+            data, media_type, _, tag_digest = self.resolve_manifest(source_ref, platform)
+            plan = ImagePlan(source_ref=source_ref, tag_digest=tag_digest, manifest=data, media_type=media_type,
+                             compression=compression)
+            self._add_manifest_blobs(plan, data)
+            return plan
+
+        data, media_type, tag_digest = source.get_manifest(source_ref.repository, source_ref.reference)
+        if media_type not in INDEX_MEDIA_TYPES:
+            # 源镜像只有单一平台，按普通镜像复制
+            plan = ImagePlan(source_ref=source_ref, tag_digest=tag_digest, manifest=data, media_type=media_type,
+                             compression=compression)
+            self._add_manifest_blobs(plan, data)
+            return plan
+
+        index = json.loads(data)
+        descriptors = self._select_manifests(source_ref.repository, index, platform)
+        plan = ImagePlan(source_ref=source_ref, tag_digest=tag_digest,
+                         manifest=self._build_index(data, index, descriptors), media_type=media_type,
+                         compression=compression)
+        for descriptor in descriptors:
+            child_data, child_type, _ = source.get_manifest(source_ref.repository, descriptor['digest'])
+            self._add_manifest_blobs(plan, child_data)
+            plan.children.append((child_data, child_type, descriptor['digest']))
+        return plan
+
+    def _add_manifest_blobs(self, plan: ImagePlan, data: bytes) -> None:
+        """把单平台清单引用的数据块加入计划，多个平台共享的数据块只记录一次"""
+        manifest = json.loads(data)
+        if manifest.get('schemaVersion') != 2 or manifest.get('mediaType') in INDEX_MEDIA_TYPES:
+            raise RegistryError(f"不支持的清单格式: {plan.source_ref}")
+
+        known = {blob['digest'] for blob in plan.blobs}
+        for blob in self._manifest_blobs(manifest):
+            if blob['digest'] not in known:
+                plan.blobs.append(blob)
+                known.add(blob['digest'])
+
+    @staticmethod
+    def blob_key(plan: ImagePlan, descriptor: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """数据块在目标仓库中的去重键：重新压缩的镜像层按 (源摘要, 压缩格式) 区分"""
+        return descriptor['digest'], plan.compression if is_compressible(descriptor) else None
+
+    def copy_plan_blob(self, plan: ImagePlan, target_repository: str, descriptor: Dict[str, Any],
+                       result: CopyResult) -> None:
+        """复制计划中的单个数据块，计划要求重新压缩时 gzip 镜像层转换格式后上传"""
+        source = self._source_client(plan.source_ref.registry)
+        _, compression = self.blob_key(plan, descriptor)
+        if not compression:
+            self.copy_blob(source, plan.source_ref.repository, target_repository, descriptor, result)
+            return
+        start = time.perf_counter()
+        try:
+            self._copy_recompressed(source, plan.source_ref.repository, target_repository, descriptor,
+                                    compression, result)
+        finally:
+            result.transfer_seconds += time.perf_counter() - start
+
+    def _compressed_manifests(self, plan: ImagePlan) -> Tuple[List[Tuple[bytes, str, str]], bytes, str]:
+        """
+        按重新压缩的结果改写清单
+
+        Returns:
+            (各平台清单, 清单或清单列表内容, 媒体类型)
+        """
+        def lookup(layer: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            return self.layer_map.get(layer['digest'], plan.compression)
+
+        if not plan.children:
+            data, media_type = convert_manifest(plan.manifest, plan.media_type, lookup)
+            return [], data, media_type
+
+        children = []
+        replaced: Dict[str, Dict[str, Any]] = {}
+        for child_data, child_type, child_digest in plan.children:
+            data, media_type = convert_manifest(child_data, child_type, lookup)
+            if data is not child_data:
+                digest = f"sha256:{hashlib.sha256(data).hexdigest()}"
+                replaced[child_digest] = {'mediaType': media_type, 'digest': digest, 'size': len(data)}
+                child_data, child_type, child_digest = data, media_type, digest
+            children.append((child_data, child_type, child_digest))
+        data, media_type = convert_index(plan.manifest, plan.media_type, replaced)
+        return children, data, media_type
+
+    def push_plan(self, plan: ImagePlan, target_repository: str, target_tag: str,
+                  present: Optional[Set[str]] = None) -> CopyResult:
+        """
+        按计划复制数据块并推送清单
+
+        Args:
+            plan: plan_image 生成的复制计划
+            target_repository: 目标仓库名（包含命名空间）
+            target_tag: 目标标签
+            present: 已确认存在于目标仓库的数据块摘要，直接跳过
+
+        Returns:
+            复制结果
+        """
+        result = CopyResult(source_digest=plan.tag_digest,
+                            platform_digest=f"sha256:{hashlib.sha256(plan.manifest).hexdigest()}")
+
+        blobs = [blob for blob in plan.blobs if blob['digest'] not in (present or set())]
+        for i, descriptor in enumerate(blobs, 1):
+            print(f"  📤 [{i}/{len(blobs)}] {descriptor['digest'][:19]} ({descriptor['size']} bytes)")
+            self.copy_plan_blob(plan, target_repository, descriptor, result)
+
+        start = time.perf_counter()
+        children, manifest, media_type = plan.children, plan.manifest, plan.media_type
+        if plan.compression:
+            children, manifest, media_type = self._compressed_manifests(plan)
+        # 多架构镜像先按摘要推送各平台清单，清单列表引用的清单必须已存在
+        for i, (child_data, child_type, child_digest) in enumerate(children, 1):
+            print(f"  🧩 [{i}/{len(children)}] {child_digest[:19]}")
+            self.target.put_manifest(target_repository, child_digest, child_data, child_type)
+
+        # 未重新压缩时原样推送清单内容，保证目标摘要与源一致
+        result.digest = self.target.put_manifest(target_repository, target_tag, manifest, media_type)
+        result.push_seconds += time.perf_counter() - start
+        return result
+
+    def copy_image(self, source_ref: ImageReference, target_repository: str, target_tag: str,
+                   platform: Optional[str] = None, compression: Optional[str] = None) -> CopyResult:
+        """
+        复制单个镜像
+
+        Args:
+            source_ref: 源镜像引用
+            target_repository: 目标仓库名（包含命名空间）
+            target_tag: 目标标签
+            platform: 目标平台，参见 plan_image
+            compression: 重新压缩镜像层的格式，参见 plan_image
+
+        Returns:
+            复制结果
+        """
+        return self.push_plan(self.plan_image(source_ref, platform, compression), target_repository, target_tag)
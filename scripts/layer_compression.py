@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+镜像层重新压缩
+按配置把 gzip 镜像层转换为 zstd 后推送（解压更快、体积更小，拉取方受益），清单相应改写为 OCI 格式；
+源层摘要 -> 压缩后摘要 的映射随同步状态保存，未变化的层不会重复压缩
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import zlib
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable, Tuple
+
+from registry_client import (
+    RegistryError, CHUNK_SIZE, MEDIA_TYPE_MANIFEST_V2, MEDIA_TYPE_OCI_MANIFEST, MEDIA_TYPE_OCI_INDEX
+)
+
+ZSTD = 'zstd'
+COMPRESSIONS = ('zstd',)
+# zstd 压缩级别：比默认的 3 更小，压缩速度仍远高于 gzip -9，解压速度与级别无关
+ZSTD_LEVEL = 9
+
+MEDIA_TYPE_DOCKER_LAYER = 'application/vnd.docker.image.rootfs.diff.tar.gzip'
+MEDIA_TYPE_DOCKER_FOREIGN_LAYER = 'application/vnd.docker.image.rootfs.foreign.diff.tar.gzip'
+MEDIA_TYPE_DOCKER_CONFIG = 'application/vnd.docker.container.image.v1+json'
+MEDIA_TYPE_OCI_LAYER_GZIP = 'application/vnd.oci.image.layer.v1.tar+gzip'
+MEDIA_TYPE_OCI_LAYER_ZSTD = 'application/vnd.oci.image.layer.v1.tar+zstd'
+MEDIA_TYPE_OCI_NONDISTRIBUTABLE_LAYER = 'application/vnd.oci.image.layer.nondistributable.v1.tar+gzip'
+MEDIA_TYPE_OCI_CONFIG = 'application/vnd.oci.image.config.v1+json'
+
+GZIP_LAYER_MEDIA_TYPES = (MEDIA_TYPE_DOCKER_LAYER, MEDIA_TYPE_OCI_LAYER_GZIP)
+# Docker 清单没有 zstd 层的媒体类型，改写时其余条目一并换成对应的 OCI 类型
+_OCI_MEDIA_TYPES = {
+    MEDIA_TYPE_MANIFEST_V2: MEDIA_TYPE_OCI_MANIFEST,
+    MEDIA_TYPE_DOCKER_CONFIG: MEDIA_TYPE_OCI_CONFIG,
+    MEDIA_TYPE_DOCKER_FOREIGN_LAYER: MEDIA_TYPE_OCI_NONDISTRIBUTABLE_LAYER,
+}
+# buildx 的证明清单通过该注解引用所描述的镜像清单
+_REFERENCE_ANNOTATION = 'vnd.docker.reference.digest'
+
+DEFAULT_LAYER_MAP_FILE = '.sync-state/layer-map.json'
+LAYER_MAP_MAX_AGE_DAYS = 30
+LAYER_MAP_VERSION = 1
+
+
+class CompressionError(RegistryError):
+    """解压源镜像层或 zstd 压缩失败，不重试"""
+
+    def __init__(self, message: str):
+        super().__init__(message, code='COMPRESSION_FAILED')
+
+
+def zstd_available() -> bool:
+    return shutil.which(ZSTD) is not None
+
+
+def is_compressible(descriptor: Dict[str, Any]) -> bool:
+    """是否为可以重新压缩的 gzip 镜像层"""
+    return descriptor.get('mediaType') in GZIP_LAYER_MEDIA_TYPES
+
+
+def recompress(chunks: Iterable[bytes], compression: str = 'zstd') -> Iterator[bytes]:
+    """
+    把 gzip 数据流转换为 zstd 数据流
+
+    后台线程逐块解压并写入 zstd 进程（-T0 按 CPU 核心数并行压缩），调用方边读取边上传，
+    整个镜像层不会落盘或完整读入内存。chunks 抛出的异常（网络中断、摘要不匹配）原样抛出
+
+    Raises:
+        CompressionError: gzip 数据损坏或 zstd 执行失败
+    """
+    if compression not in COMPRESSIONS:
+        raise CompressionError(f"不支持的压缩格式: {compression}")
+    try:
+        process = subprocess.Popen([ZSTD, '-q', '-c', f'-{ZSTD_LEVEL}', '-T0'],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise CompressionError(f"无法启动 {ZSTD}: {e}") from e
+    errors: List[BaseException] = []
+
+    def feed() -> None:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        pending = False
+        try:
+            for data in chunks:
+                while data:
+                    pending = True
+                    process.stdin.write(decompressor.decompress(data))
+                    if not decompressor.eof:
+                        break
+                    # 多成员 gzip：上一个成员结束后继续解压剩余数据
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                    pending = False
+                    if not data.strip(b'\x00'):
+                        break
+            if pending:
+                raise CompressionError("gzip 数据不完整")
+        except zlib.error as e:
+            errors.append(CompressionError(f"gzip 解压失败: {e}"))
+        except BrokenPipeError:
+            pass
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(CHUNK_SIZE)
+            if not data:
+                break
+            yield data
+        feeder.join()
+        process.wait()
+        finished = True
+        if errors:
+            raise errors[0]
+        if process.returncode:
+            message = process.stderr.read().decode('utf-8', 'replace').strip()
+            raise CompressionError(f"{ZSTD} 退出码 {process.returncode}: {message}")
+    finally:
+        if not finished:
+            # 上传中断时结束压缩进程；解压线程在源数据流关闭后退出
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def convert_manifest(data: bytes, media_type: str,
+                     lookup: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Tuple[bytes, str]:
+    """
+    把单平台清单中的 gzip 层替换为重新压缩后的层
+
+    Args:
+        lookup: 源层描述 -> 压缩后的 {'digest', 'size'}
+
+    Returns:
+        (清单内容, 媒体类型)；没有可替换的层时原样返回
+
+    Raises:
+        CompressionError: 可压缩的层缺少压缩结果
+    """
+    manifest = json.loads(data)
+    layers = manifest.get('layers', [])
+    if not any(is_compressible(layer) for layer in layers):
+        return data, media_type
+
+    converted = []
+    for layer in layers:
+        if is_compressible(layer):
+            compressed = lookup(layer)
+            if not compressed:
+                raise CompressionError(f"镜像层尚未重新压缩: {layer['digest']}")
+            # urls 等字段描述的是原始层，只保留注解
+            layer = dict({'mediaType': MEDIA_TYPE_OCI_LAYER_ZSTD, 'size': compressed['size'],
+                          'digest': compressed['digest']},
+                         **({'annotations': layer['annotations']} if layer.get('annotations') else {}))
+        else:
+            layer = dict(layer, mediaType=_OCI_MEDIA_TYPES.get(layer.get('mediaType'), layer.get('mediaType')))
+        converted.append(layer)
+
+    manifest['mediaType'] = MEDIA_TYPE_OCI_MANIFEST
+    config = manifest.get('config')
+    if config:
+        manifest['config'] = dict(config, mediaType=_OCI_MEDIA_TYPES.get(config.get('mediaType'),
+                                                                          config.get('mediaType')))
+    manifest['layers'] = converted
+    return json.dumps(manifest, separators=(',', ':')).encode('utf-8'), MEDIA_TYPE_OCI_MANIFEST
+
+
+def convert_index(data: bytes, media_type: str, replaced: Dict[str, Dict[str, Any]]) -> Tuple[bytes, str]:
+    """
+    改写清单列表中被替换的平台清单
+
+    Args:
+        replaced: 源清单摘要 -> 新的 {'digest', 'size', 'mediaType'}
+
+    Returns:
+        (清单列表内容, 媒体类型)；没有被替换的清单时原样返回
+    """
+    if not replaced:
+        return data, media_type
+    index = json.loads(data)
+    manifests = []
+    for descriptor in index.get('manifests', []):
+        if descriptor['digest'] in replaced:
+            descriptor = dict(descriptor, **replaced[descriptor['digest']])
+        annotations = descriptor.get('annotations') or {}
+        if annotations.get(_REFERENCE_ANNOTATION) in replaced:
+            descriptor = dict(descriptor, annotations=dict(
+                annotations, **{_REFERENCE_ANNOTATION: replaced[annotations[_REFERENCE_ANNOTATION]]['digest']}))
+        manifests.append(descriptor)
+    index['mediaType'] = MEDIA_TYPE_OCI_INDEX
+    index['manifests'] = manifests
+    return json.dumps(index, separators=(',', ':')).encode('utf-8'), MEDIA_TYPE_OCI_INDEX
+
+
+class LayerMap:
+    """
+    重新压缩结果的映射
+
+    以 "源层摘要|压缩格式" 为键记录压缩后的摘要和大小，随同步状态目录一起在运行之间保留；
+    目标仓库中已有压缩后的层时直接跳过或挂载，不再下载和压缩
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_LAYER_MAP_FILE, max_age_days: float = LAYER_MAP_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400
+        self.layers: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(digest: str, compression: str) -> str:
+        return f"{digest}|{compression}"
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取镜像层压缩映射失败，忽略: {e}")
+            return {}
+        return data.get('layers', {}) if data.get('version') == LAYER_MAP_VERSION else {}
+
+    def load(self) -> None:
+        if self.path and os.path.exists(self.path):
+            self.layers = self._read(self.path)
+
+    def merge(self, path: str) -> None:
+        """合并另一个分片的映射，同一个层保留最近使用的记录"""
+        for key, layer in self._read(path).items():
+            if layer.get('used_at', 0) >= self.layers.get(key, {}).get('used_at', 0):
+                self.layers[key] = layer
+
+    def get(self, digest: str, compression: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            layer = self.layers.get(self._key(digest, compression))
+            if layer:
+                layer['used_at'] = int(time.time())
+            return layer
+
+    def put(self, digest: str, compression: str, compressed_digest: str, size: int) -> None:
+        with self._lock:
+            self.layers[self._key(digest, compression)] = {
+                'digest': compressed_digest, 'size': size, 'used_at': int(time.time())
+            }
+
+    def save(self) -> None:
+        """保存映射，清理长期未使用的记录"""
+        if not self.path or (not self.layers and not os.path.exists(self.path)):
+            return
+        cutoff = time.time() - self.max_age_seconds
+        with self._lock:
+            self.layers = {key: layer for key, layer in self.layers.items() if layer.get('used_at', 0) >= cutoff}
+            layers = dict(self.layers)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': LAYER_MAP_VERSION, 'layers': layers}, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
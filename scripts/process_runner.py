@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+流式子进程执行
+逐行转发子进程输出并加上镜像前缀，只保留最后若干行用于失败报告，内存占用不随日志增长
+"""
+
+import os
+import signal
+import subprocess
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Callable
+
+# 失败报告中保留的输出行数
+DEFAULT_TAIL_LINES = 50
+
+# 并发执行时避免多个进程的输出行交错
+_PRINT_LOCK = threading.Lock()
+
+
+@dataclass
+class ProcessResult:
+    """子进程执行结果"""
+    returncode: int
+    tail: List[str] = field(default_factory=list)
+
+    @property
+    def output_tail(self) -> str:
+        return '\n'.join(self.tail)
+
+
+def run_streaming(cmd: List[str], prefix: str = '', timeout: Optional[float] = None,
+                  tail_lines: int = DEFAULT_TAIL_LINES, cwd: Optional[str] = None,
+                  env: Optional[Dict[str, str]] = None,
+                  on_line: Optional[Callable[[str], None]] = None) -> ProcessResult:
+    """
+    执行命令并实时转发输出
+
+    Args:
+        cmd: 命令及参数
+        prefix: 每行输出的前缀，例如 [nginx:latest]
+        timeout: 超时时间（秒），超时后终止进程并抛出 subprocess.TimeoutExpired
+        tail_lines: 保留的最后输出行数
+        cwd: 工作目录
+        env: 环境变量
+        on_line: 每行输出的回调（例如按阶段标记计时）
+
+    Returns:
+        退出码和最后的输出行（stdout 和 stderr 合并）
+    """
+    tail = deque(maxlen=tail_lines)
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors='replace',
+        bufsize=1,
+        cwd=cwd,
+        env=env,
+        # 独立进程组，超时时连同脚本启动的 docker 子进程一起终止
+        start_new_session=True
+    )
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+
+    try:
+        for line in process.stdout:
+            line = line.rstrip('\r\n')
+            tail.append(line)
+            if on_line:
+                on_line(line)
+            with _PRINT_LOCK:
+                print(f"{prefix}{line}", flush=True)
+        process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout, output='\n'.join(tail))
+    return ProcessResult(process.returncode, list(tail))
+
+
+def print_tail(result: ProcessResult, title: str) -> None:
+    """打印失败报告中的最后输出行"""
+    if result.tail:
+        print(f"{title}（最后 {len(result.tail)} 行）:")
+        print(result.output_tail)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+上游仓库限流
+读取响应中的 RateLimit-* / Retry-After 头，为每个仓库维护令牌桶和并发系数：
+配额充足时逐步恢复并发，配额将尽时降低并发并把剩余配额匀速分配到配额窗口
+（设置了运行时间预算时取两者中较短的一段）内，收到 429 时整个仓库暂停到 Retry-After 指定的时间
+"""
+
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple, Any
+
+# 剩余配额比例高于该值时逐步恢复并发，低于该值时减半并发
+HEADROOM_FRACTION = 0.5
+# 剩余配额比例低于该值时，按 剩余配额 / 窗口时长 匀速发送计量请求
+PACING_FRACTION = 0.2
+# 并发系数的下限和每次正常响应的恢复量（加性增、乘性减）
+MIN_SCALE = 0.05
+SCALE_STEP = 0.05
+# 令牌桶容量，允许的突发请求数
+BUCKET_CAPACITY = 5
+# 仓库暂停（429 或配额用完）超过该时间时直接失败，避免工作线程长时间挂起；
+# 还有剩余配额时的匀速等待不受此限制，按该间隔分段等待以便及时响应配额变化
+MAX_THROTTLE_WAIT = 120
+# 429 未带 Retry-After 时的暂停时间
+DEFAULT_RETRY_AFTER = 10
+
+_QUOTA_PATTERN = re.compile(r'^\s*(\d+)(?:\s*;\s*w\s*=\s*(\d+))?')
+
+
+# 本次运行的截止时间（time.monotonic），匀速发送时剩余配额在此之前用完
+_PACING_DEADLINE: Optional[float] = None
+
+
+class ThrottleError(Exception):
+    """需要等待的时间超过上限"""
+
+    def __init__(self, message: str, wait: float):
+        super().__init__(message)
+        self.wait = wait
+
+
+def _header(response: Any, name: str) -> Optional[str]:
+    return response.getheader(name) or response.getheader(f"X-{name}")
+
+
+def parse_quota(value: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    解析配额头
+
+    支持 Docker Hub 的 "100;w=21600" 和标准草案的 "100"
+
+    Returns:
+        (数量, 窗口秒数)
+    """
+    match = _QUOTA_PATTERN.match(value or '')
+    if not match:
+        return None, None
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After，支持秒数和 HTTP 日期"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def set_pacing_deadline(deadline: Optional[float]) -> None:
+    """设置本次运行的截止时间（time.monotonic），None 表示不限"""
+    global _PACING_DEADLINE
+    _PACING_DEADLINE = deadline
+
+
+def pacing_rate(remaining: int, window: float, horizon: Optional[float] = None) -> float:
+    """
+    匀速发送的速率（每秒请求数）
+
+    剩余配额在配额窗口和本次运行剩余时间（horizon 秒）中较短的一段内用完；
+    运行结束前窗口不会重置时，没有必要为窗口的后半段保留配额
+    """
+    span = min(window, horizon) if horizon and horizon > 0 else window
+    return remaining / span
+
+
+class RegistryThrottle:
+    """单个仓库的限流状态"""
+
+    def __init__(self, registry: str):
+        self.registry = registry
+        # 并发系数，调度器的并发上限乘以该系数
+        self.scale = 1.0
+        # 计量请求的匀速发送速率（每秒请求数），None 表示不限速
+        self.rate: Optional[float] = None
+        self.tokens = float(BUCKET_CAPACITY)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.remaining: Optional[int] = None
+        self.limit: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def concurrency(self, configured: int) -> int:
+        """按当前系数调整后的并发上限"""
+        return max(1, int(configured * self.scale + 0.5))
+
+    def _refill(self, now: float) -> None:
+        if self.rate is not None:
+            self.tokens = min(BUCKET_CAPACITY, self.tokens + (now - self.updated) * self.rate)
+        else:
+            self.tokens = float(BUCKET_CAPACITY)
+        self.updated = now
+
+    def acquire(self, metered: bool) -> None:
+        """
+        发送请求前调用，必要时等待暂停结束或令牌恢复
+
+        还有剩余配额时一直等待到令牌恢复（速率由 pacing_rate 保证在运行结束前可用）
+
+        Raises:
+            ThrottleError: 仓库暂停的剩余时间超过 MAX_THROTTLE_WAIT
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                paused = self.paused_until - now
+                if paused > 0:
+                    wait = paused
+                elif metered:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    return
+            if paused > MAX_THROTTLE_WAIT:
+                raise ThrottleError(f"{self.registry} 限流暂停 {paused:.0f}s，超过上限 {MAX_THROTTLE_WAIT}s", paused)
+            time.sleep(min(wait, MAX_THROTTLE_WAIT))
+
+    def observe(self, response: Any, metered: bool) -> None:
+        """根据响应状态码和限流头调整状态"""
+        remaining, window = parse_quota(_header(response, 'RateLimit-Remaining'))
+        limit, limit_window = parse_quota(_header(response, 'RateLimit-Limit'))
+        reset = parse_retry_after(_header(response, 'RateLimit-Reset'))
+        window = reset or window or limit_window
+
+        with self._lock:
+            if response.status == 429:
+                retry_after = parse_retry_after(response.getheader('Retry-After')) or DEFAULT_RETRY_AFTER
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                self._set_scale(self.scale / 2, f"HTTP 429，暂停 {retry_after:.0f}s")
+                return
+
+            if remaining is None:
+                if metered and response.status < 400:
+                    self._set_scale(self.scale + SCALE_STEP)
+                return
+
+            self.remaining, self.limit = remaining, limit or self.limit
+            fraction = remaining / self.limit if self.limit else (1.0 if remaining else 0.0)
+            if remaining == 0 and window:
+                # 配额用完时暂停到窗口结束，之后的响应会带回新的配额
+                self.paused_until = max(self.paused_until, time.monotonic() + window)
+                self._set_rate(None)
+            elif fraction < PACING_FRACTION and window:
+                horizon = _PACING_DEADLINE - time.monotonic() if _PACING_DEADLINE is not None else None
+                self._set_rate(pacing_rate(remaining, window, horizon))
+            else:
+                self._set_rate(None)
+            if fraction < HEADROOM_FRACTION:
+                self._set_scale(self.scale / 2, f"剩余配额 {remaining}/{self.limit or '?'}")
+            else:
+                self._set_scale(self.scale + SCALE_STEP)
+
+    def _set_scale(self, scale: float, reason: str = '') -> None:
+        scale = min(1.0, max(MIN_SCALE, scale))
+        if scale < self.scale and reason:
+            print(f"🐢 {self.registry} {reason}，并发系数降至 {scale:.2f}")
+        self.scale = scale
+
+    def _set_rate(self, rate: Optional[float]) -> None:
+        if rate != self.rate and (rate is None) != (self.rate is None):
+            if rate is None:
+                print(f"🚀 {self.registry} 配额恢复，取消匀速限制")
+            else:
+                print(f"⏱️ {self.registry} 配额将尽，计量请求限速为 {rate * 60:.2f} 次/分钟")
+        self.rate = rate
+
+
+_THROTTLES: Dict[str, RegistryThrottle] = {}
+_THROTTLES_LOCK = threading.Lock()
+
+
+def throttle_for(registry: str) -> RegistryThrottle:
+    """获取仓库的限流状态（进程内共享）"""
+    with _THROTTLES_LOCK:
+        if registry not in _THROTTLES:
+            _THROTTLES[registry] = RegistryThrottle(registry)
+        return _THROTTLES[registry]
+
+
+def concurrency_limit(registry: str, configured: int) -> int:
+    """调度器使用的并发上限：配置值按仓库当前的并发系数缩放"""
+    with _THROTTLES_LOCK:
+        throttle = _THROTTLES.get(registry)
+    return throttle.concurrency(configured) if throttle else configured
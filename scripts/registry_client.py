@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+"""
+镜像仓库客户端
+直接通过 OCI Distribution API 访问镜像仓库，无需经过Docker守护进程
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import ssl
+import threading
+import time
+import http.client
+from typing import List, Dict, Optional, Set, Tuple, Any
+from dataclasses import dataclass
+from urllib.parse import urlparse, urlencode, urljoin
+
+from rate_limit import throttle_for, ThrottleError
+from retry_policy import classify, retry_delay, MAX_ATTEMPTS, TRANSIENT
+
+DOCKER_HUB_REGISTRY = 'registry-1.docker.io'
+DOCKER_HUB_ALIASES = ('docker.io', 'index.docker.io', DOCKER_HUB_REGISTRY)
+
+MEDIA_TYPE_MANIFEST_V2 = 'application/vnd.docker.distribution.manifest.v2+json'
+MEDIA_TYPE_MANIFEST_LIST_V2 = 'application/vnd.docker.distribution.manifest.list.v2+json'
+MEDIA_TYPE_OCI_MANIFEST = 'application/vnd.oci.image.manifest.v1+json'
+MEDIA_TYPE_OCI_INDEX = 'application/vnd.oci.image.index.v1+json'
+
+INDEX_MEDIA_TYPES = (MEDIA_TYPE_MANIFEST_LIST_V2, MEDIA_TYPE_OCI_INDEX)
+MANIFEST_ACCEPT = ', '.join([
+    MEDIA_TYPE_OCI_INDEX,
+    MEDIA_TYPE_MANIFEST_LIST_V2,
+    MEDIA_TYPE_OCI_MANIFEST,
+    MEDIA_TYPE_MANIFEST_V2,
+])
+
+# 传输大文件时每次读写的块大小
+CHUNK_SIZE = 1024 * 1024
+# 分块上传时单个 PATCH 请求的大小，中断后从最后确认的块继续
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+# 收到 429 后等待 Retry-After 再重发的最多次数（请求体可重发时）
+MAX_THROTTLE_RETRIES = 3
+
+
+class RegistryError(Exception):
+    """镜像仓库请求错误，code 为仓库返回的错误码（例如 DIGEST_INVALID）"""
+
+    def __init__(self, message: str, status: Optional[int] = None, code: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+class ThrottledError(RegistryError):
+    """本地限流拒绝发送请求（仓库暂停时间过长），wait 为还需等待的秒数；不消耗重试次数"""
+
+    def __init__(self, message: str, wait: float):
+        super().__init__(message, 429, code='THROTTLED')
+        self.wait = wait
+
+
+def _error_code(detail: bytes) -> Optional[str]:
+    """从错误响应 {"errors": [{"code": ...}]} 中取出第一个错误码"""
+    try:
+        errors = json.loads(detail).get('errors') or []
+        return errors[0].get('code') if errors else None
+    except (ValueError, AttributeError, IndexError):
+        return None
+
+
+@dataclass
+class ImageReference:
+    """镜像引用（仓库地址 / 仓库名 / 标签或摘要）"""
+    registry: str
+    repository: str
+    reference: str = 'latest'
+
+    @property
+    def is_digest(self) -> bool:
+        return self.reference.startswith('sha256:')
+
+    def __str__(self) -> str:
+        separator = '@' if self.is_digest else ':'
+        return f"{self.registry}/{self.repository}{separator}{self.reference}"
+
+
+def parse_image_reference(image_name: str) -> ImageReference:
+    """
+    解析镜像名称，补全默认仓库地址和标签
+
+    Args:
+        image_name: 镜像名称，例如 nginx、ghcr.io/actions/runner:latest
+
+    Returns:
+        镜像引用
+    """
+    name, reference = image_name.strip(), 'latest'
+    if '@' in name:
+        name, reference = name.split('@', 1)
+    elif ':' in name.rsplit('/', 1)[-1]:
+        name, reference = name.rsplit(':', 1)
+
+    # 第一段包含 . 或 : 或为 localhost 时视为仓库地址
+    parts = name.split('/', 1)
+    if len(parts) == 2 and ('.' in parts[0] or ':' in parts[0] or parts[0] == 'localhost'):
+        registry, repository = parts
+    else:
+        registry, repository = 'docker.io', name
+
+    if registry in DOCKER_HUB_ALIASES:
+        registry = DOCKER_HUB_REGISTRY
+        if '/' not in repository:
+            repository = f"library/{repository}"
+
+    return ImageReference(registry=registry, repository=repository, reference=reference)
+
+
+def _parse_auth_challenge(header: str) -> Tuple[str, Dict[str, str]]:
+    """解析 WWW-Authenticate 响应头"""
+    scheme, _, params = header.partition(' ')
+    values = dict(re.findall(r'(\w+)="([^"]*)"', params))
+    return scheme.lower(), values
+
+
+def _parse_scopes(scope: str) -> Dict[str, Set[str]]:
+    """把 "repository:a:pull,push repository:b:pull" 解析为 {资源: 操作集合}"""
+    scopes: Dict[str, Set[str]] = {}
+    for item in scope.split():
+        resource, _, actions = item.rpartition(':')
+        scopes.setdefault(resource, set()).update(a for a in actions.split(',') if a)
+    return scopes
+
+
+def _format_scopes(scopes: Dict[str, Set[str]]) -> str:
+    return ' '.join(f"{resource}:{','.join(sorted(actions))}" for resource, actions in sorted(scopes.items()))
+
+
+class ConnectionPool:
+    """
+    按主机复用的 HTTP keep-alive 连接池
+
+    连接在响应读取完毕（或关闭）后才能被再次借出；空闲过久的连接直接丢弃，
+    避免复用已被服务端关闭的连接
+    """
+
+    def __init__(self, max_per_host: int = 16, idle_timeout: float = 30.0):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self._connections: Dict[Tuple[str, str], List[Tuple[http.client.HTTPConnection, Any, float]]] = {}
+        self._lock = threading.Lock()
+        self._ssl_context = ssl.create_default_context()
+
+    def acquire(self, scheme: str, netloc: str) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        借出连接
+
+        Returns:
+            (连接, 是否为复用的连接)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entries = self._connections.get((scheme, netloc), [])
+            for entry in list(entries):
+                connection, response, last_used = entry
+                if not response.isclosed():
+                    continue
+                entries.remove(entry)
+                if (response.will_close or not self._fully_read(response)
+                        or now - last_used > self.idle_timeout):
+                    connection.close()
+                    continue
+                return connection, True
+        return self._new_connection(scheme, netloc), False
+
+    @staticmethod
+    def _fully_read(response: Any) -> bool:
+        """响应体是否已读完；提前关闭的响应会在连接上留下未读数据，不能复用"""
+        if response.chunked:
+            return response.chunk_left is None
+        return response.length == 0
+
+    def _new_connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=300, blocksize=CHUNK_SIZE, context=self._ssl_context)
+        return http.client.HTTPConnection(netloc, timeout=300, blocksize=CHUNK_SIZE)
+
+    def register(self, scheme: str, netloc: str, connection: http.client.HTTPConnection, response: Any) -> None:
+        """登记已收到响应的连接，响应读取完毕后即可复用"""
+        with self._lock:
+            entries = self._connections.setdefault((scheme, netloc), [])
+            entries.append((connection, response, time.monotonic()))
+            # 超出上限时关闭最早的空闲连接
+            while len(entries) > self.max_per_host:
+                for position, (old_connection, old_response, _) in enumerate(entries):
+                    if old_response.isclosed():
+                        old_connection.close()
+                        del entries[position]
+                        break
+                else:
+                    break
+
+
+class TokenCache:
+    """
+    Bearer 令牌缓存
+
+    按 (realm, service, 用户名) 分组，在有效期内复用；
+    已缓存令牌的作用域覆盖本次请求时直接复用，不再单独申请
+    """
+
+    # 提前失效的秒数，避免令牌在请求途中过期
+    EXPIRY_MARGIN = 10
+    # 合并作用域时最多包含的资源数，避免令牌过大
+    MAX_MERGED_RESOURCES = 10
+
+    def __init__(self):
+        self._tokens: Dict[Tuple[str, str, str], List[Tuple[Dict[str, Set[str]], str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _valid_entries(self, key: Tuple[str, str, str]) -> List[Tuple[Dict[str, Set[str]], str, float]]:
+        now = time.time()
+        entries = [entry for entry in self._tokens.get(key, []) if entry[2] > now]
+        self._tokens[key] = entries
+        return entries
+
+    def find(self, key: Tuple[str, str, str], scope: str) -> Optional[str]:
+        """查找覆盖指定作用域的有效令牌"""
+        wanted = _parse_scopes(scope)
+        with self._lock:
+            for scopes, token, _ in reversed(self._valid_entries(key)):
+                if all(actions <= scopes.get(resource, set()) for resource, actions in wanted.items()):
+                    return token
+        return None
+
+    def merged_scope(self, key: Tuple[str, str, str], scope: str) -> str:
+        """把请求的作用域与最近仍有效令牌的作用域合并，一个令牌即可访问多个仓库"""
+        merged = _parse_scopes(scope)
+        with self._lock:
+            entries = self._valid_entries(key)
+        if entries:
+            for resource, actions in entries[-1][0].items():
+                if resource in merged or len(merged) < self.MAX_MERGED_RESOURCES:
+                    merged.setdefault(resource, set()).update(actions)
+        return _format_scopes(merged)
+
+    def store(self, key: Tuple[str, str, str], scope: str, token: str, expires_in: float) -> None:
+        expires_at = time.time() + max(expires_in - self.EXPIRY_MARGIN, 0)
+        with self._lock:
+            self._valid_entries(key).append((_parse_scopes(scope), token, expires_at))
+
+    def invalidate(self, key: Tuple[str, str, str], token: str) -> None:
+        with self._lock:
+            self._tokens[key] = [entry for entry in self._tokens.get(key, []) if entry[1] != token]
+
+
+# 进程内所有客户端共享连接池、令牌缓存和各仓库的认证方式
+_CONNECTION_POOL = ConnectionPool()
+_TOKEN_CACHE = TokenCache()
+_AUTH_CHALLENGES: Dict[str, Tuple[str, Dict[str, str]]] = {}
+# 各仓库按请求方法统计的请求数: (仓库地址, 方法) -> 次数
+_REQUEST_COUNTS: Dict[Tuple[str, str], int] = {}
+_REQUEST_COUNTS_LOCK = threading.Lock()
+
+
+def request_counts(reset: bool = False) -> Dict[Tuple[str, str], int]:
+    """
+    返回本进程发出的请求数统计
+
+    Args:
+        reset: 返回后清零
+    """
+    with _REQUEST_COUNTS_LOCK:
+        counts = dict(_REQUEST_COUNTS)
+        if reset:
+            _REQUEST_COUNTS.clear()
+    return counts
+
+
+class RegistryClient:
+    """OCI Distribution API 客户端"""
+
+    def __init__(self, registry: str, username: Optional[str] = None, password: Optional[str] = None):
+        self.registry = registry
+        self.username = username
+        self.password = password
+        self.scheme = 'http' if self._is_insecure(registry) else 'https'
+        self.base_url = f"{self.scheme}://{registry}"
+
+    @staticmethod
+    def _is_insecure(registry: str) -> bool:
+        """本地仓库和 INSECURE_REGISTRIES 中列出的仓库使用HTTP"""
+        host = registry.split(':', 1)[0]
+        insecure = [r.strip() for r in os.getenv('INSECURE_REGISTRIES', '').split(',') if r.strip()]
+        return host in ('localhost', '127.0.0.1') or registry in insecure
+
+    def _basic_credentials(self) -> str:
+        credentials = f"{self.username}:{self.password or ''}".encode('utf-8')
+        return f"Basic {base64.b64encode(credentials).decode('ascii')}"
+
+    def _token_key(self, challenge: Dict[str, str]) -> Tuple[str, str, str]:
+        return challenge.get('realm', ''), challenge.get('service', ''), self.username or ''
+
+    def _auth_header(self, scope: Optional[str], merge: bool = True) -> Optional[str]:
+        """
+        获取认证头
+
+        已知仓库使用 Bearer 认证时，直接从缓存取令牌或预先申请，省去一次401往返
+        """
+        challenge = _AUTH_CHALLENGES.get(self.registry)
+        if not challenge:
+            return None
+
+        auth_scheme, params = challenge
+        if auth_scheme == 'basic':
+            return self._basic_credentials() if self.username else None
+
+        scope = scope or params.get('scope', '')
+        key = self._token_key(params)
+        token = _TOKEN_CACHE.find(key, scope)
+        if not token:
+            requested = _TOKEN_CACHE.merged_scope(key, scope) if merge else scope
+            token, expires_in = self._fetch_token(params, requested)
+            _TOKEN_CACHE.store(key, requested, token, expires_in)
+        return f"Bearer {token}"
+
+    def _fetch_token(self, challenge: Dict[str, str], scope: str) -> Tuple[str, float]:
+        """
+        根据 Bearer 认证质询获取访问令牌
+
+        Returns:
+            (令牌, 有效期秒数)
+        """
+        realm = challenge.get('realm')
+        if not realm:
+            raise RegistryError(f"认证质询缺少realm: {self.registry}")
+
+        query = []
+        if challenge.get('service'):
+            query.append(('service', challenge['service']))
+        # 多个作用域以空格分隔，例如跨仓库挂载时同时需要两个仓库的权限
+        query.extend(('scope', item) for item in scope.split())
+
+        headers = {'Authorization': self._basic_credentials()} if self.username else {}
+        url = f"{realm}?{urlencode(query)}" if query else realm
+        response = self._send('GET', url, headers)
+        body = response.read()
+        if response.status != 200:
+            raise RegistryError(f"获取令牌失败: {realm} (HTTP {response.status})", response.status)
+
+        data = json.loads(body)
+        token = data.get('token') or data.get('access_token')
+        if not token:
+            raise RegistryError(f"令牌响应中缺少token字段: {realm}")
+        # 规范规定未返回 expires_in 时令牌有效期为60秒
+        return token, float(data.get('expires_in') or 60)
+
+    def _send(self, method: str, url: str, headers: Dict[str, str], body: Any = None) -> http.client.HTTPResponse:
+        """通过连接池发送单个HTTP请求，返回未读取的响应"""
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = f"{path}?{parsed.query}"
+
+        # 复用的连接可能已被服务端关闭，请求体可重发时换新连接重试一次
+        replayable = body is None or isinstance(body, (bytes, str))
+        with _REQUEST_COUNTS_LOCK:
+            key = (parsed.netloc, method)
+            _REQUEST_COUNTS[key] = _REQUEST_COUNTS.get(key, 0) + 1
+        while True:
+            connection, reused = _CONNECTION_POOL.acquire(parsed.scheme, parsed.netloc)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if reused and replayable:
+                    continue
+                raise RegistryError(f"请求失败: {method} {url} - {e}")
+            _CONNECTION_POOL.register(parsed.scheme, parsed.netloc, connection, response)
+            return response
+
+    def request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                body: Any = None, scope: Optional[str] = None,
+                expected: Tuple[int, ...] = (200,)) -> http.client.HTTPResponse:
+        """
+        发送仓库API请求，自动处理认证和重定向
+
+        Args:
+            method: HTTP方法
+            path: /v2/ 开头的路径或完整URL
+            headers: 额外请求头
+            body: 请求体（bytes或文件对象）
+            scope: 令牌作用域，例如 repository:library/nginx:pull
+            expected: 视为成功的状态码
+
+        Returns:
+            未读取的响应对象，调用方负责读取
+        """
+        url = urljoin(self.base_url, path)
+        request_headers = dict(headers or {})
+        auth_attempts = 0
+        throttled = 0
+        retries = 0
+        throttle = throttle_for(self.registry)
+        replayable = body is None or isinstance(body, (bytes, str))
+        # 只读请求遇到临时错误时在这里重试；写请求由调用方按上传进度决定如何重试
+        idempotent = method in ('GET', 'HEAD')
+
+        for _ in range(6 + MAX_THROTTLE_RETRIES + MAX_ATTEMPTS[TRANSIENT]):
+            send_headers = dict(request_headers)
+            # 重定向到其他主机（例如CDN）时不携带认证信息，也不计入该仓库的限流
+            auth = None
+            own_host = urlparse(url).netloc == self.registry
+            # Docker Hub 按清单 GET 请求计算拉取次数，只有这类请求消耗令牌桶
+            metered = own_host and method == 'GET' and '/manifests/' in url
+            if own_host:
+                auth = self._auth_header(scope, merge=auth_attempts == 0)
+                if auth:
+                    send_headers['Authorization'] = auth
+                try:
+                    throttle.acquire(metered)
+                except ThrottleError as e:
+                    raise ThrottledError(str(e), e.wait) from e
+
+            try:
+                response = self._send(method, url, send_headers, body)
+            except RegistryError as e:
+                delay = retry_delay(classify(e), retries) if idempotent else None
+                if delay is None:
+                    raise
+                retries += 1
+                print(f"  ⚠️ 请求失败，{delay:.1f}s 后重试（第 {retries} 次）: {e}")
+                time.sleep(delay)
+                continue
+            if own_host:
+                throttle.observe(response, metered)
+
+            if response.status == 429 and replayable and throttled < MAX_THROTTLE_RETRIES:
+                response.read()
+                throttled += 1
+                continue
+
+            if response.status == 401 and auth_attempts < 2:
+                response.read()
+                auth_scheme, params = _parse_auth_challenge(response.getheader('WWW-Authenticate', ''))
+                if auth_scheme not in ('bearer', 'basic') or (auth_scheme == 'basic' and not self.username):
+                    raise RegistryError(f"认证失败: {method} {url}", 401)
+                _AUTH_CHALLENGES[self.registry] = (auth_scheme, params)
+                # 已携带的令牌被拒绝（例如合并作用域未被授予），作废后按原作用域重新申请
+                if auth and auth.startswith('Bearer '):
+                    _TOKEN_CACHE.invalidate(self._token_key(params), auth[len('Bearer '):])
+                if not replayable:
+                    # 数据流已被读取，无法重发；不带状态码的错误按临时错误处理，由调用方重新打开数据流后重试
+                    raise RegistryError(f"认证失效，请求体无法重发: {method} {url}")
+                auth_attempts += 1
+                continue
+
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                response.read()
+                url = urljoin(url, response.getheader('Location'))
+                if response.status == 303:
+                    method, body = 'GET', None
+                elif not replayable:
+                    raise RegistryError(f"重定向后请求体无法重发: {method} {url}")
+                continue
+
+            if response.status not in expected:
+                detail = response.read()[:500]
+                error = RegistryError(f"{method} {url} 返回 HTTP {response.status}: "
+                                      f"{detail.decode('utf-8', errors='replace')}",
+                                      response.status, _error_code(detail))
+                delay = retry_delay(classify(error), retries) if idempotent and response.status >= 500 else None
+                if delay is None:
+                    raise error
+                retries += 1
+                print(f"  ⚠️ HTTP {response.status}，{delay:.1f}s 后重试（第 {retries} 次）: {method} {url}")
+                time.sleep(delay)
+                continue
+
+            return response
+
+        raise RegistryError(f"重定向、认证或限流重试次数过多: {method} {url}")
+
+    @staticmethod
+    def _scope(repository: str, actions: str = 'pull') -> str:
+        return f"repository:{repository}:{actions}"
+
+    def get_manifest(self, repository: str, reference: str) -> Tuple[bytes, str, str]:
+        """
+        获取镜像清单
+
+        Returns:
+            (清单内容, 媒体类型, 摘要)
+        """
+        response = self.request(
+            'GET', f"/v2/{repository}/manifests/{reference}",
+            headers={'Accept': MANIFEST_ACCEPT},
+            scope=self._scope(repository)
+        )
+        data = response.read()
+        media_type = response.getheader('Content-Type', '').split(';')[0].strip()
+        if not media_type or media_type in ('application/json', 'application/octet-stream'):
+            media_type = json.loads(data).get('mediaType', MEDIA_TYPE_MANIFEST_V2)
+        digest = response.getheader('Docker-Content-Digest') or f"sha256:{hashlib.sha256(data).hexdigest()}"
+        return data, media_type, digest
+
+    def head_manifest(self, repository: str, reference: str) -> Optional[Tuple[str, str]]:
+        """
+        查询清单摘要，不下载清单内容
+
+        Returns:
+            (摘要, 媒体类型)，清单不存在时返回None
+        """
+        try:
+            response = self.request(
+                'HEAD', f"/v2/{repository}/manifests/{reference}",
+                headers={'Accept': MANIFEST_ACCEPT},
+                scope=self._scope(repository)
+            )
+        except RegistryError as e:
+            if e.status == 404:
+                return None
+            raise
+        response.read()
+        media_type = response.getheader('Content-Type', '').split(';')[0].strip()
+        digest = response.getheader('Docker-Content-Digest')
+        if not digest:
+            # 部分仓库的HEAD响应不带摘要，退回到GET并自行计算
+            _, media_type, digest = self.get_manifest(repository, reference)
+        return digest, media_type
+
+    def list_tags(self, repository: str, page_size: int = 1000, cache: Any = None) -> Optional[List[str]]:
+        """
+        分页列出仓库的所有标签
+
+        Args:
+            cache: 标签列表缓存（TagListCache），提供时每一页都带 If-None-Match 请求，
+                   返回 304 的页面直接使用缓存内容
+
+        Returns:
+            标签列表，仓库不存在时返回None
+        """
+        tags: List[str] = []
+        path = f"/v2/{repository}/tags/list?{urlencode({'n': page_size})}"
+        while path:
+            cached = cache.get(self.registry, path) if cache else None
+            headers = {'If-None-Match': cached['etag']} if cached else None
+            try:
+                response = self.request('GET', path, headers=headers, scope=self._scope(repository),
+                                        expected=(200, 304) if cached else (200,))
+            except RegistryError as e:
+                if e.status == 404:
+                    return None
+                raise
+            if response.status == 304:
+                response.read()
+                page = cache.hit(self.registry, path)
+                tags.extend(page['tags'])
+                path = page.get('next')
+                continue
+
+            data = json.loads(response.read() or b'{}')
+            page_tags = data.get('tags') or []
+            tags.extend(page_tags)
+
+            # 通过 Link: </v2/...?last=xxx>; rel="next" 获取下一页
+            match = re.search(r'<([^>]+)>\s*;\s*rel="?next"?', response.getheader('Link', ''))
+            next_path = match.group(1) if match else None
+            if cache:
+                cache.put(self.registry, path, response.getheader('ETag'), page_tags, next_path)
+            path = next_path
+        return tags
+
+    def put_manifest(self, repository: str, reference: str, data: bytes, media_type: str) -> str:
+        """推送镜像清单，返回仓库计算的摘要"""
+        response = self.request(
+            'PUT', f"/v2/{repository}/manifests/{reference}",
+            headers={'Content-Type': media_type, 'Content-Length': str(len(data))},
+            body=data,
+            scope=self._scope(repository, 'pull,push'),
+            expected=(200, 201)
+        )
+        response.read()
+        return response.getheader('Docker-Content-Digest', '')
+
+    def blob_exists(self, repository: str, digest: str) -> bool:
+        """检查仓库中是否已存在数据块"""
+        try:
+            response = self.request(
+                'HEAD', f"/v2/{repository}/blobs/{digest}",
+                scope=self._scope(repository, 'pull,push'),
+                expected=(200,)
+            )
+            response.read()
+            return True
+        except RegistryError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    def mount_blob(self, repository: str, digest: str, from_repository: str) -> Optional[str]:
+        """
+        从同一仓库地址下的其他仓库挂载数据块
+
+        Returns:
+            挂载成功返回None；仓库不支持挂载时返回新建上传会话的地址，可直接用于上传
+        """
+        scope = f"{self._scope(repository, 'pull,push')} {self._scope(from_repository)}"
+        query = urlencode({'mount': digest, 'from': from_repository})
+        response = self.request(
+            'POST', f"/v2/{repository}/blobs/uploads/?{query}",
+            scope=scope, expected=(201, 202)
+        )
+        response.read()
+        if response.status == 201:
+            return None
+        return response.getheader('Location') or ''
+
+    def open_blob(self, repository: str, digest: str, offset: int = 0) -> http.client.HTTPResponse:
+        """
+        以流的方式读取数据块
+
+        Args:
+            offset: 起始偏移量，大于0时通过 Range 请求从该位置继续读取
+        """
+        path = f"/v2/{repository}/blobs/{digest}"
+        if not offset:
+            return self.request('GET', path, scope=self._scope(repository))
+
+        response = self.request('GET', path, headers={'Range': f"bytes={offset}-"},
+                                scope=self._scope(repository), expected=(200, 206))
+        if response.status == 200:
+            # 服务端不支持 Range 请求，丢弃已传输的部分
+            remaining = offset
+            while remaining:
+                data = response.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    raise RegistryError(f"数据块长度不足: {repository}@{digest}")
+                remaining -= len(data)
+        return response
+
+    def start_upload(self, repository: str) -> str:
+        """创建上传会话，返回会话地址"""
+        response = self.request('POST', f"/v2/{repository}/blobs/uploads/",
+                                scope=self._scope(repository, 'pull,push'), expected=(202,))
+        response.read()
+        location = response.getheader('Location')
+        if not location:
+            raise RegistryError(f"上传会话缺少Location: {repository}")
+        return location
+
+    @staticmethod
+    def _upload_offset(response: http.client.HTTPResponse, confirmed: int = 0) -> int:
+        """
+        从上传会话响应的 Range 头（0-N，N 为最后一个字节的位置）取得已确认的字节数，没有 Range 时为 0
+
+        部分仓库对空会话也返回 0-0，与已接收 1 字节无法区分：
+        只有已知会话中至少有 1 字节（confirmed）时才按 1 字节处理
+        """
+        match = re.match(r'^(?:bytes=)?0-(\d+)$', response.getheader('Range') or '')
+        if not match:
+            return 0
+        end = int(match.group(1))
+        return end + 1 if end or confirmed else 0
+
+    def upload_status(self, repository: str, location: str, confirmed: int = 0) -> int:
+        """
+        查询上传会话已确认接收的字节数
+
+        Args:
+            confirmed: 之前已确认的字节数，用于区分空会话和只有 1 字节的会话
+        """
+        response = self.request('GET', location, scope=self._scope(repository, 'pull,push'), expected=(204,))
+        response.read()
+        return self._upload_offset(response, confirmed)
+
+    def upload_chunk(self, repository: str, location: str, data: bytes, offset: int) -> Tuple[str, int]:
+        """
+        向上传会话追加一个数据块分片
+
+        Returns:
+            (新的会话地址, 已确认接收的字节数)
+        """
+        response = self.request(
+            'PATCH', location,
+            headers={
+                'Content-Type': 'application/octet-stream',
+                'Content-Length': str(len(data)),
+                'Content-Range': f"{offset}-{offset + len(data) - 1}",
+            },
+            body=data,
+            scope=self._scope(repository, 'pull,push'),
+            expected=(202,)
+        )
+        response.read()
+        return response.getheader('Location') or location, self._upload_offset(response, offset + len(data))
+
+    def finish_upload(self, repository: str, location: str, digest: str) -> None:
+        """结束上传会话，由仓库校验数据块摘要"""
+        separator = '&' if '?' in location else '?'
+        upload_url = f"{urljoin(self.base_url, location)}{separator}{urlencode({'digest': digest})}"
+        response = self.request('PUT', upload_url, headers={'Content-Length': '0'}, body=b'',
+                                scope=self._scope(repository, 'pull,push'), expected=(201, 204))
+        response.read()
+
+    def upload_blob(self, repository: str, digest: str, stream: Any, size: int,
+                    location: Optional[str] = None) -> None:
+        """
+        上传数据块
+
+        Args:
+            repository: 目标仓库名
+            digest: 数据块摘要
+            stream: 可读取的文件对象，内容按块发送，不会整体读入内存
+            size: 数据块大小
+            location: 已创建的上传会话地址（例如挂载失败时返回的地址）
+        """
+        scope = self._scope(repository, 'pull,push')
+        if not location:
+            location = self.start_upload(repository)
+
+        separator = '&' if '?' in location else '?'
+        upload_url = f"{urljoin(self.base_url, location)}{separator}{urlencode({'digest': digest})}"
+        response = self.request(
+            'PUT', upload_url,
+            headers={'Content-Type': 'application/octet-stream', 'Content-Length': str(size)},
+            body=stream,
+            scope=scope,
+            expected=(201, 204)
+        )
+        response.read()
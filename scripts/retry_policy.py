@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+失败分类和重试策略
+按错误类型决定是否重试：网络中断和服务端错误带抖动地指数退避后重试，
+摘要不匹配时重新下载数据块，认证失败、镜像不存在和本地限流拒绝直接失败；
+所有重试共用一个运行级的重试预算，避免大面积故障时重试耗尽运行时间
+"""
+
+import random
+import threading
+from typing import List, Optional
+
+# 错误类型
+TRANSIENT = 'transient'
+AUTH = 'auth'
+NOT_FOUND = 'not_found'
+DIGEST_MISMATCH = 'digest_mismatch'
+FATAL = 'fatal'
+# 本地限流拒绝发送（仓库暂停时间过长），短时间内重试只会再次被拒绝，也不消耗重试预算
+THROTTLED = 'throttled'
+
+# 各类错误的最大重试次数，未列出的类型不重试
+MAX_ATTEMPTS = {
+    TRANSIENT: 5,
+    DIGEST_MISMATCH: 2,
+}
+# 指数退避的基数和上限（秒），实际等待时间在 [上限/2, 上限] 之间随机
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# 每次运行允许的重试总次数
+DEFAULT_RETRY_BUDGET = 50
+
+# Distribution API 错误码
+_ERROR_CODES = {
+    'DIGEST_INVALID': DIGEST_MISMATCH,
+    'SIZE_INVALID': DIGEST_MISMATCH,
+    'UNAUTHORIZED': AUTH,
+    'DENIED': AUTH,
+    'NAME_UNKNOWN': NOT_FOUND,
+    'MANIFEST_UNKNOWN': NOT_FOUND,
+    'TOOMANYREQUESTS': TRANSIENT,
+    # 本地限流拒绝（见 rate_limit / registry_client.ThrottledError）
+    'THROTTLED': THROTTLED,
+    # 本地重新压缩镜像层失败（见 layer_compression）
+    'COMPRESSION_FAILED': FATAL,
+}
+# docker 命令输出中的错误特征（小写），按顺序匹配
+DOCKER_OUTPUT_PATTERNS = (
+    ('digest mismatch', DIGEST_MISMATCH),
+    ('failed to verify', DIGEST_MISMATCH),
+    ('toomanyrequests', TRANSIENT),
+    ('unauthorized', AUTH),
+    ('denied', AUTH),
+    ('authentication required', AUTH),
+    ('manifest unknown', NOT_FOUND),
+    ('not found', NOT_FOUND),
+    ('does not exist', NOT_FOUND),
+    ('no matching manifest', NOT_FOUND),
+    ('timeout', TRANSIENT),
+    ('connection reset', TRANSIENT),
+    ('connection refused', TRANSIENT),
+    ('unexpected eof', TRANSIENT),
+    ('broken pipe', TRANSIENT),
+    ('received unexpected http status: 5', TRANSIENT),
+    ('service unavailable', TRANSIENT),
+    ('bad gateway', TRANSIENT),
+)
+
+
+def classify(error: Exception) -> str:
+    """
+    判断错误类型
+
+    带 status 的错误（RegistryError）先按仓库返回的错误码、再按状态码判断；
+    没有状态码的错误（网络中断、读取不完整）视为临时错误
+    """
+    code = getattr(error, 'code', None)
+    if code in _ERROR_CODES:
+        return _ERROR_CODES[code]
+    if not hasattr(error, 'status'):
+        return TRANSIENT
+    status = error.status
+    if status is None or status in (408, 416, 429) or status >= 500:
+        return TRANSIENT
+    if status in (401, 403):
+        return AUTH
+    if status == 404:
+        return NOT_FOUND
+    return FATAL
+
+
+def classify_output(lines: List[str]) -> str:
+    """按 docker 命令输出的最后几行判断错误类型，从最后一行往前找"""
+    for line in reversed(lines):
+        lowered = line.lower()
+        for pattern, kind in DOCKER_OUTPUT_PATTERNS:
+            if pattern in lowered:
+                return kind
+    return FATAL
+
+
+def backoff(attempt: int) -> float:
+    """第 attempt 次重试（从 0 开始）前的等待时间，带抖动避免并发任务同时重试"""
+    ceiling = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class RetryBudget:
+    """运行级重试预算（线程安全）"""
+
+    def __init__(self, total: int = DEFAULT_RETRY_BUDGET):
+        self.total = total
+        self.used = 0
+        self._lock = threading.Lock()
+        self._announced = False
+
+    def take(self) -> bool:
+        """消耗一次重试，预算用完时返回False"""
+        with self._lock:
+            if self.used < self.total:
+                self.used += 1
+                return True
+            if not self._announced:
+                self._announced = True
+                print(f"⚠️ 本次运行的重试预算已用完（{self.total} 次），后续错误不再重试")
+            return False
+
+
+_BUDGET = RetryBudget()
+
+
+def set_retry_budget(total: int) -> None:
+    """设置本次运行的重试预算"""
+    global _BUDGET
+    _BUDGET = RetryBudget(max(0, total))
+
+
+def retry_budget() -> RetryBudget:
+    return _BUDGET
+
+
+def retry_delay(kind: str, attempt: int) -> Optional[float]:
+    """
+    判断是否重试
+
+    Args:
+        kind: 错误类型
+        attempt: 已重试的次数
+
+    Returns:
+        重试前的等待秒数；该类错误不可重试、次数或预算用完时返回None
+    """
+    if attempt >= MAX_ATTEMPTS.get(kind, 0) or not _BUDGET.take():
+        return None
+    return backoff(attempt)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+限时同步和断点续传
+时间预算快用完时不再领取新任务，把已完成和未处理的镜像写入检查点，
+下次运行从检查点继续，不重复处理已完成的镜像
+"""
+
+import json
+import os
+import time
+from typing import List, Set, Optional, Iterable
+
+DEFAULT_CHECKPOINT_FILE = '.sync-state/checkpoint.json'
+# 超过有效期的检查点视为过期，避免很久以前中断的运行影响之后的强制同步
+CHECKPOINT_MAX_AGE_HOURS = 24
+DEFAULT_BUDGET_RESERVE_MINUTES = 3
+CHECKPOINT_VERSION = 1
+
+
+class TimeBudget:
+    """
+    运行时间预算
+
+    剩余时间少于预留时间时视为用完，预留时间用于完成正在执行的任务和保存结果
+    """
+
+    def __init__(self, minutes: float, reserve_minutes: float = DEFAULT_BUDGET_RESERVE_MINUTES):
+        self.deadline = time.monotonic() + minutes * 60
+        self.reserve_seconds = reserve_minutes * 60
+        self._announced = False
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def expired(self) -> bool:
+        if self.remaining() > self.reserve_seconds:
+            return False
+        if not self._announced:
+            self._announced = True
+            print(f"⏳ 时间预算即将用完（剩余 {max(0, self.remaining()) / 60:.1f} 分钟），不再开始新的镜像")
+        return True
+
+
+class SyncCheckpoint:
+    """
+    同步检查点
+
+    以镜像配置的去重键（规范化引用|平台）记录:
+      finished  已完成（同步成功或确认已是最新）的镜像
+      pending   因时间预算未处理的镜像
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_FILE, config_file: str = '',
+                 max_age_hours: float = CHECKPOINT_MAX_AGE_HOURS):
+        self.path = path
+        self.config_file = config_file
+        self.max_age_seconds = max_age_hours * 3600
+        self.finished: Set[str] = set()
+        self.pending: List[str] = []
+        self.created_at = int(time.time())
+
+    @staticmethod
+    def key(reference: str, platform: Optional[str] = None) -> str:
+        return f"{reference}|{platform or ''}"
+
+    def load(self) -> None:
+        """加载检查点，文件不存在、已过期或来自其他配置文件时忽略"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取检查点失败，忽略: {e}")
+            return
+        if data.get('version') != CHECKPOINT_VERSION or data.get('config') != self.config_file:
+            print(f"ℹ️ 检查点与当前配置不匹配，忽略: {self.path}")
+            return
+        if time.time() - data.get('created_at', 0) > self.max_age_seconds:
+            print(f"ℹ️ 检查点已过期，忽略: {self.path}")
+            return
+        self.finished = set(data.get('finished', []))
+        self.pending = data.get('pending', [])
+        self.created_at = data.get('created_at', self.created_at)
+        print(f"♻️ 从检查点继续: {len(self.finished)} 个镜像已完成，{len(self.pending)} 个待处理 ({self.path})")
+
+    def update(self, finished: Iterable[str], pending: Iterable[str]) -> None:
+        """记录本次运行的结果，已完成的镜像与之前的检查点合并"""
+        self.finished.update(finished)
+        self.pending = [key for key in pending if key not in self.finished]
+
+    def save(self) -> None:
+        """
+        保存检查点；没有待处理镜像时说明整轮已完成，删除检查点
+
+        先写临时文件再替换，避免中途中断导致文件损坏
+        """
+        if not self.pending:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+                print(f"🧹 全部镜像已处理，删除检查点: {self.path}")
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        data = {
+            'version': CHECKPOINT_VERSION,
+            'config': self.config_file,
+            'created_at': self.created_at,
+            'updated_at': int(time.time()),
+            'finished': sorted(self.finished),
+            'pending': self.pending,
+        }
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+        print(f"💾 保存检查点: {len(self.finished)} 个已完成，{len(self.pending)} 个待处理 ({self.path})")
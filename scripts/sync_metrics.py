@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+同步和构建指标
+记录每个镜像各阶段的耗时、传输字节数和重试次数，
+与 sync-result.env 一起输出 JSON 报告和 Prometheus textfile，便于跨多次运行绘制趋势
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+
+METRIC_PREFIX = 'docker_pusher'
+
+
+@dataclass
+class ImageMetrics:
+    """
+    单个镜像的指标
+
+    phases 中的阶段：
+      同步（registry 引擎）: check / resolve / transfer（数据块边拉边推）/ push（推送清单）
+      同步（docker 引擎）:   check / pull / push / cleanup
+      构建:                 validate / build / push / cleanup
+    """
+    name: str
+    status: str = ''
+    phases: Dict[str, float] = field(default_factory=dict)
+    bytes_downloaded: int = 0
+    # 从本地数据块缓存读取的字节数
+    bytes_cached: int = 0
+    bytes_uploaded: int = 0
+    blobs_skipped: int = 0
+    blobs_mounted: int = 0
+    blobs_uploaded: int = 0
+    retries: int = 0
+    # 失败时的错误类型（见 retry_policy），成功时为空
+    error: str = ''
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = round(self.phases.get(phase, 0.0) + seconds, 4)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """计时一个阶段，同一阶段多次计时会累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_copy(self, copied: Any) -> None:
+        """计入一次仓库间复制的结果（CopyResult）"""
+        self.bytes_downloaded += copied.bytes_downloaded
+        self.bytes_cached += copied.bytes_from_cache
+        self.bytes_uploaded += copied.bytes_uploaded
+        self.blobs_skipped += copied.blobs_skipped
+        self.blobs_mounted += copied.blobs_mounted
+        self.blobs_uploaded += copied.blobs_uploaded
+        self.retries += copied.retries
+        if copied.transfer_seconds:
+            self.add_phase('transfer', copied.transfer_seconds)
+        if copied.push_seconds:
+            self.add_phase('push', copied.push_seconds)
+
+
+class MetricsRegistry:
+    """按镜像名保存指标，供并发的工作线程使用"""
+
+    def __init__(self):
+        self._records: Dict[str, ImageMetrics] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> ImageMetrics:
+        with self._lock:
+            if name not in self._records:
+                self._records[name] = ImageMetrics(name)
+            return self._records[name]
+
+    def collect(self, names: List[str]) -> List[ImageMetrics]:
+        """按给定顺序返回指标，没有记录的镜像返回空指标"""
+        return [self.get(name) for name in names]
+
+
+class PhaseTracker:
+    """
+    根据外部脚本输出中的阶段标记统计各阶段耗时
+
+    作为 run_streaming 的 on_line 回调使用，遇到标记时结束上一阶段、开始新阶段
+    """
+
+    def __init__(self, metrics: ImageMetrics, markers: List[Tuple[str, str]], initial: Optional[str] = None):
+        self.metrics = metrics
+        self.markers = markers
+        self.current = initial
+        self.started = time.perf_counter()
+
+    def __call__(self, line: str) -> None:
+        for marker, phase in self.markers:
+            if line.startswith(marker):
+                self._switch(phase)
+                return
+
+    def _switch(self, phase: Optional[str]) -> None:
+        now = time.perf_counter()
+        if self.current:
+            self.metrics.add_phase(self.current, now - self.started)
+        self.current, self.started = phase, now
+
+    def finish(self) -> None:
+        self._switch(None)
+
+
+def report_paths(output_file: str) -> Tuple[str, str]:
+    """与结果文件同名的 JSON 报告和 Prometheus textfile 路径"""
+    base = os.path.splitext(output_file)[0]
+    return f"{base}.json", f"{base}.prom"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels: str) -> str:
+    return ','.join(f'{key}="{_escape_label(str(value))}"' for key, value in labels.items())
+
+
+def format_prometheus(kind: str, records: List[ImageMetrics], summary: Dict[str, Any]) -> str:
+    """
+    生成 Prometheus textfile 内容（node_exporter textfile collector 格式）
+
+    Args:
+        kind: sync 或 build
+        records: 每个镜像的指标
+        summary: 本次运行的汇总（total / success / failed / pending / duration_seconds）
+    """
+    metrics: Dict[str, Tuple[str, List[str]]] = {}
+
+    def add(name: str, help_text: str, labels: str, value: float) -> None:
+        metrics.setdefault(name, (help_text, []))[1].append(f"{METRIC_PREFIX}_{name}{{{labels}}} {value}")
+
+    for record in records:
+        base = {'kind': kind, 'image': record.name}
+        for phase, seconds in sorted(record.phases.items()):
+            add('image_phase_seconds', '镜像各阶段耗时（秒）', _labels(**base, phase=phase), seconds)
+        add('image_bytes', '镜像传输字节数', _labels(**base, direction='downloaded'), record.bytes_downloaded)
+        add('image_bytes', '镜像传输字节数', _labels(**base, direction='cache'), record.bytes_cached)
+        add('image_bytes', '镜像传输字节数', _labels(**base, direction='uploaded'), record.bytes_uploaded)
+        for result, count in (('skipped', record.blobs_skipped), ('mounted', record.blobs_mounted),
+                              ('uploaded', record.blobs_uploaded)):
+            add('image_blobs', '镜像数据块数', _labels(**base, result=result), count)
+        add('image_retries', '镜像传输重试次数', _labels(**base), record.retries)
+        if record.error:
+            add('image_error', '镜像失败的错误类型', _labels(**base, error=record.error), 1)
+        add('image_success', '镜像是否成功（跳过和留待下次运行也视为成功）', _labels(**base, status=record.status or 'unknown'),
+            0 if record.status == 'failed' else 1)
+
+    for status in ('total', 'success', 'failed', 'pending'):
+        add('run_images', '本次运行的镜像数', _labels(kind=kind, status=status), summary.get(status, 0))
+    add('run_duration_seconds', '本次运行总耗时（秒）', _labels(kind=kind), summary.get('duration_seconds', 0))
+    add('run_timestamp_seconds', '本次运行结束时间', _labels(kind=kind), int(time.time()))
+
+    lines = []
+    for name, (help_text, samples) in metrics.items():
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+def write_reports(output_file: str, kind: str, records: List[ImageMetrics], summary: Dict[str, Any]) -> None:
+    """在结果文件旁写入 JSON 报告和 Prometheus textfile"""
+    json_path, prom_path = report_paths(output_file)
+    report = {
+        'kind': kind,
+        'finished_at': int(time.time()),
+        'summary': summary,
+        'images': [asdict(record) for record in records],
+    }
+    try:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        # 先写临时文件再替换，避免 textfile collector 读到一半的文件
+        with open(f"{prom_path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(format_prometheus(kind, records, summary))
+        os.replace(f"{prom_path}.tmp", prom_path)
+    except OSError as e:
+        print(f"❌ 保存指标报告失败: {e}")
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+并发同步调度器
+按源仓库和目标仓库分别限制并发数，在线程池中执行同步任务
+"""
+
+import os
+import shutil
+import threading
+from typing import List, Dict, Any, Callable, Optional
+
+from rate_limit import concurrency_limit
+
+# 各源仓库的默认并发上限，Docker Hub 匿名拉取有频率限制，取值较小
+DEFAULT_REGISTRY_LIMITS = {
+    'registry-1.docker.io': 3,
+    'ghcr.io': 4,
+    'quay.io': 4,
+}
+DEFAULT_SOURCE_LIMIT = 4
+DEFAULT_TARGET_LIMIT = 4
+
+# 磁盘预算: docker 数据目录，自动预算时保留的余量
+DEFAULT_DISK_PATH = '/var/lib/docker'
+DISK_HEADROOM_BYTES = 2 * 1024 ** 3
+# 等待磁盘空间的任务被后面的小任务插队超过该次数后，暂停插队直到它开始执行
+MAX_DISK_BYPASS = 8
+
+
+def parse_registry_limits(values: Optional[List[str]]) -> Dict[str, int]:
+    """
+    解析命令行中的并发限制，格式为 registry=N
+
+    Args:
+        values: 例如 ['docker.io=2', 'ghcr.io=6']
+
+    Returns:
+        仓库地址到并发上限的映射
+    """
+    limits = dict(DEFAULT_REGISTRY_LIMITS)
+    for value in values or []:
+        registry, _, limit = value.partition('=')
+        if not registry or not limit.isdigit() or int(limit) < 1:
+            raise ValueError(f"无效的并发限制: {value}（格式: registry=N）")
+        if registry in ('docker.io', 'index.docker.io'):
+            registry = 'registry-1.docker.io'
+        limits[registry] = int(limit)
+    return limits
+
+
+def parse_disk_budget(value: Optional[str], path: str = DEFAULT_DISK_PATH) -> Optional[int]:
+    """
+    解析磁盘预算
+
+    Args:
+        value: 以 GB 为单位的数字，或 auto（数据目录所在磁盘的剩余空间减去余量）
+        path: 数据目录，不存在时使用当前目录所在的磁盘
+
+    Returns:
+        预算字节数，未指定时返回None
+    """
+    if not value:
+        return None
+    if value == 'auto':
+        free = shutil.disk_usage(path if os.path.exists(path) else '.').free
+        return max(0, free - DISK_HEADROOM_BYTES)
+    try:
+        budget = float(value)
+    except ValueError:
+        raise ValueError(f"无效的磁盘预算: {value}（格式: GB 数或 auto）")
+    if budget <= 0:
+        raise ValueError(f"无效的磁盘预算: {value}（必须大于 0）")
+    return int(budget * 1024 ** 3)
+
+
+class SyncScheduler:
+    """
+    并发同步调度器
+
+    工作线程只领取源仓库和目标仓库都还有空闲名额的任务，
+    某个仓库达到上限时，其他仓库的任务可以继续执行，不会被队首任务阻塞；
+    源仓库的上限随其限流响应头动态调整（见 rate_limit）。
+    只访问源仓库的任务（列标签、解析清单）不占用目标仓库的名额
+
+    设置磁盘预算时，只在执行中任务的预估磁盘占用加上新任务的占用不超过预算时才领取；
+    放不下的大任务等待时，后面能放下的小任务可以先执行，
+    没有任务在执行时大任务总是可以单独执行
+    """
+
+    def __init__(self, jobs: int = 1, registry_limits: Optional[Dict[str, int]] = None,
+                 target_limit: int = DEFAULT_TARGET_LIMIT, disk_budget: Optional[int] = None):
+        self.jobs = max(1, jobs)
+        self.registry_limits = registry_limits if registry_limits is not None else dict(DEFAULT_REGISTRY_LIMITS)
+        self.target_limit = max(1, target_limit)
+        self.disk_budget = disk_budget
+        self._condition = threading.Condition()
+        self._active: Dict[str, int] = {}
+        self._active_target = 0
+        self._running = 0
+        self._disk_used = 0
+
+    def _limit(self, registry: str) -> int:
+        # 配置的上限按该仓库当前的限流状态缩放：配额将尽时降低，恢复后逐步回升
+        return concurrency_limit(registry, self.registry_limits.get(registry, DEFAULT_SOURCE_LIMIT))
+
+    def _can_start(self, registry: str, pushes: bool) -> bool:
+        return (self._active.get(registry, 0) < self._limit(registry)
+                and (not pushes or self._active_target < self.target_limit))
+
+    def _fits(self, cost: int) -> bool:
+        return (self.disk_budget is None or self._disk_used == 0
+                or self._disk_used + cost <= self.disk_budget)
+
+    def run(self, items: List[Any], registry_of: Callable[[Any], str],
+            worker: Callable[[Any], Any], ready: Optional[Callable[[Any], bool]] = None,
+            cost_of: Optional[Callable[[Any], int]] = None, pushes: bool = True) -> List[Any]:
+        """
+        并发执行任务
+
+        Args:
+            items: 任务列表
+            registry_of: 返回任务所属源仓库地址的函数
+            worker: 执行单个任务的函数
+            ready: 判断任务依赖是否已完成的函数，未完成的任务暂不领取；
+                   任一任务结束后会重新判断
+            cost_of: 返回任务预估磁盘占用（字节）的函数，仅在设置了磁盘预算时生效
+            pushes: 任务是否向目标仓库推送，为False时不受目标仓库并发上限限制
+
+        Returns:
+            与 items 顺序一致的结果列表
+        """
+        results: List[Any] = [None] * len(items)
+        pending = [(index, item, registry_of(item), cost_of(item) if cost_of else 0)
+                   for index, item in enumerate(items)]
+        # 等待磁盘空间的任务被插队的次数
+        bypassed: Dict[int, int] = {}
+
+        def take_task():
+            with self._condition:
+                while pending:
+                    # 没有任务在执行时依赖不可能再完成，按顺序领取，避免死锁
+                    stalled = self._running == 0
+                    waiting: List[int] = []
+                    for position, (index, item, registry, cost) in enumerate(pending):
+                        if not self._can_start(registry, pushes) or not (ready is None or stalled or ready(item)):
+                            continue
+                        if not self._fits(cost):
+                            waiting.append(index)
+                            continue
+                        if any(bypassed.get(i, 0) >= MAX_DISK_BYPASS for i in waiting):
+                            break
+                        for i in waiting:
+                            bypassed[i] = bypassed.get(i, 0) + 1
+                        task = pending.pop(position)
+                        self._active[registry] = self._active.get(registry, 0) + 1
+                        self._active_target += pushes
+                        self._running += 1
+                        self._disk_used += cost
+                        return task
+                    self._condition.wait()
+                return None
+
+        def release(registry: str, cost: int):
+            with self._condition:
+                self._active[registry] -= 1
+                self._active_target -= pushes
+                self._running -= 1
+                self._disk_used -= cost
+                self._condition.notify_all()
+
+        def worker_loop():
+            while True:
+                task = take_task()
+                if task is None:
+                    return
+                index, item, registry, cost = task
+                try:
+                    results[index] = worker(item)
+                except Exception as e:
+                    print(f"❌ 任务执行异常: {e}")
+                finally:
+                    release(registry, cost)
+
+        if self.jobs == 1 or len(items) <= 1:
+            worker_loop()
+            return results
+
+        threads = [threading.Thread(target=worker_loop, daemon=True)
+                   for _ in range(min(self.jobs, len(items)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+分片同步
+把镜像列表按预估传输大小均衡地分到多个 runner 上，每个分片只同步自己的镜像，
+最后合并各分片的结果文件
+"""
+
+import hashlib
+import json
+import os
+from typing import List, Dict, Tuple, Optional
+
+DEFAULT_SHARD_PLAN_FILE = 'shard-plan.json'
+# 没有任何已知大小时，未知镜像按此大小估算
+DEFAULT_IMAGE_SIZE = 200 * 1024 * 1024
+SHARD_PLAN_VERSION = 1
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    解析分片参数
+
+    Args:
+        spec: i/N，i 从 1 开始，例如 2/4
+
+    Returns:
+        (分片序号, 分片总数)
+    """
+    index, _, count = spec.partition('/')
+    if not index.isdigit() or not count.isdigit() or not 1 <= int(index) <= int(count):
+        raise ValueError(f"无效的分片参数: {spec}（格式: i/N，1 <= i <= N）")
+    return int(index), int(count)
+
+
+def fill_unknown_sizes(sizes: Dict[str, Optional[int]]) -> Dict[str, int]:
+    """未知大小按已知镜像大小的中位数估算"""
+    known = sorted(size for size in sizes.values() if size)
+    fallback = known[len(known) // 2] if known else DEFAULT_IMAGE_SIZE
+    return {key: size or fallback for key, size in sizes.items()}
+
+
+def partition(sizes: Dict[str, int], count: int) -> Dict[str, int]:
+    """
+    按大小均衡分片（最长处理时间优先的贪心算法）
+
+    从大到小依次放入当前总大小最小的分片；大小相同时按键排序，
+    总大小相同时放入序号小的分片，相同输入总是得到相同结果
+
+    Returns:
+        镜像键 -> 分片序号（从 1 开始）
+    """
+    totals = [0] * count
+    assignments: Dict[str, int] = {}
+    for key, size in sorted(sizes.items(), key=lambda item: (-item[1], item[0])):
+        shard = min(range(count), key=lambda i: (totals[i], i))
+        totals[shard] += size
+        assignments[key] = shard + 1
+    return assignments
+
+
+def fallback_shard(key: str, count: int) -> int:
+    """不在分片计划中的镜像（例如计划生成后新增的镜像）按键的哈希分配"""
+    return int(hashlib.sha256(key.encode()).hexdigest(), 16) % count + 1
+
+
+def shard_totals(assignments: Dict[str, int], sizes: Dict[str, int], count: int) -> List[int]:
+    totals = [0] * count
+    for key, shard in assignments.items():
+        totals[shard - 1] += sizes.get(key, 0)
+    return totals
+
+
+def save_plan(path: str, config_file: str, count: int, sizes: Dict[str, int],
+              assignments: Dict[str, int]) -> None:
+    """保存分片计划，供矩阵中的各个分片作业使用"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': SHARD_PLAN_VERSION,
+            'config': config_file,
+            'shards': count,
+            'assignments': assignments,
+            'sizes': sizes,
+        }, f, indent=2, sort_keys=True)
+
+
+def load_plan(path: str, count: int) -> Optional[Dict[str, int]]:
+    """
+    读取分片计划
+
+    Returns:
+        镜像键 -> 分片序号；文件不存在或分片数不一致时返回None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 读取分片计划失败，忽略: {e}")
+        return None
+    if data.get('version') != SHARD_PLAN_VERSION or data.get('shards') != count:
+        print(f"⚠️ 分片计划与分片数 {count} 不匹配，忽略: {path}")
+        return None
+    return data.get('assignments', {})
+
+
+def read_result_file(path: str) -> Dict[str, str]:
+    """
+    读取 sync-result.env
+
+    值中的 \\n 保持转义形式，与写入时一致
+    """
+    values: Dict[str, str] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            key, sep, value = line.rstrip('\n').partition('=')
+            if not sep:
+                continue
+            if len(value) >= 2 and value[0] == value[-1] == '"':
+                value = value[1:-1]
+            values[key] = value
+    return values
+
+
+def split_list(value: str) -> List[str]:
+    """拆分结果文件中以 \\n 连接的镜像列表"""
+    return [item for item in value.split('\\n') if item]
@@ -58,7 +58,7 @@ echo "✅ 拉取成功"
 # 生成目标镜像名
 platform_prefix=""
 if [ -n "$platform_param" ]; then
-    platform_prefix="${platform_prefix//\//_}_"
+    platform_prefix="${platform_param//\//_}_"
 fi
 
 # 获取镜像基本信息（使用拉取的镜像名称，确保包含标签）
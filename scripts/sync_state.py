@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+持久化同步状态
+记录每个源镜像上次同步的摘要和时间，可通过 Actions 缓存在多次运行之间保留
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+DEFAULT_STATE_FILE = '.sync-state/state.json'
+# 工作流定时运行的间隔（docker.yaml 的 cron 为每天一次）
+SCHEDULE_INTERVAL_HOURS = 24
+# 每隔几次定时运行重新检查一次源镜像。有效期内跳过的镜像不刷新 checked_at，
+# 所以检查后的下一次运行跳过、再下一次重新检查：latest 等会移动的标签最晚约 48 小时后同步。
+# 需要每次运行都检查时用 --state-ttl 指定小于运行间隔的有效期（例如 12），或使用 --force
+REVALIDATE_EVERY_RUNS = 2
+STATE_VERSION = 1
+
+
+def state_ttl_hours(revalidate_every_runs: int, interval_hours: float = SCHEDULE_INTERVAL_HOURS) -> float:
+    """
+    每 revalidate_every_runs 次定时运行检查一次所需的有效期
+
+    有效期取第 N-1 次和第 N 次运行之间的中点：两次运行的时间差偏离整数个间隔
+    不超过半个间隔（排队、运行时间的波动）时，检查的频率不变
+    """
+    return interval_hours * (max(1, revalidate_every_runs) - 0.5)
+
+
+DEFAULT_STATE_TTL_HOURS = state_ttl_hours(REVALIDATE_EVERY_RUNS)
+
+
+class SyncState:
+    """
+    同步状态存储
+
+    以 "源镜像引用|平台" 为键，记录:
+      target           目标镜像（仓库名:标签）
+      source_digest    源标签指向的摘要（可能是清单列表）
+      platform_digest  对应平台的清单摘要，即目标标签应指向的摘要
+      target_digest    上次确认的目标摘要（重新压缩镜像层时与 platform_digest 不同）
+      compression      重新压缩镜像层的格式，原样复制时不记录
+      synced_at        上次实际复制的时间
+      checked_at       上次确认目标为最新的时间
+
+    另外在 sizes 中记录每个源镜像的压缩后总大小，用于分片时估算传输量
+    """
+
+    def __init__(self, path: str = DEFAULT_STATE_FILE, ttl_hours: float = DEFAULT_STATE_TTL_HOURS):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(source_ref: str, platform: Optional[str] = None) -> str:
+        return f"{source_ref}|{platform or ''}"
+
+    @staticmethod
+    def _read(path: str) -> Optional[Dict[str, Any]]:
+        """读取状态文件，版本不匹配或损坏时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取同步状态失败: {e}")
+            return None
+        if data.get('version') != STATE_VERSION:
+            print(f"⚠️ 同步状态文件版本不匹配，忽略: {path}")
+            return None
+        return data
+
+    def load(self) -> None:
+        """加载状态文件，文件不存在或损坏时从空状态开始"""
+        if not os.path.exists(self.path):
+            print(f"ℹ️ 未找到同步状态文件，将从空状态开始: {self.path}")
+            return
+        data = self._read(self.path)
+        if data is None:
+            print("⚠️ 将从空状态开始")
+            return
+        self.entries = data.get('entries', {})
+        self.sizes = data.get('sizes', {})
+        print(f"✅ 加载同步状态: {len(self.entries)} 条记录 ({self.path})")
+
+    def merge(self, path: str) -> None:
+        """合并另一个状态文件（例如其他分片的状态），同一镜像保留较新的记录"""
+        data = self._read(path)
+        if data is None:
+            return
+        with self._lock:
+            for key, entry in data.get('entries', {}).items():
+                current = self.entries.get(key)
+                if not current or entry.get('checked_at', 0) >= current.get('checked_at', 0):
+                    self.entries[key] = entry
+            self.sizes.update(data.get('sizes', {}))
+
+    def save(self) -> None:
+        """保存状态文件（先写临时文件再替换，避免中途中断导致文件损坏）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with self._lock:
+            data = {'version': STATE_VERSION, 'entries': self.entries, 'sizes': self.sizes}
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'), sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    def get_size(self, key: str) -> Optional[int]:
+        return self.sizes.get(key)
+
+    def record_size(self, key: str, size: int) -> None:
+        """记录源镜像的压缩后总大小"""
+        with self._lock:
+            self.sizes[key] = size
+
+    def is_fresh(self, key: str, target: str, compression: Optional[str] = None) -> bool:
+        """记录在有效期内且目标和压缩格式未变化时，无需任何网络请求即可跳过"""
+        entry = self.entries.get(key)
+        if not entry or entry.get('target') != target or entry.get('compression') != compression:
+            return False
+        return time.time() - entry.get('checked_at', 0) < self.ttl_seconds
+
+    def record(self, key: str, target: str, source_digest: Optional[str] = None,
+               platform_digest: Optional[str] = None, target_digest: Optional[str] = None,
+               synced: bool = False, compression: Optional[str] = None) -> None:
+        """记录一次成功的检查或同步"""
+        now = int(time.time())
+        with self._lock:
+            entry = self.entries.get(key, {})
+            if entry.get('target') != target:
+                entry = {}
+            entry['target'] = target
+            for field, value in (('source_digest', source_digest),
+                                 ('platform_digest', platform_digest),
+                                 ('target_digest', target_digest)):
+                if value:
+                    entry[field] = value
+            if compression:
+                entry['compression'] = compression
+            else:
+                entry.pop('compression', None)
+            entry['checked_at'] = now
+            if synced:
+                entry['synced_at'] = now
+            self.entries[key] = entry
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+标签选择器
+配置中的镜像可以用 glob、semver 范围或正则（可取最新 N 个）选择一组标签，
+同步时从源仓库的分页标签列表展开；标签列表按页缓存 ETag，下次运行用条件请求，
+未变化时不再传输列表内容
+"""
+
+import fnmatch
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
+
+DEFAULT_TAG_CACHE_FILE = '.sync-state/tags-cache.json'
+# 单个选择器最多展开的标签数，超出时保留最新的部分，避免 "*" 之类的选择器复制整个仓库
+MAX_EXPANDED_TAGS = 50
+# 缓存中超过该时间未使用的标签列表会被清理
+TAG_CACHE_MAX_AGE_DAYS = 30
+TAG_CACHE_VERSION = 1
+
+_GLOB_CHARS = set('*?[')
+_VERSION = re.compile(r'^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?$')
+_COMPARATOR = re.compile(r'^(>=|<=|>|<|=|\^|~)?\s*v?(\*|x|\d+)(?:\.(\*|x|\d+))?(?:\.(\*|x|\d+))?$', re.IGNORECASE)
+
+Version = Tuple[int, int, int]
+
+
+def is_glob(tag: str) -> bool:
+    """标签中包含 glob 通配符（合法的标签不会包含这些字符）"""
+    return bool(_GLOB_CHARS & set(tag))
+
+
+def parse_version(tag: str, suffix: str = '') -> Optional[Version]:
+    """
+    把标签解析为版本号，缺少的部分补 0
+
+    指定 suffix 时标签必须以它结尾（例如 1.25.3-alpine），否则带后缀的标签不是版本号
+    """
+    if suffix:
+        if not tag.endswith(suffix):
+            return None
+        tag = tag[:-len(suffix)]
+    match = _VERSION.match(tag)
+    if not match:
+        return None
+    return tuple(int(part or 0) for part in match.groups())
+
+
+def _version_key(tag: str, suffix: str = '') -> Tuple:
+    """排序键：能解析为版本号的按版本号，其余按数字分段的自然顺序，排在版本号之前"""
+    version = parse_version(tag, suffix)
+    natural = tuple((0, int(part), '') if part.isdigit() else (1, 0, part)
+                    for part in re.split(r'(\d+)', tag) if part)
+    return (1, version, natural) if version else (0, (0, 0, 0), natural)
+
+
+def _parse_range(spec: str) -> List[List[Tuple[str, Version]]]:
+    """
+    解析 semver 范围
+
+    支持 >=1.2 <2、^1.2.3、~1.2、1.2.x、1.x、*，以及用 || 连接的多个范围；
+    只写部分版本号（1.2）等价于 1.2.x
+
+    Returns:
+        OR 连接的条件组，每组内的 (运算符, 版本) 条件同时满足
+    """
+    groups = []
+    for group in spec.split('||'):
+        # 允许运算符和版本号之间有空格（>= 1.2）
+        tokens = re.sub(r'(>=|<=|>|<|=|\^|~)\s+', r'\1', group.replace(',', ' ')).split()
+        conditions: List[Tuple[str, Version]] = []
+        for token in tokens:
+            match = _COMPARATOR.match(token)
+            if not match:
+                raise ValueError(f"无效的 semver 条件: {token}")
+            operator = match.group(1) or ''
+            parts = list(match.groups()[1:])
+            wildcard = next((i for i, part in enumerate(parts) if part is None or part.lower() in ('*', 'x')), 3)
+            numbers = [int(part) for part in parts[:wildcard]]
+            base = tuple(numbers + [0] * (3 - len(numbers)))
+            if wildcard == 0:
+                continue
+            if operator in ('', '=') and wildcard < 3:
+                upper = numbers[:wildcard]
+                upper[-1] += 1
+                conditions += [('>=', base), ('<', tuple(upper + [0] * (3 - len(upper))))]
+            elif operator == '^':
+                position = next((i for i, number in enumerate(numbers) if number), min(len(numbers), 3) - 1)
+                upper = numbers[:position + 1]
+                upper[-1] += 1
+                conditions += [('>=', base), ('<', tuple(upper + [0] * (3 - len(upper))))]
+            elif operator == '~':
+                upper = numbers[:2] if len(numbers) >= 2 else numbers[:1]
+                upper[-1] += 1
+                conditions += [('>=', base), ('<', tuple(upper + [0] * (3 - len(upper))))]
+            else:
+                conditions.append((operator or '=', base))
+        groups.append(conditions)
+    return groups
+
+
+def _satisfies(version: Version, groups: List[List[Tuple[str, Version]]]) -> bool:
+    checks = {
+        '>=': lambda a, b: a >= b, '<=': lambda a, b: a <= b,
+        '>': lambda a, b: a > b, '<': lambda a, b: a < b, '=': lambda a, b: a == b,
+    }
+    return any(all(checks[operator](version, bound) for operator, bound in group) for group in groups)
+
+
+@dataclass(frozen=True)
+class TagSelector:
+    """
+    标签选择器
+
+    glob / semver / regex 三选一；newest 只保留按版本排序最新的 N 个；
+    suffix 用于 semver 匹配带变体后缀的标签（例如 -alpine）
+    """
+    glob: Optional[str] = None
+    semver: Optional[str] = None
+    regex: Optional[str] = None
+    newest: Optional[int] = None
+    suffix: str = ''
+
+    def describe(self) -> str:
+        """选择器的文本形式，用作配置项的标签显示和去重"""
+        if self.glob:
+            text = self.glob
+        elif self.semver:
+            text = f"semver({self.semver}{', ' + self.suffix if self.suffix else ''})"
+        else:
+            text = f"regex({self.regex})"
+        return f"{text}[newest={self.newest}]" if self.newest else text
+
+    def select(self, tags: List[str]) -> List[str]:
+        """从标签列表中选出匹配的标签，按版本从新到旧排列"""
+        if self.glob:
+            matched = [tag for tag in tags if fnmatch.fnmatchcase(tag, self.glob)]
+        elif self.semver:
+            groups = _parse_range(self.semver)
+            matched = [tag for tag in tags
+                       if parse_version(tag, self.suffix) and _satisfies(parse_version(tag, self.suffix), groups)]
+        else:
+            pattern = re.compile(self.regex)
+            matched = [tag for tag in tags if pattern.search(tag)]
+        matched.sort(key=lambda tag: _version_key(tag, self.suffix), reverse=True)
+        return matched[:self.newest] if self.newest else matched
+
+
+def parse_selector(value: Any) -> TagSelector:
+    """
+    解析配置中的选择器
+
+    字符串按 glob 处理；对象形式为
+    {"glob": "1.25.*"}、{"semver": ">=1.24 <2", "suffix": "-alpine"} 或 {"regex": "^3\\\\.\\\\d+$", "newest": 3}
+
+    Raises:
+        ValueError: 格式错误
+    """
+    if isinstance(value, str):
+        value = {'glob': value}
+    if not isinstance(value, dict):
+        raise ValueError(f"tags 必须是字符串或对象，实际为 {type(value).__name__}")
+    unknown = set(value) - {'glob', 'semver', 'regex', 'newest', 'suffix'}
+    if unknown:
+        raise ValueError(f"tags 中有不支持的字段: {', '.join(sorted(unknown))}")
+    kinds = [key for key in ('glob', 'semver', 'regex') if value.get(key)]
+    if len(kinds) != 1:
+        raise ValueError("tags 必须且只能指定 glob、semver、regex 之一")
+    newest = value.get('newest')
+    if newest is not None and (not isinstance(newest, int) or isinstance(newest, bool) or newest < 1):
+        raise ValueError(f"newest 必须是正整数: {newest!r}")
+    selector = TagSelector(glob=value.get('glob'), semver=value.get('semver'), regex=value.get('regex'),
+                           newest=newest, suffix=str(value.get('suffix') or ''))
+    try:
+        if selector.semver:
+            _parse_range(selector.semver)
+        if selector.regex:
+            re.compile(selector.regex)
+    except re.error as e:
+        raise ValueError(f"正则表达式错误: {e}") from e
+    return selector
+
+
+class TagListCache:
+    """
+    标签列表缓存
+
+    按 (仓库地址, 分页URL) 保存每一页的 ETag、标签和下一页地址，
+    随同步状态目录一起在运行之间保留
+    """
+
+    def __init__(self, path: str = DEFAULT_TAG_CACHE_FILE, max_age_days: float = TAG_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age_seconds = max_age_days * 86400
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(registry: str, path: str) -> str:
+        return f"{registry}{path}"
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取标签缓存失败，忽略: {e}")
+            return
+        if data.get('version') == TAG_CACHE_VERSION:
+            self.pages = data.get('pages', {})
+
+    def get(self, registry: str, path: str) -> Optional[Dict[str, Any]]:
+        return self.pages.get(self._key(registry, path))
+
+    def put(self, registry: str, path: str, etag: Optional[str], tags: List[str], next_path: Optional[str]) -> None:
+        self.misses += 1
+        if etag:
+            self.pages[self._key(registry, path)] = {
+                'etag': etag, 'tags': tags, 'next': next_path, 'used_at': int(time.time())
+            }
+
+    def hit(self, registry: str, path: str) -> Dict[str, Any]:
+        """源仓库返回 304，使用缓存的页面"""
+        self.hits += 1
+        page = self.pages[self._key(registry, path)]
+        page['used_at'] = int(time.time())
+        return page
+
+    def save(self) -> None:
+        """保存缓存，清理长期未使用的页面"""
+        cutoff = time.time() - self.max_age_seconds
+        self.pages = {key: page for key, page in self.pages.items() if page.get('used_at', 0) >= cutoff}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': TAG_CACHE_VERSION, 'pages': self.pages}, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
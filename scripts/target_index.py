@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+目标仓库状态索引
+同步开始前一次性并行查询目标仓库的标签和摘要，之后的存在性检查都在内存中完成
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Set, Tuple
+
+from registry_client import RegistryClient, RegistryError
+
+
+class TargetIndex:
+    """目标仓库状态索引"""
+
+    def __init__(self, client: RegistryClient, jobs: int = 8):
+        self.client = client
+        self.jobs = max(1, jobs)
+        # 仓库名 -> 标签集合；查询失败的仓库不在索引中，由调用方回退到逐个检查
+        self._tags: Dict[str, Set[str]] = {}
+        self._digests: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def covers(self, repository: str) -> bool:
+        """索引中是否包含该仓库的状态"""
+        return repository in self._tags
+
+    def exists(self, repository: str, tag: str) -> bool:
+        """目标标签是否存在"""
+        return tag in self._tags.get(repository, set())
+
+    def digest(self, repository: str, tag: str) -> Optional[str]:
+        """目标标签当前指向的摘要，未知时返回None"""
+        return self._digests.get((repository, tag))
+
+    def update(self, repository: str, tag: str, digest: Optional[str] = None) -> None:
+        """同步成功后更新索引"""
+        with self._lock:
+            self._tags.setdefault(repository, set()).add(tag)
+            if digest:
+                self._digests[(repository, tag)] = digest
+
+    def _load_tags(self, repository: str) -> None:
+        try:
+            tags = self.client.list_tags(repository)
+        except RegistryError as e:
+            print(f"⚠️ 无法列出目标仓库标签，将逐个检查: {repository} ({e})")
+            return
+        with self._lock:
+            self._tags[repository] = set(tags or [])
+
+    def _load_digest(self, repository: str, tag: str) -> None:
+        try:
+            head = self.client.head_manifest(repository, tag)
+        except RegistryError as e:
+            print(f"⚠️ 查询目标摘要失败: {repository}:{tag} ({e})")
+            return
+        with self._lock:
+            if head:
+                self._digests[(repository, tag)] = head[0]
+            else:
+                self._tags.get(repository, set()).discard(tag)
+
+    def build(self, targets: List[Tuple[str, str]], with_digests: bool = True,
+              presence_only: Optional[Set[Tuple[str, str]]] = None) -> None:
+        """
+        构建索引
+
+        Args:
+            targets: 需要查询的 (目标仓库名, 标签) 列表
+            with_digests: 是否同时查询已存在标签的摘要（摘要比较模式需要）
+            presence_only: 只需要判断是否存在、不查询摘要的目标（例如标签选择器展开的标签）
+        """
+        repositories = sorted({repository for repository, _ in targets})
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            list(executor.map(self._load_tags, repositories))
+
+            if with_digests:
+                existing = sorted({(r, t) for r, t in targets
+                                   if self.exists(r, t) and (r, t) not in (presence_only or set())})
+                list(executor.map(lambda target: self._load_digest(*target), existing))
+
+        covered = sum(1 for repository in repositories if self.covers(repository))
+        found = sum(1 for repository, tag in set(targets) if self.exists(repository, tag))
+        print(f"📇 目标仓库索引: {covered}/{len(repositories)} 个仓库, {found} 个标签已存在")
@@ -9,8 +9,43 @@ import sys
 import os
 import subprocess
 import argparse
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+from dataclasses import dataclass, replace
+
+from registry_client import RegistryError, parse_image_reference
+from rate_limit import set_pacing_deadline
+from image_copier import ImageCopier, CopyResult, is_multi_platform
+from blob_planner import BlobPlanner, PlannedImage
+from target_index import TargetIndex
+from sync_state import SyncState, DEFAULT_STATE_FILE, DEFAULT_STATE_TTL_HOURS, REVALIDATE_EVERY_RUNS
+from sync_scheduler import (SyncScheduler, parse_registry_limits, parse_disk_budget,
+                            DEFAULT_TARGET_LIMIT, DEFAULT_DISK_PATH)
+from process_runner import run_streaming, print_tail
+from sync_metrics import ImageMetrics, MetricsRegistry, PhaseTracker, write_reports, report_paths
+from image_config import (ImageConfig, ConfigError, detect_config_file, load_images, report, normalize_reference,
+                          split_reference, target_name)
+from tag_selector import TagListCache, MAX_EXPANDED_TAGS, DEFAULT_TAG_CACHE_FILE
+from blob_cache import BlobCache, DEFAULT_BLOB_CACHE_GB
+from layer_compression import LayerMap, DEFAULT_LAYER_MAP_FILE, zstd_available
+from sync_checkpoint import (SyncCheckpoint, TimeBudget, DEFAULT_CHECKPOINT_FILE,
+                             DEFAULT_BUDGET_RESERVE_MINUTES)
+from retry_policy import (classify, classify_output, retry_delay, retry_budget, set_retry_budget,
+                          DEFAULT_RETRY_BUDGET)
+from sync_shards import (parse_shard, fill_unknown_sizes, partition, fallback_shard, shard_totals,
+                         save_plan, load_plan, read_result_file, split_list, DEFAULT_SHARD_PLAN_FILE)
+
+# sync_single_image.sh 输出的步骤标记 -> 阶段（tag 计入 push）
+DOCKER_SYNC_PHASES = [
+    ('🔄 docker pull', 'pull'),
+    ('🏷️', 'push'),
+    ('🧹', 'cleanup'),
+    ('🎉', None),
+]
+
+# docker pull 下载压缩层后解压存储，磁盘占用按压缩后大小的倍数估算
+DISK_EXPANSION_FACTOR = 2.5
 
 @dataclass
 class SyncResult:
@@ -20,128 +55,124 @@ class SyncResult:
     failed_count: int = 0
     success_images: List[str] = None
     failed_images: List[str] = None
+    # 因时间预算留待下次运行的镜像
+    pending_count: int = 0
+    pending_images: List[str] = None
+    # 每个镜像的阶段耗时和传输统计，与配置顺序一致
+    image_metrics: List[ImageMetrics] = None
+    duration_seconds: float = 0.0
 
     def __post_init__(self):
         if self.success_images is None:
             self.success_images = []
         if self.failed_images is None:
             self.failed_images = []
+        if self.pending_images is None:
+            self.pending_images = []
+        if self.image_metrics is None:
+            self.image_metrics = []
 
 class UnifiedImageSync:
     """统一镜像同步处理器"""
 
-    def __init__(self, config_file: str = None):
-        self.config_file = config_file or self._detect_config_file()
-
-    def _detect_config_file(self) -> str:
-        """自动检测配置文件"""
-        if os.path.exists("images.json"):
-            return "images.json"
-        elif os.path.exists("images.txt"):
-            return "images.txt"
-        else:
-            raise FileNotFoundError("未找到配置文件 (images.json 或 images.txt)")
-
-    def _load_json_config(self, config_file: str) -> List[Dict[str, Any]]:
-        """加载JSON配置"""
-        with open(config_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        images = []
-        for img_data in data.get('images', []):
-            # 支持两种JSON格式
-            if 'source' in img_data:
-                repo = img_data['source'].get('repository', '')
-                tag = img_data['source'].get('tag', 'latest')
-                platform = img_data.get('platform') or img_data.get('options', {}).get('platform')
-            else:
-                repo = img_data.get('name', '')
-                tag = img_data.get('tag', 'latest')
-                platform = img_data.get('platform')
-
-            if repo:
-                images.append({
-                    'repository': repo,
-                    'tag': tag,
-                    'platform': platform,
-                    'description': img_data.get('description', '')
-                })
-
-        return images
-
-    def _load_text_config(self, config_file: str) -> List[Dict[str, Any]]:
-        """加载文本配置"""
-        images = []
-        with open(config_file, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-
-                # 解析平台参数
-                platform = None
-                if '--platform=' in line:
-                    parts = line.split()
-                    for part in parts:
-                        if part.startswith('--platform='):
-                            platform = part.split('=', 1)[1]
-                        elif not part.startswith('--platform') and ':' in part and '/' not in part.split(':')[-1]:
-                            # 这是镜像名称部分
-                            repo_tag = part
-                            break
-                    else:
-                        # 如果没找到，取最后一个部分
-                        repo_tag = parts[-1]
-                elif '--platform' in line and '=' in line:
-                    # 处理 --platform linux/amd64 nginx:latest 格式
-                    parts = line.split()
-                    platform_idx = -1
-                    for i, part in enumerate(parts):
-                        if part == '--platform':
-                            platform = parts[i + 1]
-                            platform_idx = i
-                            break
-
-                    # 取最后一个非参数部分作为镜像名
-                    repo_tag = parts[-1] if platform_idx != len(parts) - 2 else parts[-1]
-                else:
-                    repo_tag = line
-
-                # 解析repository和tag
-                if ':' in repo_tag:
-                    repo, tag = repo_tag.rsplit(':', 1)
-                else:
-                    repo, tag = repo_tag, 'latest'
-
-                images.append({
-                    'repository': repo,
-                    'tag': tag,
-                    'platform': platform,
-                    'description': f'从{config_file}第{line_num}行加载'
-                })
-
-        return images
-
-    def load_config(self) -> List[Dict[str, Any]]:
-        """加载配置文件"""
+    def __init__(self, config_file: str = None, engine: str = 'registry', state: Optional[SyncState] = None,
+                 budget: Optional[TimeBudget] = None, checkpoint: Optional[SyncCheckpoint] = None,
+                 shard: Optional[Tuple[int, int]] = None, shard_plan: str = DEFAULT_SHARD_PLAN_FILE,
+                 tag_cache: Optional[TagListCache] = None, blob_cache: Optional[BlobCache] = None,
+                 layer_map: Optional[LayerMap] = None):
+        self.config_file = config_file or detect_config_file()
+        self.engine = engine
+        self.state = state
+        self.budget = budget
+        self.checkpoint = checkpoint
+        self.shard = shard
+        self.shard_plan = shard_plan
+        self.tag_cache = tag_cache
+        self.blob_cache = blob_cache
+        self.layer_map = layer_map
+        # 镜像规格 -> 重新压缩镜像层的格式（配置了 compression 的镜像）
+        self._compressions: Dict[str, str] = {}
+        self._copier: Optional[ImageCopier] = None
+        self._copier_lock = threading.Lock()
+        self._target_index: Optional[TargetIndex] = None
+        self.metrics = MetricsRegistry()
+
+    def load_config(self) -> List[ImageConfig]:
+        """加载配置文件（已校验、去重）"""
         try:
-            if self.config_file.endswith('.json'):
-                images = self._load_json_config(self.config_file)
-            else:
-                images = self._load_text_config(self.config_file)
-
-            print(f"✅ 成功加载 {len(images)} 个镜像配置 ({self.config_file})")
-            return images
-
-        except Exception as e:
+            loaded = load_images(self.config_file)
+        except (ConfigError, OSError) as e:
             print(f"❌ 加载配置失败: {e}")
             return []
+        report(loaded, self.config_file)
+        return loaded.images
+
+    def expand_tag_selectors(self, images: List[ImageConfig], scheduler: SyncScheduler) -> List[ImageConfig]:
+        """
+        把标签选择器展开为具体标签
+
+        每个源仓库只列一次标签（带 ETag 缓存的分页请求）；展开的标签与配置中
+        已有的同一镜像重复、或与其他配置推送到同一目标镜像时跳过。无法列出标签的选择器
+        原样保留（tag_selector 不为空），由调用方计为失败
+        """
+        selectors = [image for image in images if image.tag_selector]
+        if not selectors:
+            return images
 
-    def _build_image_spec(self, image: Dict[str, Any]) -> str:
+        repositories = sorted({image.repository for image in selectors})
+        print(f"🏷️ 列出 {len(repositories)} 个源仓库的标签以展开 {len(selectors)} 个标签选择器...")
+
+        def list_tags(repository: str) -> Optional[List[str]]:
+            try:
+                tags = self._get_copier().source_tags(parse_image_reference(repository), self.tag_cache)
+            except RegistryError as e:
+                print(f"❌ 列出标签失败: {repository} ({e})")
+                return None
+            if tags is None:
+                print(f"❌ 源仓库不存在: {repository}")
+            return tags
+
+        listed = dict(zip(repositories, scheduler.run(
+            repositories, registry_of=lambda repository: parse_image_reference(repository).registry,
+            worker=list_tags, pushes=False)))
+        if self.tag_cache:
+            self.tag_cache.save()
+            print(f"🗂️ 标签列表缓存: {self.tag_cache.hits} 页未变化, {self.tag_cache.misses} 页重新获取")
+
+        seen = {image.key for image in images if not image.tag_selector}
+        targets = {image.target for image in images if not image.tag_selector}
+        expanded: List[ImageConfig] = []
+        for image in images:
+            if not image.tag_selector:
+                expanded.append(image)
+                continue
+            tags = listed.get(image.repository)
+            if tags is None:
+                expanded.append(image)
+                continue
+            selected = image.tag_selector.select(tags)
+            if len(selected) > MAX_EXPANDED_TAGS:
+                print(f"⚠️ {image.repository}:{image.tag} 匹配 {len(selected)} 个标签，只保留最新的 {MAX_EXPANDED_TAGS} 个")
+                selected = selected[:MAX_EXPANDED_TAGS]
+            print(f"🏷️ {image.repository}:{image.tag} -> {', '.join(selected) or '无匹配标签'}")
+            for tag in selected:
+                concrete = replace(image, tag=tag, tag_selector=None, expanded=True, id=f"{image.id}:{tag}",
+                                   reference=normalize_reference(image.repository, tag))
+                if concrete.key in seen:
+                    continue
+                if concrete.target in targets:
+                    print(f"⏭️ 跳过 {image.repository}:{tag}：目标 {':'.join(concrete.target)} 已由其他配置使用")
+                    continue
+                seen.add(concrete.key)
+                targets.add(concrete.target)
+                expanded.append(concrete)
+        return expanded
+
+    def _build_image_spec(self, image: ImageConfig) -> str:
         """构建镜像规格字符串"""
-        repo = image['repository']
-        tag = image['tag']
-        platform = image.get('platform')
+        repo = image.repository
+        tag = image.tag
+        platform = image.platform
 
         if tag != 'latest':
             full_name = f"{repo}:{tag}"
@@ -152,23 +183,93 @@ class UnifiedImageSync:
             return f"--platform={platform} {full_name}"
         return full_name
 
-    def check_image_exists(self, image_spec: str) -> bool:
-        """检查镜像是否在目标仓库存在"""
-        # 解析镜像规格
-        if '--platform=' in image_spec:
-            parts = image_spec.split()
-            image_name = parts[-1]
-        else:
-            image_name = image_spec
+    def _parse_image_spec(self, image_spec: str) -> Tuple[str, Optional[str]]:
+        """解析镜像规格字符串，返回 (镜像名, 平台)"""
+        platform = None
+        parts = image_spec.split()
+        for i, part in enumerate(parts):
+            if part.startswith('--platform='):
+                platform = part.split('=', 1)[1]
+            elif part == '--platform' and i + 1 < len(parts):
+                platform = parts[i + 1]
+        return parts[-1], platform
+
+    def _target_name(self, image_name: str, platform: Optional[str] = None) -> Tuple[str, str]:
+        """生成目标仓库中的镜像名和标签，参见 image_config.target_name"""
+        return target_name(*split_reference(image_name), platform)
+
+    def _target_ref(self, image_spec: str) -> Tuple[str, str]:
+        """目标仓库中的 (仓库名, 标签)，仓库名包含命名空间"""
+        image_name, platform = self._parse_image_spec(image_spec)
+        name, tag = self._target_name(image_name, platform)
+        return f"{os.getenv('ALIYUN_NAME_SPACE')}/{name}", tag
+
+    def _state_key(self, image_spec: str) -> str:
+        """同步状态中的记录键"""
+        image_name, platform = self._parse_image_spec(image_spec)
+        return SyncState.key(str(parse_image_reference(image_name)), platform)
+
+    def _record_state(self, image_spec: str, synced: bool = False, **digests) -> None:
+        """记录镜像已确认为最新"""
+        if self.state:
+            repository, tag = self._target_ref(image_spec)
+            self.state.record(self._state_key(image_spec), f"{repository}:{tag}", synced=synced,
+                              compression=self._compression_of(image_spec), **digests)
+
+    def _compression_of(self, image_spec: str) -> Optional[str]:
+        """镜像推送时重新压缩镜像层的格式，未配置时为None"""
+        return self._compressions.get(image_spec)
+
+    def _set_compressions(self, images: List[ImageConfig]) -> None:
+        """记录配置了 compression 的镜像；docker 引擎或缺少 zstd 命令时按原格式同步"""
+        compressed = [image for image in images if image.compression]
+        if not compressed:
+            return
+        if self.engine == 'docker':
+            print(f"⚠️ docker 引擎推送时由守护进程压缩镜像层，忽略 {len(compressed)} 个镜像的 compression 选项")
+            return
+        if not zstd_available():
+            print(f"⚠️ 未找到 zstd 命令，{len(compressed)} 个镜像按原格式同步")
+            return
+        self._compressions = {self._build_image_spec(image): image.compression for image in compressed}
 
-        # 构建目标镜像名
-        if ':' not in image_name:
-            image_name += ':latest'
+    def _record_size(self, image_spec: str, size: int) -> None:
+        """记录源镜像大小，供下次分片时估算传输量"""
+        if self.state:
+            self.state.record_size(self._state_key(image_spec), size)
 
-        # 取镜像名部分（去掉registry前缀）
-        name_tag = image_name.split('/')[-1]
-        target_image = f"{os.getenv('ALIYUN_REGISTRY')}/{os.getenv('ALIYUN_NAME_SPACE')}/{name_tag}"
+    def _is_state_fresh(self, image_spec: str) -> bool:
+        """同步状态记录是否在有效期内"""
+        if not self.state:
+            return False
+        repository, tag = self._target_ref(image_spec)
+        return self.state.is_fresh(self._state_key(image_spec), f"{repository}:{tag}",
+                                   self._compression_of(image_spec))
+
+    def build_target_index(self, images: List[ImageConfig], with_digests: bool = True) -> None:
+        """
+        一次性查询所有目标仓库的状态
+
+        每个目标仓库只列一次标签（分页），已存在的标签再并行查询摘要，
+        之后的 check_image_exists / check_image_current 都在内存中完成
+        """
+        if not os.getenv('ALIYUN_REGISTRY') or not os.getenv('ALIYUN_NAME_SPACE'):
+            return
+
+        targets = [self._target_ref(self._build_image_spec(image)) for image in images]
+        # 选择器展开的标签（通常是不可变的版本标签）只需要判断是否存在
+        presence_only = {target for target, image in zip(targets, images) if image.expanded}
+        index = TargetIndex(self._get_copier().target)
+        index.build(targets, with_digests=with_digests, presence_only=presence_only)
+        self._target_index = index
+
+    def check_image_exists(self, image_spec: str) -> bool:
+        """检查镜像是否在目标仓库存在"""
+        repository, tag = self._target_ref(image_spec)
+        if self._target_index and self._target_index.covers(repository):
+            return self._target_index.exists(repository, tag)
 
+        target_image = f"{os.getenv('ALIYUN_REGISTRY')}/{repository}:{tag}"
         try:
             result = subprocess.run(
                 ['docker', 'manifest', 'inspect', target_image],
@@ -178,78 +279,483 @@ class UnifiedImageSync:
         except (subprocess.TimeoutExpired, subprocess.SubprocessError):
             return False
 
-    def sync_image(self, image_spec: str) -> bool:
-        """同步单个镜像"""
-        script_path = './scripts/sync_single_image.sh'
-        if not os.path.exists(script_path):
-            print(f"❌ 同步脚本不存在: {script_path}")
+    def check_image_current(self, image_spec: str) -> bool:
+        """
+        检查目标镜像是否与源镜像一致
+
+        比较目标标签的清单摘要与源镜像（对应平台）的清单摘要，
+        可以发现 latest 等会移动的标签在源仓库中的更新
+        """
+        if not os.getenv('ALIYUN_REGISTRY') or not os.getenv('ALIYUN_NAME_SPACE'):
             return False
 
+        image_name, platform = self._parse_image_spec(image_spec)
+        repository, tag = self._target_ref(image_spec)
+
+        entry = self.state.get(self._state_key(image_spec)) if self.state else None
+        known = (entry.get('source_digest'), entry.get('platform_digest')) if entry else None
+
         try:
-            result = subprocess.run(
-                [script_path, image_spec],
-                capture_output=True, text=True, timeout=600,  # 10分钟超时
-                check=False
-            )
-            if result.stdout:
-                print(result.stdout.rstrip())
-            if result.stderr:
-                print("⚠️ 同步脚本错误输出:")
-                print(result.stderr.rstrip())
-            if result.returncode != 0:
-                print(f"❌ 同步脚本退出码: {result.returncode}")
-            return result.returncode == 0
-        except subprocess.TimeoutExpired:
-            print(f"❌ 同步超时: {image_spec}")
+            copier = self._get_copier()
+            index = self._target_index
+            if index and index.covers(repository) and not index.exists(repository, tag):
+                target_digest = None
+            elif index and index.digest(repository, tag):
+                target_digest = index.digest(repository, tag)
+            else:
+                target_digest = copier.target_digest(repository, tag)
+            if target_digest is None:
+                print(f"🆕 目标仓库中不存在: {repository}:{tag}")
+                return False
+            tag_digest, source_digest = copier.resolve_digest(parse_image_reference(image_name), platform, known)
+        except RegistryError as e:
+            print(f"⚠️ 摘要检查失败，将重新同步: {e}")
             return False
-        except subprocess.SubprocessError as e:
-            print(f"❌ 同步错误: {e}")
+
+        compression = self._compression_of(image_spec)
+        if compression:
+            # 重新压缩后目标摘要与源不同：源未变化且目标仍是上次推送的压缩结果时为最新
+            current = bool(entry) and entry.get('compression') == compression and \
+                entry.get('platform_digest') == source_digest and entry.get('target_digest') == target_digest
+        else:
+            current = source_digest == target_digest
+        if current:
+            self._record_state(image_spec, source_digest=tag_digest, platform_digest=source_digest,
+                               target_digest=target_digest)
+            return True
+
+        print(f"🔁 源镜像已更新: {target_digest[:19]} -> {source_digest[:19]}")
+        return False
+
+    def sync_image(self, image_spec: str) -> bool:
+        """同步单个镜像"""
+        if self.engine == 'docker':
+            return self._sync_image_with_docker(image_spec)
+        return self._sync_image_with_registry(image_spec)
+
+    def _get_copier(self) -> ImageCopier:
+        """创建复制引擎，使用阿里云仓库凭证访问目标仓库"""
+        with self._copier_lock:
+            if self._copier is None:
+                # 只解析源镜像（例如生成分片计划）时可以不配置目标仓库
+                self._copier = ImageCopier(
+                    os.getenv('ALIYUN_REGISTRY', ''),
+                    os.getenv('ALIYUN_REGISTRY_USER'),
+                    os.getenv('ALIYUN_REGISTRY_PASSWORD'),
+                    blob_cache=self.blob_cache,
+                    layer_map=self.layer_map
+                )
+        return self._copier
+
+    def _sync_image_with_registry(self, image_spec: str) -> bool:
+        """通过 Distribution API 直接在仓库之间复制镜像"""
+        if not os.getenv('ALIYUN_REGISTRY') or not os.getenv('ALIYUN_NAME_SPACE'):
+            print("❌ 缺少阿里云镜像仓库环境变量: ALIYUN_REGISTRY, ALIYUN_NAME_SPACE")
             return False
 
-    def sync_images(self, smart_sync: bool = False, force_sync: bool = False) -> SyncResult:
-        """同步镜像"""
-        images = self.load_config()
-        if not images:
-            return SyncResult()
+        image_name, platform = self._parse_image_spec(image_spec)
+        target_repository, tag = self._target_ref(image_spec)
 
-        result = SyncResult(total_count=len(images))
+        try:
+            source_ref = parse_image_reference(image_name)
+            print(f"🔄 {source_ref} -> {os.getenv('ALIYUN_REGISTRY')}/{target_repository}:{tag}")
+            copier = self._get_copier()
+            with self.metrics.get(image_spec).phase('resolve'):
+                plan = copier.plan_image(source_ref, platform, self._compression_of(image_spec))
+            self._record_size(image_spec, plan.size)
+            copied = copier.push_plan(plan, target_repository, tag)
+            self._finish_copy(image_spec, copied)
+            return True
+        except RegistryError as e:
+            self.metrics.get(image_spec).error = classify(e)
+            print(f"❌ 同步错误（{classify(e)}）: {e}")
+            return False
 
-        print(f"🚀 开始同步 {'(智能模式)' if smart_sync else '(强制模式)'} {result.total_count} 个镜像...")
+    def _finish_copy(self, image_spec: str, copied: CopyResult) -> None:
+        """复制成功后更新目标索引、同步状态和指标"""
+        self.metrics.get(image_spec).add_copy(copied)
+        target_repository, tag = self._target_ref(image_spec)
+        if self._target_index:
+            self._target_index.update(target_repository, tag, copied.digest)
+        self._record_state(image_spec, synced=True, source_digest=copied.source_digest,
+                           platform_digest=copied.platform_digest or copied.digest, target_digest=copied.digest)
+        print(f"✅ 推送成功: {target_repository}:{tag} ({copied.digest or '未返回摘要'})")
+        print(f"   数据块: 上传 {copied.blobs_uploaded} 个 ({copied.bytes_uploaded} bytes), "
+              f"已存在 {copied.blobs_skipped} 个, 跨仓库挂载 {copied.blobs_mounted} 个"
+              + (f", 从本地缓存读取 {copied.bytes_from_cache} bytes" if copied.bytes_from_cache else ''))
+
+    def _sync_image_with_docker(self, image_spec: str) -> bool:
+        """通过Docker守护进程同步（pull / tag / push）"""
+        image_name, platform = self._parse_image_spec(image_spec)
+        if is_multi_platform(platform):
+            print("❌ docker 引擎不支持多架构复制，请使用 --engine registry")
+            return False
+
+        script_path = './scripts/sync_single_image.sh'
+        if not os.path.exists(script_path):
+            print(f"❌ 同步脚本不存在: {script_path}")
+            return False
 
-        for i, image in enumerate(images, 1):
+        metrics = self.metrics.get(image_spec)
+        attempts = 0
+        while True:
+            try:
+                # 输出实时转发，并发同步时以镜像名区分各自的日志；按脚本的步骤输出统计各阶段耗时
+                tracker = PhaseTracker(metrics, DOCKER_SYNC_PHASES)
+                try:
+                    result = run_streaming([script_path, image_spec], prefix=f"[{image_name}] ",
+                                           timeout=600, on_line=tracker)  # 10分钟超时
+                finally:
+                    tracker.finish()
+            except subprocess.TimeoutExpired:
+                # 超时不重试，避免再占用一个超时周期
+                metrics.error = 'timeout'
+                print(f"❌ 同步超时: {image_spec}")
+                return False
+            except (subprocess.SubprocessError, OSError) as e:
+                print(f"❌ 同步错误: {e}")
+                return False
+            if result.returncode == 0:
+                metrics.error = ''
+                return True
+
+            # 已拉取的层和已推送的层由 docker 缓存，重新执行脚本只会重做失败的步骤
+            kind = classify_output(result.tail)
+            delay = retry_delay(kind, attempts)
+            if delay is None:
+                metrics.error = kind
+                print(f"❌ 同步脚本退出码: {result.returncode}（{kind}）")
+                print_tail(result, "⚠️ 同步脚本输出")
+                return False
+            attempts += 1
+            metrics.retries += 1
+            print(f"⚠️ 同步失败（{kind}），{delay:.1f}s 后重试（第 {attempts} 次）: {image_spec}")
+            time.sleep(delay)
+
+    def _check_image(self, index: int, total: int, image: ImageConfig,
+                     smart_sync: bool, force_sync: bool) -> bool:
+        """
+        检查单个镜像是否可以跳过
+
+        Returns:
+            目标镜像已是最新时返回True
+        """
+        image_spec = self._build_image_spec(image)
+        print(f"📦 [{index}/{total}] 处理镜像: {image_spec}")
+        with self.metrics.get(image_spec).phase('check'):
+            return self._is_up_to_date(image, image_spec, smart_sync, force_sync)
+
+    def _is_up_to_date(self, image: ImageConfig, image_spec: str, smart_sync: bool, force_sync: bool) -> bool:
+        """状态记录在有效期内，或目标镜像与源一致（docker 引擎为已存在）时返回True"""
+        if smart_sync and not force_sync and self._is_state_fresh(image_spec):
+            print(f"⏩ 同步状态在有效期内，跳过: {image.repository}:{image.tag}")
+            return True
+
+        if smart_sync and not force_sync:
+            repository, _ = self._target_ref(image_spec)
+            # docker 引擎推送时会重新生成清单，摘要与源不一致，只能检查是否存在；
+            # 选择器展开的标签只同步目标仓库中缺少的，已在索引中的不再查询源摘要
+            presence_only = image.expanded and self._target_index and self._target_index.covers(repository)
+            if self.engine == 'docker' or presence_only:
+                up_to_date = self.check_image_exists(image_spec)
+                if up_to_date:
+                    self._record_state(image_spec)
+            else:
+                up_to_date = self.check_image_current(image_spec)
+            if up_to_date:
+                print(f"✅ 镜像已是最新，跳过: {image.repository}:{image.tag}")
+                return True
+        return False
+
+    def _process_image(self, index: int, total: int, image: ImageConfig,
+                       smart_sync: bool, force_sync: bool) -> str:
+        """
+        处理单个镜像
+
+        Returns:
+            'skipped' / 'success' / 'failed'，时间预算用完时为 'pending'
+        """
+        if self._budget_expired():
+            return 'pending'
+        if self._check_image(index, total, image, smart_sync, force_sync):
+            return 'skipped'
+
+        image_spec = self._build_image_spec(image)
+        print(f"🔄 同步镜像: {image_spec}")
+        if self.sync_image(image_spec):
+            if self.engine == 'docker':
+                self._record_state(image_spec, synced=True)
+            print(f"✅ 同步成功: {image.repository}:{image.tag}")
+            return 'success'
+        print(f"❌ 同步失败: {image.repository}:{image.tag}")
+        return 'failed'
+
+    def _budget_expired(self) -> bool:
+        """时间预算是否已用完，用完后不再开始新的镜像"""
+        return bool(self.budget and self.budget.expired())
+
+    @staticmethod
+    def _checkpoint_key(image: ImageConfig) -> str:
+        return SyncCheckpoint.key(*image.key)
+
+    def _source_registry(self, image: ImageConfig) -> str:
+        """镜像所属的源仓库地址，用于并发限制"""
+        return parse_image_reference(image.repository).registry
+
+    def _plan_image(self, image: ImageConfig) -> Optional[PlannedImage]:
+        """解析单个镜像的复制计划，失败时返回None"""
+        image_spec = self._build_image_spec(image)
+        image_name, platform = self._parse_image_spec(image_spec)
+        repository, tag = self._target_ref(image_spec)
+        try:
+            with self.metrics.get(image_spec).phase('resolve'):
+                plan = self._get_copier().plan_image(parse_image_reference(image_name), platform,
+                                                     self._compression_of(image_spec))
+        except RegistryError as e:
+            self.metrics.get(image_spec).error = classify(e)
+            print(f"❌ 解析清单失败（{classify(e)}）: {image_spec} ({e})")
+            return None
+        self._record_size(image_spec, plan.size)
+        return PlannedImage(plan, repository, tag, image.priority)
+
+    def _sync_planned(self, numbered: List[Tuple[int, ImageConfig]], smart_sync: bool,
+                      force_sync: bool, scheduler: SyncScheduler) -> List[str]:
+        """
+        批量规划同步（registry 引擎）
+
+        先检查全部镜像，再解析所有待同步镜像的清单，
+        整批去重后每个数据块只传输一次
+
+        Returns:
+            与 numbered 顺序一致的 'skipped' / 'success' / 'failed' / 'pending'
+        """
+        total = len(numbered)
+        checked = scheduler.run(
+            numbered,
+            registry_of=lambda entry: self._source_registry(entry[1]),
+            worker=lambda entry: 'pending' if self._budget_expired() else
+            self._check_image(entry[0], total, entry[1], smart_sync, force_sync),
+            pushes=False
+        )
+        statuses = ['pending' if status == 'pending' else 'skipped' if status else 'failed' for status in checked]
+        outdated = [entry for entry, status in zip(numbered, statuses) if status == 'failed']
+        if not outdated:
+            return statuses
+
+        if not os.getenv('ALIYUN_REGISTRY') or not os.getenv('ALIYUN_NAME_SPACE'):
+            print("❌ 缺少阿里云镜像仓库环境变量: ALIYUN_REGISTRY, ALIYUN_NAME_SPACE")
+            return statuses
+
+        def plan(entry: Tuple[int, ImageConfig]) -> Optional[PlannedImage]:
+            if self._budget_expired():
+                statuses[entry[0] - 1] = 'pending'
+                return None
+            return self._plan_image(entry[1])
+
+        print(f"🗺️ 解析 {len(outdated)} 个待同步镜像的清单...")
+        plans = scheduler.run(
+            outdated,
+            registry_of=lambda entry: self._source_registry(entry[1]),
+            worker=plan,
+            pushes=False
+        )
+        planned = [(entry, plan) for entry, plan in zip(outdated, plans) if plan]
+
+        def on_pushed(position: int, copied: CopyResult) -> None:
+            index, image = planned[position][0]
+            self._finish_copy(self._build_image_spec(image), copied)
+            statuses[index - 1] = 'success'
+
+        def on_deferred(position: int) -> None:
+            statuses[planned[position][0][0] - 1] = 'pending'
+
+        BlobPlanner(self._get_copier(), scheduler).execute(
+            [plan for _, plan in planned], on_pushed,
+            should_stop=self._budget_expired, on_deferred=on_deferred
+        )
+
+        for (index, image), _ in planned:
+            if statuses[index - 1] == 'failed':
+                print(f"❌ 同步失败: {image.repository}:{image.tag}")
+        return statuses
+
+    def estimate_sizes(self, images: List[ImageConfig], scheduler: SyncScheduler) -> Dict[str, int]:
+        """
+        预估每个镜像的传输大小（压缩后各层大小之和）
+
+        优先使用同步状态中记录的大小，其余镜像解析源清单获取；
+        解析失败的镜像按已知大小的中位数估算
+
+        Returns:
+            镜像键 -> 字节数
+        """
+        sizes: Dict[str, Optional[int]] = {}
+        unknown: List[ImageConfig] = []
+        for image in images:
+            size = self.state.get_size(self._state_key(self._build_image_spec(image))) if self.state else None
+            sizes[self._checkpoint_key(image)] = size
+            if size is None and not image.tag_selector:
+                unknown.append(image)
+
+        def resolve(image: ImageConfig) -> Optional[int]:
             image_spec = self._build_image_spec(image)
-            print(f"📦 [{i}/{result.total_count}] 处理镜像: {image_spec}")
+            image_name, platform = self._parse_image_spec(image_spec)
+            try:
+                size = self._get_copier().plan_image(parse_image_reference(image_name), platform).size
+            except RegistryError as e:
+                print(f"⚠️ 无法获取镜像大小，按估算值分片: {image_spec} ({e})")
+                return None
+            self._record_size(image_spec, size)
+            return size
+
+        if unknown:
+            print(f"📏 解析 {len(unknown)} 个镜像的清单以估算大小...")
+            resolved = scheduler.run(unknown, registry_of=self._source_registry, worker=resolve, pushes=False)
+            for image, size in zip(unknown, resolved):
+                sizes[self._checkpoint_key(image)] = size
+        return fill_unknown_sizes(sizes)
+
+    def estimate_footprints(self, images: List[ImageConfig], scheduler: SyncScheduler) -> Dict[str, int]:
+        """预估 docker 引擎同步每个镜像时的磁盘占用（字节），键同 estimate_sizes"""
+        sizes = self.estimate_sizes(images, scheduler)
+        footprints = {key: int(size * DISK_EXPANSION_FACTOR) for key, size in sizes.items()}
+        largest = max(footprints.values(), default=0)
+        print(f"💽 磁盘预算 {scheduler.disk_budget / 1024 ** 3:.1f} GB，"
+              f"单个镜像预估占用最大 {largest / 1024 ** 3:.2f} GB")
+        return footprints
+
+    def plan_shards(self, count: int, scheduler: SyncScheduler) -> Dict[str, int]:
+        """按预估大小均衡分片，并写入分片计划文件"""
+        images = self.expand_tag_selectors(self.load_config(), scheduler)
+        sizes = self.estimate_sizes(images, scheduler)
+        assignments = partition(sizes, count)
+        save_plan(self.shard_plan, self.config_file, count, sizes, assignments)
+        totals = shard_totals(assignments, sizes, count)
+        for shard in range(1, count + 1):
+            members = sum(1 for value in assignments.values() if value == shard)
+            print(f"🧩 分片 {shard}/{count}: {members} 个镜像, 约 {totals[shard - 1] / 1024 / 1024:.1f} MB")
+        print(f"💾 分片计划已保存: {self.shard_plan}")
+        return assignments
+
+    def _select_shard(self, images: List[ImageConfig], scheduler: SyncScheduler) -> List[ImageConfig]:
+        """
+        只保留当前分片的镜像
+
+        有分片计划文件时按计划分配，否则在本地按同样的规则计算；
+        计划中没有的镜像按键的哈希分配
+        """
+        index, count = self.shard
+        assignments = load_plan(self.shard_plan, count)
+        if assignments is None:
+            print(f"ℹ️ 未找到分片计划，在本地计算分片: {self.shard_plan}")
+            assignments = partition(self.estimate_sizes(images, scheduler), count)
+        selected = [image for image in images
+                    if assignments.get(self._checkpoint_key(image),
+                                       fallback_shard(self._checkpoint_key(image), count)) == index]
+        print(f"🧩 分片 {index}/{count}: {len(selected)}/{len(images)} 个镜像")
+        return selected
+
+    def sync_images(self, smart_sync: bool = False, force_sync: bool = False,
+                    scheduler: Optional[SyncScheduler] = None, plan_blobs: bool = True) -> SyncResult:
+        """
+        同步镜像
+
+        镜像按 priority 从小到大处理；检查点中已完成的镜像直接跳过
+
+        Args:
+            plan_blobs: registry 引擎下是否先规划整批数据块，共享数据块只传输一次
+        """
+        scheduler = scheduler or SyncScheduler()
+        images = self.expand_tag_selectors(self.load_config(), scheduler)
+        if not images:
+            return SyncResult()
+        images.sort(key=lambda image: image.priority)
 
-            should_sync = force_sync
+        if self.shard:
+            images = self._select_shard(images, scheduler)
+            if not images:
+                return SyncResult()
+        self._set_compressions(images)
 
-            if smart_sync and not should_sync:
-                if self.check_image_exists(image_spec):
-                    print(f"✅ 镜像已存在，跳过: {image['repository']}:{image['tag']}")
-                    result.success_count += 1
-                    continue
-                else:
-                    should_sync = True
-
-            if should_sync:
-                print(f"🔄 同步镜像: {image_spec}")
-                if self.sync_image(image_spec):
-                    result.success_count += 1
-                    result.success_images.append(f"✅ {image['repository']}:{image['tag']}")
-                    print(f"✅ 同步成功")
-                else:
-                    result.failed_count += 1
-                    result.failed_images.append(f"❌ {image['repository']}:{image['tag']}")
-                    print(f"❌ 同步失败")
+        result = SyncResult(total_count=len(images))
+        started = time.perf_counter()
+
+        print(f"🚀 开始同步 {'(智能模式)' if smart_sync else '(强制模式)'} {result.total_count} 个镜像"
+              f"（并发数: {scheduler.jobs}）...")
+        if scheduler.jobs > scheduler.target_limit:
+            print(f"ℹ️ 向目标仓库推送的任务最多同时执行 {scheduler.target_limit} 个（--target-limit），"
+                  f"检查和解析清单不受此限制")
+
+        done = self.checkpoint.finished if self.checkpoint else set()
+        # 未能展开的标签选择器计为失败，不参与同步
+        remaining = [image for image in images
+                     if self._checkpoint_key(image) not in done and not image.tag_selector]
+        if len(remaining) < len(images):
+            print(f"♻️ 跳过检查点中已完成的 {len(images) - len(remaining)} 个镜像")
+
+        if smart_sync and not force_sync:
+            # 状态有效期内的镜像直接跳过，无需查询；docker 引擎只需要存在性，不查询摘要
+            stale = [image for image in remaining if not self._is_state_fresh(self._build_image_spec(image))]
+            if stale:
+                self.build_target_index(stale, with_digests=self.engine != 'docker')
+
+        numbered = list(enumerate(remaining, 1))
+        if plan_blobs and self.engine == 'registry':
+            statuses = self._sync_planned(numbered, smart_sync, force_sync, scheduler)
+        else:
+            # 只有 docker 引擎会把镜像层写入本地磁盘
+            cost_of = None
+            if scheduler.disk_budget is not None and self.engine == 'docker':
+                footprints = self.estimate_footprints(remaining, scheduler)
+                cost_of = lambda entry: footprints[self._checkpoint_key(entry[1])]
+            statuses = scheduler.run(
+                numbered,
+                registry_of=lambda entry: self._source_registry(entry[1]),
+                worker=lambda entry: self._process_image(entry[0], len(numbered), entry[1],
+                                                         smart_sync, force_sync),
+                cost_of=cost_of
+            )
+        outcomes = iter(statuses)
+        statuses = ['skipped' if self._checkpoint_key(image) in done else
+                    'failed' if image.tag_selector else next(outcomes) for image in images]
+
+        for image, status in zip(images, statuses):
+            metrics = self.metrics.get(self._build_image_spec(image))
+            metrics.status = status or 'failed'
+            result.image_metrics.append(metrics)
+
+            name = f"{image.repository}:{image.tag}"
+            if status == 'skipped':
+                result.success_count += 1
+            elif status == 'success':
+                result.success_count += 1
+                result.success_images.append(f"✅ {name}")
+            elif status == 'pending':
+                result.pending_count += 1
+                result.pending_images.append(f"⏳ {name}")
+            else:
+                result.failed_count += 1
+                result.failed_images.append(f"❌ {name}")
+
+        if self.checkpoint:
+            keys = [self._checkpoint_key(image) for image in images]
+            self.checkpoint.update(
+                [key for key, status in zip(keys, statuses) if status in ('skipped', 'success')],
+                [key for key, status in zip(keys, statuses) if status == 'pending']
+            )
 
+        result.duration_seconds = round(time.perf_counter() - started, 3)
         return result
 
-    def save_results(self, result: SyncResult, output_file: str = "sync-result.env"):
+    @staticmethod
+    def save_results(result: SyncResult, output_file: str = "sync-result.env"):
         """保存结果到环境变量文件"""
         try:
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(f"TOTAL_COUNT={result.total_count}\n")
                 f.write(f"SUCCESS_COUNT={result.success_count}\n")
                 f.write(f"FAILED_COUNT={result.failed_count}\n")
+                f.write(f"PENDING_COUNT={result.pending_count}\n")
                 f.write(f"SYNC_COUNT={result.total_count}\n")
 
                 # 使用普通的环境变量格式，兼容bash source
@@ -264,16 +770,111 @@ class UnifiedImageSync:
                     f.write(f"FAILED_IMAGES=\"{failed_list}\"\n")
                 else:
                     f.write('FAILED_IMAGES=""\n')
+
+                if result.pending_images:
+                    pending_list = "\\n".join(result.pending_images)
+                    f.write(f"PENDING_IMAGES=\"{pending_list}\"\n")
+                else:
+                    f.write('PENDING_IMAGES=""\n')
         except Exception as e:
             print(f"❌ 保存结果失败: {e}")
 
+        # 同名的 .json 报告和 .prom 指标文件
+        write_reports(output_file, 'sync', result.image_metrics, {
+            'total': result.total_count,
+            'success': result.success_count,
+            'failed': result.failed_count,
+            'pending': result.pending_count,
+            'duration_seconds': result.duration_seconds,
+        })
+
+def merge_results(result_files: List[str]) -> SyncResult:
+    """
+    合并各分片的结果文件
+
+    计数相加、镜像列表按文件顺序拼接；同名的 .json 报告中的镜像指标一并合并，
+    总耗时取最慢的分片
+    """
+    merged = SyncResult()
+    for result_file in result_files:
+        values = read_result_file(result_file)
+        merged.total_count += int(values.get('TOTAL_COUNT') or 0)
+        merged.success_count += int(values.get('SUCCESS_COUNT') or 0)
+        merged.failed_count += int(values.get('FAILED_COUNT') or 0)
+        merged.pending_count += int(values.get('PENDING_COUNT') or 0)
+        merged.success_images.extend(split_list(values.get('SUCCESS_IMAGES', '')))
+        merged.failed_images.extend(split_list(values.get('FAILED_IMAGES', '')))
+        merged.pending_images.extend(split_list(values.get('PENDING_IMAGES', '')))
+
+        report_file = report_paths(result_file)[0]
+        if os.path.exists(report_file):
+            with open(report_file, 'r', encoding='utf-8') as f:
+                report_data = json.load(f)
+            merged.image_metrics.extend(ImageMetrics(**record) for record in report_data.get('images', []))
+            merged.duration_seconds = max(merged.duration_seconds,
+                                          report_data.get('summary', {}).get('duration_seconds', 0))
+        print(f"📥 合并结果: {result_file} ({values.get('TOTAL_COUNT', 0)} 个镜像)")
+    return merged
+
+def print_summary(result: SyncResult) -> None:
+    """打印同步统计"""
+    print("\n📊 同步完成统计:")
+    print(f"  📋 总数: {result.total_count}")
+    print(f"  ✅ 成功: {result.success_count}")
+    print(f"  ❌ 失败: {result.failed_count}")
+    if result.pending_count:
+        print(f"  ⏳ 待下次运行: {result.pending_count}")
+
 def main():
     parser = argparse.ArgumentParser(description='统一镜像同步处理器')
     parser.add_argument('-c', '--config', help='配置文件路径')
     parser.add_argument('-o', '--output', default='sync-result.env', help='输出结果文件')
     parser.add_argument('-f', '--force', action='store_true', help='强制同步所有镜像')
-    parser.add_argument('-s', '--smart', action='store_true', help='智能同步（仅同步缺失的镜像）')
+    parser.add_argument('-s', '--smart', action='store_true', help='智能同步（仅同步缺失或源镜像已更新的镜像）')
     parser.add_argument('--check-only', action='store_true', help='仅检查和加载配置')
+    parser.add_argument('--engine', choices=['registry', 'docker'], default='registry',
+                        help='同步引擎：registry 直接在仓库间复制，docker 使用 pull/tag/push')
+    parser.add_argument('--state-file', default=DEFAULT_STATE_FILE, help='同步状态文件路径')
+    parser.add_argument('--state-ttl', type=float, default=DEFAULT_STATE_TTL_HOURS,
+                        help='同步状态有效期（小时），有效期内的镜像不发起任何网络请求；'
+                             f'默认每 {REVALIDATE_EVERY_RUNS} 次每日运行重新检查一次')
+    parser.add_argument('--no-state', action='store_true', help='不读取也不保存同步状态')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='并发同步的镜像数')
+    parser.add_argument('--registry-limit', action='append', metavar='REGISTRY=N',
+                        help='单个源仓库的并发上限，可多次指定，例如 docker.io=2')
+    parser.add_argument('--target-limit', type=int, default=DEFAULT_TARGET_LIMIT,
+                        help='目标仓库（阿里云）的并发上限')
+    parser.add_argument('--disk-budget', metavar='GB',
+                        help='docker 引擎同时处理的镜像预估磁盘占用上限（GB），auto 为数据目录剩余空间减去余量')
+    parser.add_argument('--disk-path', default=DEFAULT_DISK_PATH, help='计算 auto 磁盘预算时使用的数据目录')
+    parser.add_argument('--no-plan', action='store_true',
+                        help='不做整批数据块去重规划，逐个镜像复制（仅 registry 引擎）')
+    parser.add_argument('--time-budget', type=float, metavar='MINUTES',
+                        help='运行时间预算（分钟），快用完时不再开始新的镜像，未处理的镜像写入检查点留待下次运行')
+    parser.add_argument('--budget-reserve', type=float, default=DEFAULT_BUDGET_RESERVE_MINUTES, metavar='MINUTES',
+                        help='为完成进行中的镜像和保存结果预留的时间（分钟）')
+    parser.add_argument('--checkpoint-file', default=DEFAULT_CHECKPOINT_FILE, help='检查点文件路径')
+    parser.add_argument('--no-resume', action='store_true', help='忽略已有的检查点，从头开始')
+    parser.add_argument('--tag-cache', default=DEFAULT_TAG_CACHE_FILE,
+                        help='标签选择器使用的源仓库标签列表缓存（ETag）文件路径')
+    parser.add_argument('--retry-budget', type=int, default=DEFAULT_RETRY_BUDGET, metavar='N',
+                        help=f'本次运行允许的重试总次数（默认: {DEFAULT_RETRY_BUDGET}），用完后失败不再重试')
+    parser.add_argument('--blob-cache', metavar='DIR',
+                        help='本地数据块缓存目录，已缓存的数据块不再从源仓库下载（仅 registry 引擎）')
+    parser.add_argument('--blob-cache-size', type=float, default=DEFAULT_BLOB_CACHE_GB, metavar='GB',
+                        help=f'本地数据块缓存的容量上限（默认: {DEFAULT_BLOB_CACHE_GB} GB），超出时淘汰最久未使用的数据块')
+    parser.add_argument('--layer-map', default=DEFAULT_LAYER_MAP_FILE,
+                        help='重新压缩镜像层（compression 选项）的 源摘要 -> 压缩后摘要 映射文件路径')
+    parser.add_argument('--shard', metavar='I/N', help='只同步第 I 个分片（共 N 个，I 从 1 开始），用于多个 runner 并行同步')
+    parser.add_argument('--shard-plan', default=DEFAULT_SHARD_PLAN_FILE, help='分片计划文件路径')
+    parser.add_argument('--plan-shards', type=int, metavar='N',
+                        help='按预估传输大小把镜像均衡分成 N 个分片，写入分片计划文件后退出')
+    parser.add_argument('--merge', nargs='+', metavar='RESULT_FILE',
+                        help='合并各分片的结果文件到 --output 后退出')
+    parser.add_argument('--merge-state', nargs='+', metavar='STATE_FILE',
+                        help='把各分片的同步状态合并到 --state-file 后退出')
+    parser.add_argument('--merge-layer-map', nargs='+', metavar='LAYER_MAP_FILE',
+                        help='把各分片的镜像层压缩映射合并到 --layer-map 后退出')
 
     args = parser.parse_args()
 
@@ -285,22 +886,108 @@ def main():
     if not args.force and not args.smart:
         args.smart = True  # 默认使用智能同步
 
+    # 从启动时开始计时，加载状态和配置也计入预算
+    budget = TimeBudget(args.time_budget, args.budget_reserve) if args.time_budget else None
+    set_retry_budget(args.retry_budget)
+    if budget:
+        # 配额将尽时把剩余配额分配到本次运行结束之前
+        set_pacing_deadline(budget.deadline - budget.reserve_seconds)
+
     try:
-        sync = UnifiedImageSync(args.config)
+        if args.merge or args.merge_state or args.merge_layer_map:
+            if args.merge_layer_map:
+                layer_map = LayerMap(args.layer_map)
+                layer_map.load()
+                for layer_map_file in args.merge_layer_map:
+                    layer_map.merge(layer_map_file)
+                layer_map.save()
+                print(f"✅ 合并镜像层压缩映射: {len(layer_map.layers)} 条记录 ({args.layer_map})")
+            if args.merge_state:
+                state = SyncState(args.state_file, args.state_ttl)
+                state.load()
+                for state_file in args.merge_state:
+                    state.merge(state_file)
+                state.save()
+                print(f"✅ 合并同步状态: {len(state.entries)} 条记录 ({args.state_file})")
+            if args.merge:
+                result = merge_results(args.merge)
+                UnifiedImageSync.save_results(result, args.output)
+                print_summary(result)
+                if result.failed_count > 0:
+                    sys.exit(1)
+            return
+
+        shard = parse_shard(args.shard) if args.shard else None
+
+        state = None
+        if not args.no_state and not args.check_only:
+            state = SyncState(args.state_file, args.state_ttl)
+            state.load()
+
+        config_file = args.config or detect_config_file()
+        checkpoint = None
+        if not args.check_only and not args.plan_shards:
+            checkpoint_file = args.checkpoint_file
+            if shard and checkpoint_file == DEFAULT_CHECKPOINT_FILE:
+                # 各分片的检查点分开保存，合并状态目录时互不覆盖
+                checkpoint_file = f"{os.path.splitext(checkpoint_file)[0]}-{shard[0]}of{shard[1]}.json"
+            checkpoint = SyncCheckpoint(checkpoint_file, f"{config_file}#{args.shard}" if shard else config_file)
+            if not args.no_resume:
+                checkpoint.load()
+
+        tag_cache = None
+        if not args.check_only:
+            tag_cache = TagListCache(args.tag_cache)
+            tag_cache.load()
+
+        layer_map = None
+        if not args.check_only and not args.plan_shards:
+            layer_map = LayerMap(args.layer_map)
+            layer_map.load()
+
+        blob_cache = None
+        if args.blob_cache and args.engine == 'registry' and not args.check_only and not args.plan_shards:
+            blob_cache = BlobCache(args.blob_cache, int(args.blob_cache_size * 1024 ** 3))
+            blob_cache.load()
+
+        sync = UnifiedImageSync(config_file, engine=args.engine, state=state,
+                                budget=budget, checkpoint=checkpoint,
+                                shard=shard, shard_plan=args.shard_plan, tag_cache=tag_cache,
+                                blob_cache=blob_cache, layer_map=layer_map)
 
         if args.check_only:
             images = sync.load_config()
             print(f"✅ 配置检查完成，共 {len(images)} 个镜像")
             return
 
-        result = sync.sync_images(smart_sync=args.smart, force_sync=args.force)
-        sync.save_results(result, args.output)
-
-        print("\n📊 同步完成统计:")
-        print(f"  📋 总数: {result.total_count}")
-        print(f"  ✅ 成功: {result.success_count}")
-        print(f"  ❌ 失败: {result.failed_count}")
+        scheduler = SyncScheduler(
+            jobs=args.jobs,
+            registry_limits=parse_registry_limits(args.registry_limit),
+            target_limit=args.target_limit,
+            disk_budget=parse_disk_budget(args.disk_budget, args.disk_path)
+        )
+
+        if args.plan_shards:
+            sync.plan_shards(args.plan_shards, scheduler)
+            if state:
+                state.save()
+            return
 
+        result = sync.sync_images(smart_sync=args.smart, force_sync=args.force, scheduler=scheduler,
+                                  plan_blobs=not args.no_plan)
+        sync.save_results(result, args.output)
+        if state:
+            state.save()
+        if checkpoint:
+            checkpoint.save()
+        if layer_map:
+            layer_map.save()
+
+        print_summary(result)
+        if retry_budget().used:
+            print(f"  🔁 重试: {retry_budget().used}/{retry_budget().total} 次")
+        if blob_cache:
+            print(f"  🗄️ 数据块缓存: {blob_cache.summary()}")
         if result.failed_count > 0:
             sys.exit(1)
 
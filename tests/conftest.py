@@ -0,0 +1,6 @@
+"""脚本以裸模块名相互导入，测试时把 scripts 目录加入 sys.path"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
@@ -0,0 +1,57 @@
+import gzip
+import hashlib
+
+import pytest
+
+from blob_planner import BlobPlanner, PlannedImage
+from fake_registry import FakeRegistry
+from image_copier import ImageCopier
+from layer_compression import zstd_available, MEDIA_TYPE_OCI_LAYER_ZSTD
+from registry_client import parse_image_reference
+from sync_scheduler import SyncScheduler
+from test_image_copier import add_image
+
+
+@pytest.fixture
+def registries():
+    source, target = FakeRegistry().start(), FakeRegistry().start()
+    yield source, target
+    source.stop()
+    target.stop()
+
+
+def test_shared_layers_transferred_once(registries):
+    source, target = registries
+    base = b'base' * 100
+    add_image(source, 'library/app', 'v1', [base, b'one'])
+    add_image(source, 'library/app', 'v2', [base, b'two'])
+
+    copier = ImageCopier(target.address, None, None)
+    images = [PlannedImage(copier.plan_image(parse_image_reference(f'{source.address}/library/app:{tag}')),
+                           'ns/app', tag) for tag in ('v1', 'v2')]
+    results = BlobPlanner(copier, SyncScheduler(jobs=2)).execute(images)
+
+    assert all(result and result.digest for result in results)
+    # 公共镜像层和相同的镜像配置各传输一次
+    assert sum(result.blobs_uploaded for result in results) == 4
+    assert set(target.tags['ns/app']) == {'v1', 'v2'}
+
+
+@pytest.mark.skipif(not zstd_available(), reason='zstd 未安装')
+def test_same_layer_in_two_compressions(registries):
+    source, target = registries
+    layer = gzip.compress(b'layer contents' * 1000)
+    add_image(source, 'library/app', 'v1', [layer])
+
+    copier = ImageCopier(target.address, None, None)
+    reference = parse_image_reference(f'{source.address}/library/app:v1')
+    images = [PlannedImage(copier.plan_image(reference), 'ns/app', 'gzip'),
+              PlannedImage(copier.plan_image(reference, compression='zstd'), 'ns/app', 'zstd')]
+    assert len(BlobPlanner.plan(images)) == 3
+
+    results = BlobPlanner(copier, SyncScheduler(jobs=2)).execute(images)
+
+    assert all(result and result.digest for result in results)
+    assert f"sha256:{hashlib.sha256(layer).hexdigest()}" in target.repo_blobs['ns/app']
+    manifest, _ = target.manifests['ns/app'][target.tags['ns/app']['zstd']]
+    assert MEDIA_TYPE_OCI_LAYER_ZSTD.encode() in manifest
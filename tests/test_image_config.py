@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from fake_registry import FakeRegistry
+from image_config import load_images, target_name
+from sync_scheduler import SyncScheduler
+from unified_sync import UnifiedImageSync
+
+
+def write_config(tmp_path, images):
+    path = tmp_path / 'images.json'
+    path.write_text(json.dumps({'images': images}), encoding='utf-8')
+    return str(path)
+
+
+def test_target_name():
+    assert target_name('docker.io/library/nginx', '1.25') == ('nginx', '1.25')
+    assert target_name('nginx', '1.25', 'all') == ('nginx', '1.25')
+    assert target_name('nginx', '1.25', 'linux/amd64,linux/arm64') == ('nginx', '1.25')
+    assert target_name('ghcr.io/org/nginx', '1.25', 'linux/arm64') == ('linux_arm64_nginx', '1.25')
+
+
+def test_entries_with_same_target_are_skipped(tmp_path):
+    config = write_config(tmp_path, [
+        {'source': {'repository': 'nginx', 'tag': '1.25'}},
+        # 默认平台与多架构复制都推送到 nginx:1.25
+        {'source': {'repository': 'nginx', 'tag': '1.25'}, 'options': {'platforms': 'all'}},
+        # 不同源仓库中的同名镜像
+        {'source': {'repository': 'ghcr.io/org/nginx', 'tag': '1.25'}},
+        {'source': {'repository': 'nginx', 'tag': '1.25'}, 'options': {'platform': 'linux/arm64'}},
+        {'source': {'repository': 'nginx', 'tag': '1.26'}, 'options': {'platforms': 'all'}},
+    ])
+    loaded = load_images(config)
+
+    assert [(image.repository, image.tag, image.platform) for image in loaded.images] == [
+        ('nginx', '1.25', None), ('nginx', '1.25', 'linux/arm64'), ('nginx', '1.26', 'all')]
+    assert len(loaded.duplicates) == 2
+    assert all('nginx:1.25' in message and '索引 0' in message for _, message in loaded.duplicates)
+
+
+def test_expanded_tags_skip_taken_targets(tmp_path):
+    registry = FakeRegistry().start()
+    try:
+        for tag in ('1.24', '1.25', '1.26'):
+            registry.add_manifest('library/nginx', tag, b'{}', 'application/vnd.oci.image.manifest.v1+json')
+        config = write_config(tmp_path, [
+            {'source': {'repository': f'{registry.address}/library/nginx', 'tag': '1.25'}},
+            {'source': {'repository': f'{registry.address}/library/nginx', 'tags': '1.*'},
+             'options': {'platforms': 'all'}},
+        ])
+        sync = UnifiedImageSync(config)
+        images = sync.expand_tag_selectors(sync.load_config(), SyncScheduler())
+    finally:
+        registry.stop()
+
+    assert [(image.tag, image.platform) for image in images] == [('1.25', None), ('1.26', 'all'), ('1.24', 'all')]
+    assert len({image.target for image in images}) == len(images)
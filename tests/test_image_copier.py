@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import threading
+
+import pytest
+
+import image_copier
+import retry_policy
+from fake_registry import FakeRegistry
+from image_copier import ImageCopier
+from registry_client import parse_image_reference
+
+MEDIA_TYPE_LIST = 'application/vnd.docker.distribution.manifest.list.v2+json'
+MEDIA_TYPE_MANIFEST = 'application/vnd.docker.distribution.manifest.v2+json'
+MEDIA_TYPE_CONFIG = 'application/vnd.docker.container.image.v1+json'
+MEDIA_TYPE_LAYER = 'application/vnd.docker.image.rootfs.diff.tar.gzip'
+
+
+def add_image(registry, repository, tag, layers, architectures=('amd64',)):
+    """在模拟仓库中创建多平台镜像，返回清单列表摘要"""
+    descriptors = []
+    for architecture in architectures:
+        layer_descriptors = [{'mediaType': MEDIA_TYPE_LAYER, 'digest': registry.add_blob(repository, layer),
+                              'size': len(layer)} for layer in layers]
+        config = json.dumps({'architecture': architecture, 'os': 'linux'}).encode()
+        manifest = json.dumps({
+            'schemaVersion': 2, 'mediaType': MEDIA_TYPE_MANIFEST,
+            'config': {'mediaType': MEDIA_TYPE_CONFIG, 'digest': registry.add_blob(repository, config),
+                       'size': len(config)},
+            'layers': layer_descriptors,
+        }).encode()
+        descriptors.append({'mediaType': MEDIA_TYPE_MANIFEST, 'size': len(manifest),
+                            'digest': registry.add_manifest(repository, None, manifest, MEDIA_TYPE_MANIFEST),
+                            'platform': {'os': 'linux', 'architecture': architecture}})
+    index = json.dumps({'schemaVersion': 2, 'mediaType': MEDIA_TYPE_LIST, 'manifests': descriptors}).encode()
+    return registry.add_manifest(repository, tag, index, MEDIA_TYPE_LIST)
+
+
+def digest_of(data):
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(retry_policy, 'backoff', lambda attempt: 0)
+    retry_policy.set_retry_budget(retry_policy.DEFAULT_RETRY_BUDGET)
+
+
+@pytest.fixture
+def source():
+    registry = FakeRegistry(require_auth=True).start()
+    yield registry
+    registry.stop()
+
+
+@pytest.fixture
+def target():
+    registry = FakeRegistry(require_auth=True).start()
+    yield registry
+    registry.stop()
+
+
+def test_copy_multi_platform_image(source, target):
+    layer = b'layer' * 100
+    digest = add_image(source, 'library/nginx', 'latest', [layer], ('amd64', 'arm64'))
+
+    copier = ImageCopier(target.address, 'user', 'password')
+    reference = parse_image_reference(f'{source.address}/library/nginx:latest')
+    result = copier.copy_image(reference, 'ns/nginx', 'latest', platform='all')
+
+    assert result.digest == digest
+    assert target.tags['ns/nginx']['latest'] == digest
+    assert digest_of(layer) in target.repo_blobs['ns/nginx']
+    # 两个平台共用的镜像层只上传一次
+    assert result.blobs_uploaded == 3
+
+    again = copier.copy_image(reference, 'ns/nginx', 'latest', platform='all')
+    assert again.blobs_uploaded == 0
+    assert again.blobs_skipped == 3
+
+
+def test_cross_repository_mount(source, target):
+    layer = b'shared' * 100
+    add_image(source, 'library/nginx', 'latest', [layer])
+
+    copier = ImageCopier(target.address, 'user', 'password')
+    reference = parse_image_reference(f'{source.address}/library/nginx:latest')
+    copier.copy_image(reference, 'ns/nginx', 'latest')
+    downloads = source.request_counts.get('blob_GET', 0)
+
+    result = copier.copy_image(reference, 'ns/nginx-mirror', 'latest')
+    assert result.blobs_mounted == 2
+    assert result.blobs_uploaded == 0
+    assert source.request_counts.get('blob_GET', 0) == downloads
+    assert digest_of(layer) in target.repo_blobs['ns/nginx-mirror']
+
+
+def test_known_blobs_recorded_from_many_threads():
+    copier = ImageCopier('127.0.0.1:1')
+    repositories = [f'ns/app{index}' for index in range(8)]
+    digests = [f'sha256:{index:064x}' for index in range(200)]
+
+    def remember(repository):
+        for digest in digests:
+            copier._remember_blob(digest, repository)
+            copier._mount_candidates(digest)
+
+    threads = [threading.Thread(target=remember, args=(repository,)) for repository in repositories]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(sorted(copier._mount_candidates(digest)) == repositories for digest in digests)
+
+
+def test_chunked_upload_resumes_after_failures(source, target, monkeypatch):
+    monkeypatch.setattr(image_copier, 'UPLOAD_CHUNK_SIZE', 1024 * 1024)
+    layer = os.urandom(5 * 1024 * 1024 + 123)
+    add_image(source, 'library/big', 'v1', [layer, b'small'])
+    source.faults['blob_GET'] = 1
+    target.faults['upload_PATCH'] = 2
+
+    copier = ImageCopier(target.address, 'user', 'password')
+    result = copier.copy_image(parse_image_reference(f'{source.address}/library/big:v1'), 'ns/big', 'v1')
+
+    assert target.blobs[digest_of(layer)] == layer
+    assert result.retries >= 3
+    # 从已确认的位置继续，不会重新下载整个数据块
+    assert result.bytes_downloaded < 2 * len(layer)
@@ -0,0 +1,86 @@
+import pytest
+
+import rate_limit
+from rate_limit import RegistryThrottle, ThrottleError, pacing_rate, MAX_THROTTLE_WAIT
+
+
+class FakeClock:
+    """替代 time.monotonic / time.sleep，sleep 只推进时间（至少 1ms，与真实时钟一样避免浮点误差下原地空转）"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        seconds = max(seconds, 0.001)
+        self.now += seconds
+        self.slept += seconds
+
+
+class FakeResponse:
+    def __init__(self, status=200, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(rate_limit, '_PACING_DEADLINE', None)
+    return clock
+
+
+def test_pacing_rate_uses_window():
+    assert pacing_rate(19, 21600) == pytest.approx(19 / 21600)
+
+
+def test_pacing_rate_uses_shorter_horizon():
+    assert pacing_rate(19, 21600, 3600) == pytest.approx(19 / 3600)
+    assert pacing_rate(19, 21600, 86400) == pytest.approx(19 / 21600)
+    assert pacing_rate(19, 21600, 0) == pytest.approx(19 / 21600)
+
+
+def test_paced_acquires_all_succeed(clock):
+    throttle = RegistryThrottle('registry-1.docker.io')
+    throttle.observe(FakeResponse(headers={'RateLimit-Limit': '100;w=21600',
+                                           'RateLimit-Remaining': '19;w=21600'}), metered=True)
+    for _ in range(19):
+        throttle.acquire(metered=True)
+    # 令牌桶里的请求立即发出，其余按剩余配额匀速发送，等待超过单次上限也不失败
+    assert clock.slept > MAX_THROTTLE_WAIT
+    assert clock.slept <= 19 * 21600 / 19
+
+
+def test_paced_acquires_fit_time_budget(clock):
+    rate_limit.set_pacing_deadline(clock.now + 3600)
+    throttle = RegistryThrottle('registry-1.docker.io')
+    throttle.observe(FakeResponse(headers={'RateLimit-Limit': '100;w=21600',
+                                           'RateLimit-Remaining': '19;w=21600'}), metered=True)
+    for _ in range(19):
+        throttle.acquire(metered=True)
+    assert clock.slept <= 3600
+
+
+def test_exhausted_quota_fails_fast(clock):
+    throttle = RegistryThrottle('registry-1.docker.io')
+    throttle.observe(FakeResponse(headers={'RateLimit-Limit': '100;w=21600',
+                                           'RateLimit-Remaining': '0;w=21600'}), metered=True)
+    with pytest.raises(ThrottleError) as info:
+        throttle.acquire(metered=True)
+    assert info.value.wait > MAX_THROTTLE_WAIT
+    assert clock.slept == 0
+
+
+def test_short_retry_after_waits(clock):
+    throttle = RegistryThrottle('registry-1.docker.io')
+    throttle.observe(FakeResponse(status=429, headers={'Retry-After': '30'}), metered=True)
+    throttle.acquire(metered=False)
+    assert clock.slept == pytest.approx(30)
@@ -0,0 +1,85 @@
+import hashlib
+import io
+
+import pytest
+
+from fake_registry import FakeRegistry
+from image_copier import ImageCopier
+from registry_client import RegistryClient, RegistryError
+from retry_policy import classify, TRANSIENT
+
+
+@pytest.fixture
+def registry():
+    registry = FakeRegistry(require_auth=True).start()
+    yield registry
+    registry.stop()
+
+
+def test_upload_replays_bytes_after_token_expiry(registry):
+    client = RegistryClient(registry.address, 'user', 'password')
+    data = b'blob' * 100
+    digest = f"sha256:{hashlib.sha256(data).hexdigest()}"
+    location = client.start_upload('ns/app')
+    registry.tokens.clear()
+
+    client.upload_blob('ns/app', digest, data, len(data), location)
+    assert registry.blobs[digest] == data
+
+
+def test_upload_does_not_replay_consumed_stream(registry):
+    client = RegistryClient(registry.address, 'user', 'password')
+    data = b'blob' * 100
+    digest = f"sha256:{hashlib.sha256(data).hexdigest()}"
+    location = client.start_upload('ns/app')
+    registry.tokens.clear()
+
+    with pytest.raises(RegistryError) as info:
+        client.upload_blob('ns/app', digest, io.BytesIO(data), len(data), location)
+    # 调用方重新打开数据流后重试
+    assert classify(info.value) == TRANSIENT
+    assert digest not in registry.blobs
+
+    client.upload_blob('ns/app', digest, io.BytesIO(data), len(data))
+    assert registry.blobs[digest] == data
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+
+@pytest.mark.parametrize('headers, confirmed, offset', [
+    ({}, 0, 0),
+    ({'Range': '0-0'}, 1, 1),
+    # 空会话也可能返回 0-0
+    ({'Range': '0-0'}, 0, 0),
+    ({'Range': '0-1048575'}, 0, 1048576),
+    ({'Range': 'bytes=0-99'}, 0, 100),
+    ({'Range': 'garbage'}, 0, 0),
+])
+def test_upload_offset(headers, confirmed, offset):
+    assert RegistryClient._upload_offset(FakeResponse(headers), confirmed) == offset
+
+
+def test_chunked_upload_reports_committed_bytes(registry):
+    client = RegistryClient(registry.address, 'user', 'password')
+    location = client.start_upload('ns/app')
+    assert client.upload_status('ns/app', location) == 0
+    location, offset = client.upload_chunk('ns/app', location, b'x', 0)
+    assert offset == 1
+    location, offset = client.upload_chunk('ns/app', location, b'yz', 1)
+    assert offset == 3
+    assert client.upload_status('ns/app', location) == 3
+
+
+def test_one_byte_session_is_resumed(registry):
+    client = RegistryClient(registry.address, 'user', 'password')
+    location = client.start_upload('ns/app')
+    location, offset = client.upload_chunk('ns/app', location, b'x', 0)
+
+    copier = ImageCopier(registry.address, 'user', 'password')
+    assert copier._resume_upload('ns/app', location, offset) == (location, 1)
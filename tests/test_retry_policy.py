@@ -0,0 +1,57 @@
+import pytest
+
+import retry_policy
+from registry_client import RegistryError, ThrottledError
+from retry_policy import (classify, classify_output, retry_delay, set_retry_budget,
+                          TRANSIENT, AUTH, NOT_FOUND, DIGEST_MISMATCH, FATAL, THROTTLED)
+
+
+@pytest.fixture(autouse=True)
+def budget():
+    set_retry_budget(retry_policy.DEFAULT_RETRY_BUDGET)
+    yield retry_policy.retry_budget()
+    set_retry_budget(retry_policy.DEFAULT_RETRY_BUDGET)
+
+
+@pytest.mark.parametrize('error, kind', [
+    (RegistryError('boom', 500), TRANSIENT),
+    (RegistryError('slow down', 429), TRANSIENT),
+    (RegistryError('range', 416), TRANSIENT),
+    (RegistryError('no status'), TRANSIENT),
+    (ConnectionResetError('reset'), TRANSIENT),
+    (RegistryError('auth', 401), AUTH),
+    (RegistryError('forbidden', 403), AUTH),
+    (RegistryError('missing', 404), NOT_FOUND),
+    (RegistryError('bad request', 400), FATAL),
+    (RegistryError('digest', 400, code='DIGEST_INVALID'), DIGEST_MISMATCH),
+    (RegistryError('unknown', 404, code='MANIFEST_UNKNOWN'), NOT_FOUND),
+    (RegistryError('denied', 403, code='DENIED'), AUTH),
+    (RegistryError('hub', 429, code='TOOMANYREQUESTS'), TRANSIENT),
+    (ThrottledError('paused', 3600), THROTTLED),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+def test_classify_output_uses_last_match():
+    lines = ['Pulling fs layer', 'error: toomanyrequests: rate limit', 'manifest unknown']
+    assert classify_output(lines) == NOT_FOUND
+    assert classify_output(['something unexpected']) == FATAL
+
+
+def test_throttled_is_not_retried_and_keeps_budget(budget):
+    assert retry_delay(THROTTLED, 0) is None
+    assert budget.used == 0
+
+
+def test_transient_retries_consume_budget(budget):
+    delays = [retry_delay(TRANSIENT, attempt) for attempt in range(retry_policy.MAX_ATTEMPTS[TRANSIENT] + 1)]
+    assert all(delay is not None for delay in delays[:-1])
+    assert delays[-1] is None
+    assert budget.used == retry_policy.MAX_ATTEMPTS[TRANSIENT]
+
+
+def test_budget_exhausted():
+    set_retry_budget(1)
+    assert retry_delay(TRANSIENT, 0) is not None
+    assert retry_delay(TRANSIENT, 1) is None
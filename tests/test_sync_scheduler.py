@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+from sync_scheduler import SyncScheduler
+
+
+def peak_concurrency(scheduler, pushes):
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def worker(item):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+        return item
+
+    results = scheduler.run(list(range(16)), registry_of=lambda item: 'source.example', worker=worker,
+                            pushes=pushes)
+    assert results == list(range(16))
+    return state['peak']
+
+
+@pytest.fixture
+def scheduler():
+    return SyncScheduler(jobs=8, registry_limits={'source.example': 8}, target_limit=2)
+
+
+def test_push_tasks_respect_target_limit(scheduler):
+    assert peak_concurrency(scheduler, pushes=True) == 2
+
+
+def test_source_only_tasks_use_all_jobs(scheduler):
+    assert peak_concurrency(scheduler, pushes=False) == 8
+
+
+def test_source_limit_applies_to_source_only_tasks():
+    scheduler = SyncScheduler(jobs=8, registry_limits={'source.example': 3}, target_limit=2)
+    assert peak_concurrency(scheduler, pushes=False) == 3
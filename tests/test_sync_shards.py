@@ -0,0 +1,50 @@
+import pytest
+
+from sync_shards import parse_shard, fill_unknown_sizes, partition, shard_totals, fallback_shard
+from unified_sync import UnifiedImageSync, SyncResult, merge_results
+
+
+def test_parse_shard():
+    assert parse_shard('2/4') == (2, 4)
+    for spec in ('0/4', '5/4', '1', 'a/b'):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_fill_unknown_sizes_uses_median():
+    assert fill_unknown_sizes({'a': 10, 'b': None, 'c': 30, 'd': 20}) == {'a': 10, 'b': 20, 'c': 30, 'd': 20}
+
+
+def test_partition_longest_first():
+    sizes = {'a': 7, 'b': 5, 'c': 4, 'd': 3, 'e': 3, 'f': 2}
+    assignments = partition(sizes, 2)
+    # 7 -> 1, 5 -> 2, 4 -> 2, 3 -> 1, 3 -> 2, 2 -> 1
+    assert assignments == {'a': 1, 'b': 2, 'c': 2, 'd': 1, 'e': 2, 'f': 1}
+    assert shard_totals(assignments, sizes, 2) == [12, 12]
+    assert partition(dict(reversed(list(sizes.items()))), 2) == assignments
+
+
+def test_partition_more_shards_than_images():
+    assert partition({'a': 1}, 3) == {'a': 1}
+
+
+def test_fallback_shard_is_stable():
+    assert fallback_shard('docker.io/library/nginx:latest', 4) == fallback_shard('docker.io/library/nginx:latest', 4)
+    assert 1 <= fallback_shard('x', 4) <= 4
+
+
+def test_merge_results(tmp_path):
+    files = []
+    for index, (success, failed, pending) in enumerate([(['✅ a'], [], ['⏳ c']), (['✅ b'], ['❌ d'], [])], 1):
+        result = SyncResult(total_count=len(success + failed + pending), success_count=len(success),
+                            failed_count=len(failed), pending_count=len(pending),
+                            success_images=success, failed_images=failed, pending_images=pending)
+        path = str(tmp_path / f'sync-result-{index}.env')
+        UnifiedImageSync.save_results(result, path)
+        files.append(path)
+
+    merged = merge_results(files)
+    assert (merged.total_count, merged.success_count, merged.failed_count, merged.pending_count) == (4, 2, 1, 1)
+    assert merged.success_images == ['✅ a', '✅ b']
+    assert merged.failed_images == ['❌ d']
+    assert merged.pending_images == ['⏳ c']
@@ -0,0 +1,30 @@
+import pytest
+
+import sync_state
+from sync_state import SyncState, state_ttl_hours, DEFAULT_STATE_TTL_HOURS, REVALIDATE_EVERY_RUNS
+
+KEY = 'docker.io/library/nginx:latest|'
+TARGET = 'ns/nginx:latest'
+
+
+def checked_runs(monkeypatch, tmp_path, ttl_hours, jitter_hours, runs=12):
+    """模拟每天一次的定时运行（带波动），返回重新检查了源镜像的运行序号"""
+    state = SyncState(str(tmp_path / 'state.json'), ttl_hours)
+    checked = []
+    for run in range(runs):
+        now = (run * 24 + jitter_hours[run % len(jitter_hours)]) * 3600
+        monkeypatch.setattr(sync_state.time, 'time', lambda: now)
+        if not state.is_fresh(KEY, TARGET):
+            state.record(KEY, TARGET, source_digest='sha256:abc')
+            checked.append(run)
+    return checked
+
+
+@pytest.mark.parametrize('every', [1, 2, 3])
+@pytest.mark.parametrize('jitter', [[0], [0, 5, -5], [5, -5], [-5, 5, 0, 3]])
+def test_revalidates_every_nth_run(monkeypatch, tmp_path, every, jitter):
+    assert checked_runs(monkeypatch, tmp_path, state_ttl_hours(every), jitter) == list(range(0, 12, every))
+
+
+def test_default_ttl_matches_schedule():
+    assert DEFAULT_STATE_TTL_HOURS == state_ttl_hours(REVALIDATE_EVERY_RUNS) == 36
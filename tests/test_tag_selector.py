@@ -0,0 +1,53 @@
+import pytest
+
+from tag_selector import parse_selector, parse_version
+
+TAGS = ['latest', '1.24.0', '1.24.1', '1.25.0', '1.25.3', '1.25.3-alpine', '1.26.0-alpine',
+        '2.0.0', 'v2.1', 'mainline', '1.25.10']
+
+
+def test_parse_version():
+    assert parse_version('1.25') == (1, 25, 0)
+    assert parse_version('v2.1.3') == (2, 1, 3)
+    assert parse_version('1.25.3-alpine') is None
+    assert parse_version('1.25.3-alpine', '-alpine') == (1, 25, 3)
+
+
+def test_glob_sorted_newest_first():
+    # 版本号按数值排序，不是版本号的标签排在后面
+    assert parse_selector('1.25.*').select(TAGS) == ['1.25.10', '1.25.3', '1.25.0', '1.25.3-alpine']
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('>=1.25 <2', ['1.25.10', '1.25.3', '1.25.0']),
+    ('^1.24.1', ['1.25.10', '1.25.3', '1.25.0', '1.24.1']),
+    ('~1.24', ['1.24.1', '1.24.0']),
+    ('1.x', ['1.25.10', '1.25.3', '1.25.0', '1.24.1', '1.24.0']),
+    ('<1.25 || >=2.1', ['v2.1', '1.24.1', '1.24.0']),
+    ('*', ['v2.1', '2.0.0', '1.25.10', '1.25.3', '1.25.0', '1.24.1', '1.24.0']),
+])
+def test_semver_ranges(spec, expected):
+    assert parse_selector({'semver': spec}).select(TAGS) == expected
+
+
+def test_semver_suffix():
+    assert parse_selector({'semver': '>=1.25', 'suffix': '-alpine'}).select(TAGS) == ['1.26.0-alpine', '1.25.3-alpine']
+
+
+def test_regex_newest():
+    selector = parse_selector({'regex': r'^1\.25\.\d+$', 'newest': 2})
+    assert selector.select(TAGS) == ['1.25.10', '1.25.3']
+    assert selector.describe() == r'regex(^1\.25\.\d+$)[newest=2]'
+
+
+@pytest.mark.parametrize('value', [
+    {'glob': '1.*', 'semver': '1.x'},
+    {'semver': '>=foo'},
+    {'regex': '('},
+    {'glob': '1.*', 'newest': 0},
+    {'glob': '1.*', 'latest': True},
+    ['1.*'],
+])
+def test_invalid_selectors(value):
+    with pytest.raises(ValueError):
+        parse_selector(value)